@@ -0,0 +1,268 @@
+# analysis_worker.py
+# Фоновый процесс анализа: парсинг, статистика и форматирование вне плагин-хоста Sublime.
+#
+# Клиент (AnalysisWorker) живёт в плагине, лениво запускает этот же файл
+# отдельным python-процессом и переиспользует его между командами.
+# Обмен идёт через stdin/stdout: сообщения pickle с 4-байтовым заголовком длины.
+# Модуль не импортирует sublime, поэтому одинаково работает с обеих сторон.
+import os
+import sys
+import pickle
+import queue
+import struct
+import subprocess
+import threading
+
+if __package__:
+    from .urq_parser import UrqParser, Loc
+    from .stats import get_stats, get_simulation_stats, get_state_stats
+    from .puml_formatter import PumlFormatter
+    from .settings import Settings
+else:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from urq_parser import UrqParser, Loc
+    from stats import get_stats, get_simulation_stats, get_state_stats
+    from puml_formatter import PumlFormatter
+    from settings import Settings
+
+PICKLE_PROTOCOL = 4             # читается любым python 3.4+, в т.ч. плагин-хостом
+HEADER = struct.Struct('>I')    # длина сообщения в байтах
+
+# Поля Loc, которые передаются между процессами (порядок важен)
+LOC_FIELDS = ('id', 'name', 'desc', 'line', 'dup', 'cycle', 'end', 'non_end',
+              'tech', 'orphan', 'links', 'vars', 'invs', 'is_proc_target', 'depth', 'dist_to_end',
+              'cycle_group')
+
+def pack_locs(locs):
+    """Упаковывает локации в кортежи простых типов — компактно и без ссылок на классы"""
+    return [tuple(getattr(loc, f) for f in LOC_FIELDS) for loc in locs]
+
+def unpack_locs(packed):
+    """Восстанавливает объекты Loc из кортежей pack_locs"""
+    locs = []
+    for row in packed:
+        loc = Loc(row[0], row[1], row[2], row[3])
+        for field, value in zip(LOC_FIELDS[4:], row[4:]):
+            setattr(loc, field, value)
+        locs.append(loc)
+    return locs
+
+def _send(stream, msg):
+    """Пишет одно сообщение в поток"""
+    data = pickle.dumps(msg, PICKLE_PROTOCOL)
+    stream.write(HEADER.pack(len(data)))
+    stream.write(data)
+    stream.flush()
+
+def _recv(stream):
+    """Читает одно сообщение из потока, None - поток закрыт"""
+    header = stream.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    size = HEADER.unpack(header)[0]
+    data = stream.read(size)
+    if len(data) < size:
+        return None
+    return pickle.loads(data)
+
+# ----------------------------------------------------------------------
+# Серверная часть (выполняется в фоновом процессе)
+
+def _parse(path):
+    """Парсит файл, возвращает (locs, предупреждения, перекрёстные ссылки на переменные)"""
+    parser = UrqParser()
+    locs = parser.parse_file(path)
+    return locs, parser.get_warnings(), parser.xref
+
+def _handle(msg, cancel, progress):
+    """Выполняет одно задание"""
+    kind = msg['kind']
+    if kind == 'explore':
+        # Обходчику нужен сам текст квеста, а не только готовые локации
+        parser = UrqParser()
+        content = parser.read_source(msg['file'])
+        locs = parser.parse_source(content, msg['file'])
+        options = Settings(msg.get('options'))
+        text = get_state_stats(locs, content, max_states=options.state_budget, cancel=cancel) if locs else ""
+        return {'text': text, 'warnings': parser.get_warnings()}
+
+    locs, warnings, xref = _parse(msg['file'])
+
+    if kind == 'parse':
+        return {'locs': pack_locs(locs), 'warnings': warnings}
+
+    if kind == 'stats':
+        options = Settings(msg.get('options'))
+        text = get_stats(locs, analyze_paths=options.stats_analyze_paths, cancel=cancel,
+                         time_budget=options.stats_time_budget or None, progress=progress,
+                         path_workers=options.stats_path_workers,
+                         balance=options.stats_balance, sample_routes=options.stats_sample_routes,
+                         seed=options.sim_seed, shortest_routes=options.stats_shortest_routes,
+                         xref=xref) if locs else ""
+        return {'text': text, 'warnings': warnings}
+
+    if kind == 'simulate':
+        options = Settings(msg.get('options'))
+        text = get_simulation_stats(locs, walkers=options.sim_walkers, max_steps=options.sim_max_steps,
+                                    seed=options.sim_seed, cancel=cancel) if locs else ""
+        return {'text': text, 'warnings': warnings}
+
+    if kind == 'format':
+        if not locs:
+            return {'content': "", 'warnings': warnings}
+        formatter = PumlFormatter(Settings(msg.get('options')))
+        legend = msg.get('legend', True)
+        # Большой граф - обзорная страница и части (см. split_size)
+        name = os.path.splitext(os.path.basename(msg['file']))[0]
+        pages = formatter.format_pages(locs, legend=legend, name=name)
+        content = pages[0][1]
+        return {'content': content, 'parts': pages[1:], 'warnings': warnings + formatter.get_warnings()}
+
+    raise ValueError(f"Неизвестное задание: {kind}")
+
+def serve(inp, out):
+    """Главный цикл фонового процесса: задания по одному, отмена - из отдельного потока чтения"""
+    jobs = queue.Queue()
+    cancels = {}                    # id задания -> Event
+    lock = threading.Lock()
+
+    def reader():
+        while True:
+            msg = _recv(inp)
+            if msg is None:
+                jobs.put(None)
+                return
+            with lock:
+                if msg['kind'] == 'cancel':
+                    event = cancels.get(msg['id'])
+                    if event:
+                        event.set()
+                    continue
+                cancels[msg['id']] = threading.Event()
+            jobs.put(msg)
+
+    threading.Thread(target=reader, daemon=True).start()
+
+    while True:
+        msg = jobs.get()
+        if msg is None:
+            break
+        job_id = msg['id']
+        with lock:
+            cancel = cancels[job_id]
+
+        def progress(percent, stage, job_id=job_id):
+            _send(out, {'id': job_id, 'kind': 'progress', 'percent': percent, 'stage': stage})
+
+        try:
+            result = _handle(msg, cancel, progress)
+            _send(out, {'id': job_id, 'kind': 'result', 'result': result})
+        except Exception as e:
+            _send(out, {'id': job_id, 'kind': 'error', 'error': f"{type(e).__name__}: {e}"})
+        finally:
+            with lock:
+                cancels.pop(job_id, None)
+
+# ----------------------------------------------------------------------
+# Клиентская часть (выполняется в плагине)
+
+class AnalysisWorker:
+    """Долгоживущий фоновый процесс анализа, запускается при первом задании"""
+    def __init__(self, python="python"):
+        self.python = python
+        self.proc = None
+        self.current = None             # (id, kind) выполняемого задания
+        self._next_id = 0
+        self._lock = threading.Lock()   # одно задание за раз
+        self._write_lock = threading.Lock()
+
+    def _ensure_started(self):
+        """Запускает процесс, если он ещё не запущен или упал"""
+        if self.proc and self.proc.poll() is None:
+            return
+        startupinfo = None
+        if os.name == 'nt':
+            startupinfo = subprocess.STARTUPINFO()
+            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+            startupinfo.wShowWindow = subprocess.SW_HIDE
+        self.proc = subprocess.Popen(
+            [self.python, '-u', os.path.abspath(__file__)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            startupinfo=startupinfo
+        )
+        threading.Thread(target=self._pump_stderr, args=(self.proc,), daemon=True).start()
+
+    def _pump_stderr(self, proc):
+        """Пересылает вывод процесса (print парсера и ошибки) в консоль"""
+        for line in iter(proc.stderr.readline, b''):
+            print(f"URQ Worker: {line.decode('utf-8', errors='replace').rstrip()}")
+
+    def request(self, kind, progress=None, **params):
+        """
+        Отправляет задание и ждёт результат.
+        kind: 'parse' | 'stats' | 'simulate' | 'explore' | 'format'; progress: callback(процент, этап).
+        """
+        with self._lock:
+            self._ensure_started()
+            self._next_id += 1
+            job_id = self._next_id
+            self.current = (job_id, kind)
+            try:
+                with self._write_lock:
+                    _send(self.proc.stdin, dict(params, id=job_id, kind=kind))
+                while True:
+                    msg = _recv(self.proc.stdout)
+                    if msg is None:
+                        raise RuntimeError("фоновый процесс анализа завершился")
+                    if msg.get('id') != job_id:
+                        continue
+                    if msg['kind'] == 'progress':
+                        if progress:
+                            progress(msg['percent'], msg['stage'])
+                    elif msg['kind'] == 'error':
+                        raise RuntimeError(msg['error'])
+                    else:
+                        result = msg['result']
+                        if 'locs' in result:
+                            result['locs'] = unpack_locs(result['locs'])
+                        return result
+            except (OSError, EOFError):
+                self.close()
+                raise RuntimeError("связь с фоновым процессом анализа потеряна")
+            finally:
+                self.current = None
+
+    def cancel(self, kind=None):
+        """Просит прервать текущее задание (если kind задан - только задание этого типа)"""
+        current = self.current
+        if not current or (kind and current[1] != kind) or not self.proc:
+            return False
+        try:
+            with self._write_lock:
+                _send(self.proc.stdin, {'id': current[0], 'kind': 'cancel'})
+            return True
+        except OSError:
+            return False
+
+    def close(self):
+        """Останавливает процесс"""
+        proc, self.proc = self.proc, None
+        if proc and proc.poll() is None:
+            try:
+                proc.stdin.close()
+                proc.wait(timeout=2)
+            except Exception:
+                proc.kill()
+
+if __name__ == '__main__':
+    # stdout занят протоколом: всё, что печатают модули, уходит в stderr.
+    # stdin читаем через копию дескриптора: дочерние процессы пула закрывают sys.stdin
+    # при старте и зависли бы на его блокировке, пока поток чтения ждёт данных
+    channel = sys.stdout.buffer
+    sys.stdout = sys.stderr
+    inp = os.fdopen(os.dup(sys.stdin.fileno()), 'rb')
+    sys.stdin = open(os.devnull)
+    serve(inp, channel)
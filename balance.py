@@ -0,0 +1,427 @@
+# balance.py
+# Баланс концовок для "случайного игрока", который на каждом шаге равновероятно
+# выбирает один из переходов локации (кнопки, goto, автопереход).
+# Считается как поглощающая марковская цепь: концовки, тупики и фантомные ссылки
+# поглощают игрока, остальные локации - переходные состояния.
+from collections import Counter, deque
+from typing import Dict, Any
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from .urq_graph import strong_components
+    from .urq_parser import (LINK_TARGET_ID, LINK_TYPE, LINK_IS_PHANTOM,
+                             LINK_IS_MENU, LINK_IS_LOCAL, build_proc_summaries, call_return_links)
+except ImportError:
+    from urq_graph import strong_components
+    from urq_parser import (LINK_TARGET_ID, LINK_TYPE, LINK_IS_PHANTOM,
+                            LINK_IS_MENU, LINK_IS_LOCAL, build_proc_summaries, call_return_links)
+
+# Переходы, между которыми выбирает игрок. proc заменяется кнопками, которые
+# добавляет процедура (см. call_return_links); меню и локальные кнопки не уводят
+# из локации - они не считаются
+MOVE_TYPES = ('btn', 'goto', 'auto')
+
+DENSE_LIMIT = 1500      # До какого размера компоненты решаем систему напрямую (NumPy)
+MAX_ITER = 20000        # Лимит итераций для больших компонент и чистого Python
+TOLERANCE = 1e-12       # Точность итераций
+KRYLOV_ITER = 2000      # Лимит итераций BiCGSTAB для больших компонент (NumPy)
+KRYLOV_TOLERANCE = 1e-11  # Относительная невязка BiCGSTAB
+
+def _move_targets(loc, pos, summaries) -> list:
+    """Индексы локаций, куда игрок может уйти из loc (None - фантомная ссылка), с повторами"""
+    if getattr(loc, 'end', False):
+        return []
+    targets = []
+    for link in call_return_links(loc, pos, summaries):
+        if link[LINK_TYPE] not in MOVE_TYPES or link[LINK_IS_MENU] or link[LINK_IS_LOCAL]:
+            continue
+        if link[LINK_IS_PHANTOM]:
+            targets.append(None)
+            continue
+        j = pos.get(link[LINK_TARGET_ID])
+        if j is not None:
+            targets.append(j)
+    return targets
+
+def build_chain(locs) -> Dict[str, Any]:
+    """
+    Строит цепь переходов по готовым связям локаций.
+
+    Возвращает словарь:
+    - 'moves': moves[i] - [(j, вероятность)] для переходных состояний, None - для поглощающих;
+    - 'phantom': phantom[i] - вероятность уйти из i по фантомной ссылке.
+    """
+    pos = {loc.id: i for i, loc in enumerate(locs)}
+    summaries = build_proc_summaries(locs)
+    moves = [None] * len(locs)
+    phantom = [0.0] * len(locs)
+
+    for i, loc in enumerate(locs):
+        targets = _move_targets(loc, pos, summaries)
+        if not targets:
+            continue  # концовка или тупик: поглощающее состояние
+        total = len(targets)
+        counts = Counter(targets)
+        broken = counts.pop(None, 0)
+        moves[i] = [(j, cnt / total) for j, cnt in counts.items()]
+        phantom[i] = broken / total
+
+    return {'moves': moves, 'phantom': phantom}
+
+def absorption_stats(locs, start: int = 0, stop=None) -> Dict[str, Any]:
+    """
+    Вероятности исходов и среднее число ходов от стартовой локации.
+
+    Решает (I - Q)ᵀ·y = e_start для ожидаемого числа посещений y, обходя
+    компоненты сильной связности в топологическом порядке: ациклические части
+    считаются за один проход, циклы - отдельными системами (NumPy: небольшие
+    напрямую, большие - BiCGSTAB; без NumPy - Гаусс-Зейдель на чистом Python).
+    stop - необязательный callable, при True итерации обрываются (результат приближённый).
+
+    Возвращает словарь:
+    - 'endings': [(Loc, вероятность)] по убыванию;
+    - 'dead_ends': [(Loc, вероятность)] - тупики (нет переходов, но не концовка);
+    - 'phantom': вероятность уйти по фантомной ссылке;
+    - 'loop': вероятность навсегда застрять в цикле без выхода;
+    - 'expected_steps': среднее число ходов до поглощения (или до попадания в такой цикл);
+    - 'backend': 'numpy' или 'python'; 'approx': True, если итерации не сошлись.
+    """
+    result = {'endings': [], 'dead_ends': [], 'phantom': 0.0, 'loop': 0.0,
+              'expected_steps': 0.0, 'backend': 'numpy' if np is not None else 'python',
+              'approx': False}
+    if not locs:
+        return result
+
+    chain = build_chain(locs)
+    moves, phantom = chain['moves'], chain['phantom']
+    n = len(locs)
+    absorbed = [0.0] * n
+
+    if moves[start] is None:
+        absorbed[start] = 1.0
+        return _collect(locs, absorbed, result)
+
+    # Достижимые от старта переходные состояния
+    seen = [False] * n
+    seen[start] = True
+    order = [start]
+    queue = deque(order)
+    while queue:
+        v = queue.popleft()
+        for w, _ in moves[v] or ():
+            if not seen[w]:
+                seen[w] = True
+                order.append(w)
+                if moves[w] is not None:
+                    queue.append(w)
+    transient = [v for v in order if moves[v] is not None]
+
+    # Из каких состояний вообще можно закончить игру (обратный обход)
+    reverse = {v: [] for v in transient}
+    finish = deque()
+    can_finish = set()
+    for v in transient:
+        if phantom[v] > 0:
+            can_finish.add(v)
+            finish.append(v)
+        for w, _ in moves[v]:
+            if moves[w] is None:
+                if v not in can_finish:
+                    can_finish.add(v)
+                    finish.append(v)
+            else:
+                reverse[w].append(v)
+    while finish:
+        w = finish.popleft()
+        for v in reverse[w]:
+            if v not in can_finish:
+                can_finish.add(v)
+                finish.append(v)
+
+    if start not in can_finish:
+        result['loop'] = 1.0
+        return _collect(locs, absorbed, result)
+
+    # Компоненты сильной связности среди "живых" переходных состояний
+    live = [v for v in transient if v in can_finish]
+    local = {v: k for k, v in enumerate(live)}
+    adj = [[local[w] for w, _ in moves[v] if w in local] for v in live]
+    _, comps = strong_components(adj)
+
+    inflow = [0.0] * len(live)
+    inflow[local[start]] = 1.0
+    steps = 0.0
+    for comp in reversed(comps):
+        members = [live[k] for k in comp]
+        visits, exact = _solve_component(members, [inflow[k] for k in comp], moves, stop)
+        if not exact:
+            result['approx'] = True
+
+        inside = set(members)
+        for v, y in zip(members, visits):
+            steps += y
+            result['phantom'] += y * phantom[v]
+            for w, p in moves[v]:
+                if moves[w] is None:
+                    absorbed[w] += y * p
+                elif w not in local:
+                    result['loop'] += y * p    # вход в цикл без выхода
+                elif w not in inside:
+                    inflow[local[w]] += y * p
+
+    result['expected_steps'] = steps
+    return _collect(locs, absorbed, result)
+
+def _solve_component(members, inflow, moves, stop=None):
+    """
+    Решает y = b + Qᵀ_cc·y для одной компоненты.
+    Возвращает (ожидаемые посещения в порядке members, точное ли решение).
+    """
+    k = len(members)
+    pos = {v: i for i, v in enumerate(members)}
+
+    if k == 1:
+        v = members[0]
+        loop = sum(p for w, p in moves[v] if w == v)
+        return [inflow[0] / (1.0 - loop)], True
+
+    # Внутренние рёбра компоненты: (откуда, куда, вероятность) в локальных индексах
+    src, dst, prob = [], [], []
+    for i, v in enumerate(members):
+        for w, p in moves[v]:
+            j = pos.get(w)
+            if j is not None:
+                src.append(i)
+                dst.append(j)
+                prob.append(p)
+
+    if np is not None:
+        b = np.asarray(inflow, dtype=float)
+        if k <= DENSE_LIMIT:
+            m = np.eye(k)
+            np.add.at(m, (dst, src), -np.asarray(prob))
+            return np.linalg.solve(m, b).tolist(), True
+
+        # Большая компонента: BiCGSTAB с разреженным умножением через bincount,
+        # простые итерации - только если он не сошёлся (продолжают с его решения)
+        src_a, dst_a, prob_a = np.asarray(src), np.asarray(dst), np.asarray(prob)
+        matvec = lambda x: x - np.bincount(dst_a, weights=prob_a * x[src_a], minlength=k)
+        y, exact = _bicgstab(matvec, b, stop)
+        if exact:
+            return y.tolist(), True
+        for _ in range(MAX_ITER):
+            if stop and stop():
+                break
+            y_new = b + np.bincount(dst_a, weights=prob_a * y[src_a], minlength=k)
+            if np.max(np.abs(y_new - y)) <= TOLERANCE * (1.0 + np.max(np.abs(y_new))):
+                return y_new.tolist(), True
+            y = y_new
+        return y.tolist(), False
+
+    # Чистый Python: Гаусс-Зейдель по входящим рёбрам. Обходим компоненту
+    # в порядке BFS от входов - значения успевают дойти до дальних вершин за один проход
+    incoming = [[] for _ in range(k)]
+    outgoing = [[] for _ in range(k)]
+    for i, j, p in zip(src, dst, prob):
+        incoming[j].append((i, p))
+        outgoing[i].append(j)
+    sweep = [i for i in range(k) if inflow[i]]
+    seen = set(sweep)
+    for i in sweep:     # список растёт по ходу обхода
+        for j in outgoing[i]:
+            if j not in seen:
+                seen.add(j)
+                sweep.append(j)
+    y = list(inflow)
+    for _ in range(MAX_ITER):
+        delta = 0.0
+        for j in sweep:
+            val = inflow[j]
+            for i, p in incoming[j]:
+                val += y[i] * p
+            if abs(val - y[j]) > delta:
+                delta = abs(val - y[j])
+            y[j] = val
+        if delta <= TOLERANCE * (1.0 + max(y)):
+            return y, True
+        if stop and stop():
+            break
+    return y, False
+
+def _bicgstab(matvec, b, stop=None):
+    """
+    BiCGSTAB для A·y = b, где A задана умножением matvec.
+    Возвращает (y, сошёлся ли) - при срыве или лимите итераций y приближённый.
+    """
+    y = b.copy()
+    r = b - matvec(y)
+    r0 = r.copy()
+    p = np.zeros_like(b)
+    v = np.zeros_like(b)
+    rho = alpha = omega = 1.0
+    limit = KRYLOV_TOLERANCE * (np.linalg.norm(b) or 1.0)
+    for _ in range(KRYLOV_ITER):
+        if np.linalg.norm(r) <= limit:
+            return y, True
+        rho_new = r0 @ r
+        if rho_new == 0.0 or omega == 0.0:
+            break
+        p = r + (rho_new / rho) * (alpha / omega) * (p - omega * v)
+        v = matvec(p)
+        denom = r0 @ v
+        if denom == 0.0:
+            break
+        alpha = rho_new / denom
+        s = r - alpha * v
+        if np.linalg.norm(s) <= limit:
+            return y + alpha * p, True
+        t = matvec(s)
+        tt = t @ t
+        if tt == 0.0:
+            break
+        omega = (t @ s) / tt
+        y = y + alpha * p + omega * s
+        r = s - omega * t
+        rho = rho_new
+        if stop and stop():
+            break
+    return y, False
+
+def _collect(locs, absorbed, result):
+    """Раскладывает поглощённую вероятность по концовкам и тупикам"""
+    for i, p in enumerate(absorbed):
+        if p <= 0.0:
+            continue
+        key = 'endings' if getattr(locs[i], 'end', False) else 'dead_ends'
+        result[key].append((locs[i], p))
+    result['endings'].sort(key=lambda item: -item[1])
+    result['dead_ends'].sort(key=lambda item: -item[1])
+    return result
+
+# ----------------------------------------------------------------------
+# Монте-Карло: прогон множества случайных прохождений
+
+SIM_BATCH = 1 << 18     # Сколько игроков двигаем одновременно (ограничивает память)
+
+def build_csr(locs):
+    """
+    Таблица переходов в формате CSR: ходы из i - targets[offsets[i]:offsets[i + 1]].
+    Фантомные ссылки ведут в служебное состояние len(locs) без выходов.
+    """
+    pos = {loc.id: i for i, loc in enumerate(locs)}
+    summaries = build_proc_summaries(locs)
+    sink = len(locs)
+    offsets = [0]
+    targets = []
+    for loc in locs:
+        targets.extend(sink if j is None else j for j in _move_targets(loc, pos, summaries))
+        offsets.append(len(targets))
+    offsets.append(len(targets))  # у фантомного состояния ходов нет
+    return offsets, targets
+
+def simulate(locs, walkers: int = 100000, max_steps: int = 1000, seed: int = 0,
+             start: int = 0, stop=None) -> Dict[str, Any]:
+    """
+    Прогоняет walkers случайных прохождений от стартовой локации.
+    На каждом шаге игрок равновероятно выбирает один из переходов; игра
+    кончается в локации без переходов (концовка или тупик) или на фантомной
+    ссылке. Кто не закончил за max_steps ходов - считается застрявшим.
+    При одном и том же seed результат повторяется.
+
+    Возвращает словарь:
+    - 'endings', 'dead_ends': [(Loc, число игроков)] по убыванию;
+    - 'phantom', 'stuck': число ушедших по фантомным ссылкам и застрявших;
+    - 'heat': heat[i] - сколько раз игроки побывали в локации i;
+    - 'avg_length': средняя длина завершённых прохождений в ходах;
+    - 'walkers', 'steps': сколько игроков прогнано и сколько всего сделано ходов;
+    - 'backend': 'numpy' или 'python'; 'stopped': прервано через stop().
+    """
+    n = len(locs)
+    offsets, targets = build_csr(locs)
+    run = _simulate_numpy if np is not None else _simulate_python
+    absorbed, heat, stuck, lengths, done, steps, stopped = run(
+        offsets, targets, n, walkers, max_steps, seed, start, stop)
+
+    result = {'endings': [], 'dead_ends': [], 'phantom': absorbed[n], 'stuck': stuck,
+              'heat': heat[:n], 'walkers': done,
+              'avg_length': lengths / (done - stuck) if done > stuck else 0.0,
+              'steps': steps, 'backend': 'numpy' if np is not None else 'python',
+              'stopped': stopped}
+    for i in range(n):
+        if absorbed[i]:
+            key = 'endings' if getattr(locs[i], 'end', False) else 'dead_ends'
+            result[key].append((locs[i], absorbed[i]))
+    result['endings'].sort(key=lambda item: -item[1])
+    result['dead_ends'].sort(key=lambda item: -item[1])
+    return result
+
+def _simulate_numpy(offsets, targets, n, walkers, max_steps, seed, start, stop):
+    """Все игроки пачки делают ход одновременно, закончившие выбывают из массивов"""
+    rng = np.random.default_rng(seed)
+    offs = np.asarray(offsets, dtype=np.int64)
+    dest = np.asarray(targets, dtype=np.int64)
+    degree = np.diff(offs)
+    absorbed = np.zeros(n + 1, dtype=np.int64)
+    heat = np.zeros(n + 1, dtype=np.int64)
+    stuck = lengths = done = steps = 0
+    stopped = False
+
+    while done < walkers and not stopped:
+        size = min(SIM_BATCH, walkers - done)
+        pos = np.full(size, start, dtype=np.int64)
+        for step in range(max_steps + 1):
+            heat += np.bincount(pos, minlength=n + 1)
+            deg = degree[pos]
+            finished = deg == 0
+            count = int(np.count_nonzero(finished))
+            if count:
+                absorbed += np.bincount(pos[finished], minlength=n + 1)
+                lengths += step * count
+                keep = ~finished
+                pos, deg = pos[keep], deg[keep]
+                if not len(pos):
+                    break
+            if step == max_steps:
+                break
+            choice = (rng.random(len(pos)) * deg).astype(np.int64)
+            pos = dest[offs[pos] + choice]
+            steps += len(pos)
+        stuck += len(pos)
+        done += size
+        stopped = bool(stop and stop())
+
+    return absorbed.tolist(), heat.tolist(), stuck, lengths, done, steps, stopped
+
+def _simulate_python(offsets, targets, n, walkers, max_steps, seed, start, stop):
+    """Медленный вариант без NumPy: игроки по одному"""
+    import random
+    rng = random.Random(seed)
+    absorbed = [0] * (n + 1)
+    heat = [0] * (n + 1)
+    stuck = lengths = steps = 0
+
+    for done in range(walkers):
+        if not done & 0x3FF and stop and stop():
+            return absorbed, heat, stuck, lengths, done, steps, True
+        v = start
+        heat[v] += 1
+        for step in range(max_steps):
+            lo, hi = offsets[v], offsets[v + 1]
+            if lo == hi:
+                break
+            v = targets[lo + int(rng.random() * (hi - lo))]
+            heat[v] += 1
+        else:
+            step = max_steps
+        steps += step
+        if offsets[v] == offsets[v + 1]:
+            absorbed[v] += 1
+            lengths += step
+        else:
+            stuck += 1
+
+    return absorbed, heat, stuck, lengths, walkers, steps, False
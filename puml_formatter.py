@@ -1,14 +1,32 @@
 # PlantUML Formatter - формирует содержимое PlantUML диаграмм
 
+import copy
+import string
+from collections import defaultdict
+
+try:
+    from .stats import find_bridges
+    from .urq_parser import LINK_TARGET_ID, LINK_TARGET_NAME, LINK_TYPE, LINK_LABEL, LINK_IS_PHANTOM, LINK_GUARD
+    from .urq_graph import strong_components
+    from .simplify import collapse_chains
+except ImportError:
+    from stats import find_bridges
+    from urq_parser import LINK_TARGET_ID, LINK_TARGET_NAME, LINK_TYPE, LINK_LABEL, LINK_IS_PHANTOM, LINK_GUARD
+    from urq_graph import strong_components
+    from simplify import collapse_chains
+
 # Лимиты
 LOC_LIMIT = 40
 DESC_LIMIT = 50
 BTN_LIMIT = 30
+GROUP_DEPTH = 4   # уровней вложенности групп по префиксам (0 - без групп)
+CHAIN_NAMES = 8   # имён звеньев в подписи склеенной цепочки
 
 # Цвета
 PHANTOM_COLOR = "#ffcccb"
 ORPHAN_COLOR = "#ffcccb"  # красный фон для сироток
 PHANTOM_ARROW_COLOR = "#CD5C5C"
+BRIDGE_ARROW_COLOR = "#FF8C00"  # оранжевый для связей-мостов
 
 STATE_BG_COLOR = "#F0F8FF"
 BORDER_COLOR = "#A9A9A9"
@@ -35,14 +53,23 @@ PROC_TARGET_COLOR = "#E6E6FA"  # Лавандовый цвет для локац
 TECH_COLOR = "#B0E8FF"  # светло-серый фон
 # TECH_FONT_COLOR = "#FFFFFF"  # белый текст
 
+# Циклы из нескольких локаций: цвета по кругу по номеру цикла
+LOOP_COLORS = ("#FFE4B5", "#D8BFD8", "#C1F0C1", "#FFDAB9", "#B0E0E6", "#F5DEB3", "#E0BBE4", "#FFFACD")
+
+# Раскраска по глубине: от светлого у старта к тёмному в самых дальних локациях
+DEPTH_NEAR_COLOR = (0xF0, 0xF8, 0xFF)
+DEPTH_FAR_COLOR = (0x8F, 0xA9, 0xC4)
+
 GROUP_TITLE_COLOR = "#6F8194"  # темнее для заголовка
 GROUP_FONT_COLOR = "#FFFFFF"
 
 # PlantUML элементы
+PHANTOM_NODE_ID = "PHANTOM_NODE_URQ"
 PHANTOM_NODE = f"""state "//phantom" as PHANTOM_NODE_URQ {PHANTOM_COLOR} {{
   PHANTOM_NODE_URQ: (Ссылка на несуществующую локацию)
 }}
 """
+PHANTOM_GROUP_FMT = f'{{}}state "//phantom" as {{}} {PHANTOM_COLOR}\n{{}}{{}}: (Ссылка на несуществующую локацию)\n'
 SKIN_PARAMS = f"""skinparam stateArrowColor {ARROW_COLOR}
 skinparam StartNodeColor {DOT_COLOR}
 skinparam state {{
@@ -80,25 +107,134 @@ START_LOC = "[*] --> {} \n"
 # Форматы связей
 AUTO_FMT = "{} -[dotted]-> {}\n"
 BTN_FMT = "{} --> {} : ({})\n" 
-PHANTOM_FMT = f"{{}} -[{PHANTOM_ARROW_COLOR},dashed]-> PHANTOM_NODE_URQ : ({{}})\n"
+PHANTOM_FMT = f"{{}} -[{PHANTOM_ARROW_COLOR},dashed]-> {{}} : ({{}})\n"
 BTN_MENU = f"{{}} -[{BTN_MENU_COLOR}]-> {{}} : ({{}}) <$menu_icon> \n"
 BTN_LOCAL = f"{{}} -[{BTN_LOCAL_COLOR}]-> {{}} : ({{}}) <$local_icon> \n"
 DOUBLE_FMT = '{}: [Дубликат метки, строка {}]\\n\\n{}\n'
 GOTO_FMT = "{} --> {} : [goto]\n"
+GOTO_GUARD_FMT = "{} --> {} : [goto если {}]\n"
+GUARD_LABEL_FMT = "{} если {}"    # подпись кнопки из ветки if
 PROC_FMT = "{} --> {} : [proc]\n{} -[dotted]-> {}\n"
 PROC_FMT2 = "{} -[bold,dotted]-> {} : [proc] ({})\n"
+AUTO_MANY_FMT = "{} -[dotted]-> {} : ×{}\n"         # несколько одинаковых связей одной стрелкой
+GOTO_MANY_FMT = "{} --> {} : [goto ×{}]\n"
+MERGED_LABEL_FMT = "{} ×{}"
+MERGED_LABEL_SEP = " / "
+# Порядок аргументов форматов связей: 0 - источник, 1 - цель, 2 - подпись, 3 - условие, 4 - число связей.
+# Форматы пишутся с {} по порядку, при сборке таблицы поля нумеруются.
+LINK_ARGS = {"auto": (0, 1), "btn": (0, 1, 2), "goto": (0, 1), "proc_full": (0, 1, 1, 0), "proc_simplified": (0, 0, 2),
+             "goto_guard": (0, 1, 3), "auto_many": (0, 1, 4), "goto_many": (0, 1, 4),
+             "guard_label": (2, 3), "merged_label": (2, 4)}
+BRIDGE_FMT = f"{{}} -[{BRIDGE_ARROW_COLOR},bold]-> {{}} : {{}}\n"
+BRIDGE_MENU_FMT = f"{{}} -[{BRIDGE_ARROW_COLOR},{BTN_MENU_COLOR},bold]-> {{}} : {{}} <$menu_icon> \n"
+BRIDGE_LOCAL_FMT = f"{{}} -[{BRIDGE_ARROW_COLOR};{BTN_LOCAL_COLOR}]-> {{}} : {{}} <$local_icon> \n"
 
 STATE_FMT = 'state "{}" as {}'
 STATE_CYCLE_FMT = f'state "{{}}" as {{}} {CYCLE_COLOR}' # For cycle states
 STATE_END_FMT = f'state "{{}}" as {{}} {END_COLOR}'   # For end states
 STATE_DESC_FMT = '{}: {}\n'
+DEPTH_DESC_FMT = '{}: <size:10>глубина {}, до концовки {}</size>\n'
+CHAIN_DESC_FMT = '{}: [цепочка из {} лок.]\\n{}\n'
+CHAIN_SEP = '\\n'
+
+# Разбиение на части: заглушки для связей с другими частями и обзорная страница
+STUB_SKIN = """skinparam state<<stub>> {
+    BackgroundColor #FFFFFF
+    BorderColor #A9A9A9
+    FontColor #808080
+}
+"""
+STUB_FMT = 'state "{}" as {} <<stub>>\n{}: {}\n'
+PART_FMT = 'state "Часть {}" as part_{}\npart_{}: {}\\n{} лок., файл {}\n'
+PART_LINK_FMT = "part_{} --> part_{} : {}\n"
+PART_NAMES = 3  # сколько префиксов или имён показывать в подписи части
+GROUP_NODE_FMT = 'state "{}" as grp_{}{}\ngrp_{}: {} лок.{}\n'    # обзор по группам
+GROUP_LINK_FMT = "grp_{} --> grp_{} : {}\n"
+UNGROUPED_TITLE = "Без группы"
 # ----------------------------------------------------------------------
 
+def _numbered(fmt, order, fields=None):
+    """
+    '{} --> {}' -> '{0} --> {1}': k-е поле {} получает номер order[k].
+    fields - номер -> текст, который встаёт вместо поля (составная подпись).
+    """
+    out = []
+    k = 0
+    for literal, field, spec, conv in string.Formatter().parse(fmt):
+        out.append(literal.replace('{', '{{').replace('}', '}}'))
+        if field is None:
+            continue
+        if field == '':
+            field = str(order[k])
+            k += 1
+        if fields and field in fields:
+            out.append(fields[field])
+            continue
+        out.append('{' + field + ('!' + conv if conv else '') + (':' + spec if spec else '') + '}')
+    return ''.join(out)
+
 class PumlFormatter:
     """Форматтер PlantUML диаграмм"""
     def __init__(self, options):
         self.options = options
         self.warnings = []
+        self._link_formats = self._build_link_formats()
+
+    def _build_link_formats(self):
+        """
+        Таблица (тип, меню, локальная, proc_links, есть условие, склеено несколько) -> формат
+        связи с нумерованными полями (см. LINK_ARGS), собирается один раз на настройки.
+        Условие и число склеенных связей вшиты в формат, связь выводится одним format.
+        Форматы proc берутся из настроек formats.
+        """
+        formats = getattr(self.options, 'formats', None)
+        proc = {}
+        for key, default in (("proc_full", PROC_FMT), ("proc_simplified", PROC_FMT2)):
+            fmt = getattr(formats, key, default)
+            try:
+                _numbered(fmt, LINK_ARGS[key]).format("a", "b", "c", "d", 2)
+                proc[key] = fmt
+            except (IndexError, ValueError, KeyError, AttributeError) as e:
+                self._add_warning(f"Неверный формат {key} в настройках ({e}), используется стандартный")
+                proc[key] = default
+        
+        table = {}
+        for guarded in (False, True):
+            for merged in (False, True):
+                # Подписи: кнопка из ветки if - "подпись если условие", склеенные - "... ×число"
+                label = btn_label = "{2}"
+                if guarded:
+                    btn_label = _numbered(GUARD_LABEL_FMT, LINK_ARGS["guard_label"])
+                guard = "{3}"
+                if merged:
+                    label = _numbered(MERGED_LABEL_FMT, LINK_ARGS["merged_label"])
+                    btn_label = _numbered(MERGED_LABEL_FMT, LINK_ARGS["merged_label"], {"2": btn_label})
+                    guard = _numbered(MERGED_LABEL_FMT, (3, 4))
+                
+                if merged:
+                    auto = _numbered(AUTO_MANY_FMT, LINK_ARGS["auto_many"])
+                else:
+                    auto = _numbered(AUTO_FMT, LINK_ARGS["auto"])
+                if guarded:
+                    goto = _numbered(GOTO_GUARD_FMT, LINK_ARGS["goto_guard"], {"3": guard})
+                elif merged:
+                    goto = _numbered(GOTO_MANY_FMT, LINK_ARGS["goto_many"])
+                else:
+                    goto = _numbered(GOTO_FMT, LINK_ARGS["goto"])
+                
+                for is_menu in (False, True):
+                    for is_local in (False, True):
+                        btn = BTN_MENU if is_menu else BTN_LOCAL if is_local else BTN_FMT
+                        btn = _numbered(btn, LINK_ARGS["btn"], {"2": btn_label})
+                        for proc_mode in (False, True):
+                            key = (is_menu, is_local, proc_mode, guarded, merged)
+                            table[("auto",) + key] = auto
+                            table[("btn",) + key] = btn
+                            table[("goto",) + key] = goto
+                            # с proc_links - две стрелки (туда и обратно), без - одна жирная петля на источнике
+                            proc_key = "proc_full" if proc_mode else "proc_simplified"
+                            table[("proc",) + key] = _numbered(proc[proc_key], LINK_ARGS[proc_key], {"2": label})
+        return table
 
     def _is_valid_loc(self, loc):
         """Проверяет валидность объекта локации"""
@@ -168,19 +304,74 @@ endlegend
 
     def format_puml(self, locs, legend=True):
         """Формирует содержимое PUML файла"""
+        return self._format_doc(self._prepare(locs), legend)
+
+    def format_slice(self, locs, members, legend=True):
+        """
+        Рисует только локации с позициями members и связи между ними
+        (фантомные связи остаются, связи наружу отбрасываются).
+        """
+        keep = sorted(members)
+        ids = {locs[i].id for i in keep}
+        sliced = []
+        for i in keep:
+            loc = copy.copy(locs[i])
+            loc.links = [link for link in loc.links if link[LINK_IS_PHANTOM] or link[LINK_TARGET_ID] in ids]
+            sliced.append(loc)
+        return self.format_puml(sliced, legend)
+
+    def _prepare(self, locs):
+        """
+        Упрощает граф до раскладки (по настройкам) и готовит настройки отрисовки,
+        общие для всех страниц квеста. Возвращает локации, которые надо рисовать.
+        """
+        if getattr(self.options, 'collapse_chains', False):
+            locs = collapse_chains(locs)
+        
+        self._highlight_loops = getattr(self.options, 'highlight_loops', False)
+        self._show_guards = getattr(self.options, 'show_guards', False)
+        
+        # Раскраска/подписи по глубине (depth проставляет парсер)
+        self._depth_mode = getattr(self.options, 'depth_mode', "")
+        self._max_depth = max((loc.depth for loc in locs if getattr(loc, 'depth', None) is not None), default=0)
+        
+        # Мосты подсвечиваем только по настройке - это лишний проход по графу
+        self._bridges = set()
+        if getattr(self.options, 'highlight_bridges', False):
+            self._bridges = {(src.id, dst.id) for src, dst, _ in find_bridges(locs)['bridges']}
+        
+        # Без разбиения на части все связи рисуются как есть
+        self._part_of = None
+        return locs
+
+    def _format_doc(self, locs, legend=True, incoming=()):
+        """Собирает одну страницу из локаций locs (incoming - связи из других частей)"""
         has_phantom = any(link[ 4 ] for loc in locs for link in loc.links if len(link) > 4)
         content_parts = [ ]
         
         # Группируем локации
         ungrouped, groups = self._group_by_prefix(locs)
         
+        # Свой фантомный узел у каждой группы верхнего уровня - без общей воронки на весь граф
+        self._phantom_of, self._group_phantoms = {}, {}
+        if has_phantom and getattr(self.options, 'split_phantoms', False):
+            for n, (prefix, group) in enumerate(groups.items(), 1):
+                for loc in self._flatten_group(group):
+                    if any(link[LINK_IS_PHANTOM] for link in loc.links):
+                        self._phantom_of[loc.id] = self._group_phantoms[prefix] = f"{PHANTOM_NODE_ID}_{n}"
+            has_phantom = any(link[LINK_IS_PHANTOM] for loc in locs if loc.id not in self._phantom_of
+                              for link in loc.links)
+        
         # Сбрасываем счётчик групп для уникальных ID
         self._group_counter = 0
         # Рендерим все группы и локации (включая дубликаты)
         content_parts.extend(self._render_groups(groups, ungrouped, locs=locs))
 
-        # Связи
-        content_parts.append(self._add_all_links(locs))
+        # Связи (связи в другие части уходят в заглушки)
+        self._stubs = {}
+        links = self._add_all_links(locs) + self._add_incoming_links(incoming)
+        content_parts.extend(STUB_FMT.format(*stub) for stub in self._stubs.values())
+        content_parts.append(links)
         
         # Финальная сборка
         final_parts = [ "@startuml\n" ]
@@ -192,66 +383,223 @@ endlegend
         if has_phantom:
             final_parts.append(PHANTOM_NODE)
         final_parts.append(SKIN_PARAMS)
+        if self._stubs:
+            final_parts.append(STUB_SKIN)
         final_parts.extend(content_parts)
         final_parts.append("@enduml\n")
         
         return ''.join(final_parts)
+
+    def format_pages(self, locs, legend=True, name="quest"):
+        """
+        Страницы диаграммы: [(суффикс имени файла, текст)].
+        Обычно это одна страница с суффиксом "". Граф больше split_size локаций
+        разбивается: сначала обзорная страница (суффикс ""), затем части "_1", "_2"...
+        Связи между частями рисуются заглушками: исходящие - "→ метка", входящие - "← метка".
+        Граф упрощается один раз на все страницы.
+        """
+        locs = self._prepare(locs)
+        size = getattr(self.options, 'split_size', 0)
+        if not size or len(locs) <= size:
+            return [("", self._format_doc(locs, legend))]
         
-    def _group_by_prefix(self, locs):
-        """Группирует локации по префиксам рекурсивно (до _ или пробела)"""
-        def split_name(name):
-            # return name.lower().replace(' ', '_').replace('.', '_').split('_')
-            return name.lower().replace(' ', '_').split('_')
+        parts = self._split_parts(locs, size)
+        self._part_of = {loc.id: n for n, (_, members) in enumerate(parts, 1) for loc in members}
         
-        def build_tree(locs_list, depth=0):
-            # print(f"{'  ' * depth}Depth {depth}: Processing {len(locs_list)} locs: {[loc.name for loc in locs_list]}")
-            
-            if depth > 3 or len(locs_list) < 2:
-                # print(f"{'  ' * depth}Stopping: depth={depth}, count={len(locs_list)}")
-                return locs_list, {}
-            
-            groups, ungrouped = {}, []
-            
-            for loc in locs_list:
-                parts = split_name(loc.name)
-                # print(f"{'  ' * depth}  {loc.name} -> parts: {parts}")
-                if len(parts) > depth:
-                    prefix = parts[depth]
-                    groups.setdefault(prefix, []).append(loc)
-                    # print(f"{'  ' * depth}    Added to group '{prefix}'")
-                else:
-                    ungrouped.append(loc)
-                    # print(f"{'  ' * depth}    Added to ungrouped")
-            
-            # print(f"{'  ' * depth}Groups formed: {list(groups.keys())}")
-            
-            final_groups = {}
-            for prefix, group_locs in groups.items():
-                # print(f"{'  ' * depth}Processing group '{prefix}' with {len(group_locs)} items")
-                if len(group_locs) == 1:
-                    ungrouped.extend(group_locs)
-                    # print(f"{'  ' * depth}  Single item '{prefix}' moved to ungrouped")
+        # Входящие связи каждой части и число связей между частями
+        incoming = defaultdict(list)
+        between = defaultdict(int)
+        for loc in locs:
+            src = self._part_of[loc.id]
+            for link in loc.links:
+                dst = self._part_of.get(link[LINK_TARGET_ID])
+                if dst is not None and dst != src and not link[LINK_IS_PHANTOM]:
+                    incoming[dst].append((loc, link))
+                    between[(src, dst)] += 1
+        
+        pages = []
+        for n, (_, members) in enumerate(parts, 1):
+            self._part = n
+            pages.append((f"_{n}", self._format_doc(members, legend, incoming[n])))
+        return [("", self._format_overview(parts, between, name))] + pages
+
+    def top_groups(self, locs):
+        """
+        Группы верхнего уровня: [(название, [позиции в locs])] в порядке префиксов,
+        локации без группы - последним пунктом.
+        """
+        ungrouped, groups = self._group_by_prefix(locs)
+        pos = {loc.id: i for i, loc in enumerate(locs)}
+        result = [(prefix.capitalize(), sorted(pos[loc.id] for loc in self._flatten_group(group)))
+                  for prefix, group in groups.items()]
+        if ungrouped:
+            result.append((UNGROUPED_TITLE, sorted(pos[loc.id] for loc in ungrouped)))
+        return result
+
+    def format_groups(self, locs):
+        """
+        Обзор для больших квестов: одна вершина на группу верхнего уровня.
+        На стрелках - число связей между группами, в подписи группы - число локаций,
+        концовок, сироток и фантомных связей. Группа с сиротками - красная, с концовками - зелёная.
+        """
+        groups = self.top_groups(locs)
+        group_of = {locs[i].id: n for n, (_, members) in enumerate(groups, 1) for i in members}
+        between = defaultdict(int)
+        phantoms = defaultdict(int)
+        for loc in locs:
+            src = group_of[loc.id]
+            for link in loc.links:
+                if link[LINK_IS_PHANTOM]:
+                    phantoms[src] += 1
                     continue
-                    
-                # Проверяем, можно ли группировать дальше
-                max_parts = max(len(split_name(loc.name)) for loc in group_locs)
-                if depth + 1 < max_parts:
-                    sub_ungrouped, sub_groups = build_tree(group_locs, depth + 1)
-                    # Создаем подгруппу только если есть значимая структура
-                    if len(sub_groups) > 1 or (sub_groups and sub_ungrouped):
-                        final_groups[prefix] = (sub_ungrouped, sub_groups)
-                        # print(f"{'  ' * depth}  Created final group '{prefix}' with subgroups")
-                    else:
-                        final_groups[prefix] = (group_locs, {})
-                        # print(f"{'  ' * depth}  Created simple group '{prefix}' - no meaningful nesting")
-                else:
-                    final_groups[prefix] = (group_locs, {})
-                    # print(f"{'  ' * depth}  Created simple group '{prefix}' - no more parts")
-            
-            # print(f"{'  ' * depth}Final result: {len(ungrouped)} ungrouped, {len(final_groups)} groups")
-            return ungrouped, final_groups
+                dst = group_of.get(link[LINK_TARGET_ID])
+                if dst is not None and dst != src:
+                    between[(src, dst)] += 1
         
-        return build_tree(locs)         
+        lines = ["@startuml\n"]
+        if phantoms:
+            lines.append(PHANTOM_NODE)
+        lines.append(SKIN_PARAMS)
+        for n, (title, members) in enumerate(groups, 1):
+            group_locs = [locs[i] for i in members]
+            if any(loc.id == '0' for loc in group_locs):
+                lines.append(START_LOC.format(f"grp_{n}"))
+            ends = sum(1 for loc in group_locs if loc.end)
+            orphans = sum(1 for loc in group_locs if loc.orphan)
+            flags = ""
+            if ends:
+                flags += f"\\nконцовок: {ends}"
+            if orphans:
+                flags += f"\\nсироток: {orphans}"
+            if phantoms[n]:
+                flags += f"\\nфантомных связей: {phantoms[n]}"
+            color = f" {ORPHAN_COLOR}" if orphans else f" {END_COLOR}" if ends else ""
+            lines.append(GROUP_NODE_FMT.format(self._limit_text(title, LOC_LIMIT), n, color, n, len(members), flags))
+        for (src, dst), count in sorted(between.items()):
+            lines.append(GROUP_LINK_FMT.format(src, dst, count))
+        for n, count in sorted(phantoms.items()):
+            lines.append(PHANTOM_FMT.format(f"grp_{n}", PHANTOM_NODE_ID, count))
+        lines.append("@enduml\n")
+        return ''.join(lines)
+
+    def _split_parts(self, locs, size):
+        """
+        Части графа: группы верхнего уровня _group_by_prefix целиком, а локации
+        без группы - по компонентам сильной связности (цикл не разрывается).
+        Группа больше size делится по подгруппам, её собственные локации - по компонентам;
+        компонента больше size режется в порядке файла.
+        Куски в порядке файла набираются в части, пока те не превысят size.
+        """
+        pos = {loc.id: i for i, loc in enumerate(locs)}
+        adj = [[pos[link[LINK_TARGET_ID]] for link in loc.links if link[LINK_TARGET_ID] in pos]
+               for loc in locs]
+        comp, _ = strong_components(adj)
+        ungrouped, groups = self._group_by_prefix(locs)
+        
+        units = self._loose_units(ungrouped, None, size, pos, comp)
+        for prefix, sub in groups.items():
+            units.extend(self._group_units(prefix, sub, size, pos, comp))
+        units.sort(key=lambda unit: min(pos[loc.id] for loc in unit[1]))
+        
+        parts = []
+        for prefix, members in units:
+            if not parts or len(parts[-1][1]) + len(members) > size and parts[-1][1]:
+                parts.append(([], []))
+            if prefix and prefix not in parts[-1][0]:
+                parts[-1][0].append(prefix)
+            parts[-1][1].extend(members)
+        for titles, members in parts:
+            members.sort(key=lambda loc: pos[loc.id])
+            if not titles:
+                titles.append(members[0].name)
+        return parts
+
+    def _group_units(self, prefix, group, size, pos, comp):
+        """Куски группы для _split_parts: вся группа, если влезает в size, иначе рекурсивно"""
+        members = self._flatten_group(group)
+        if len(members) <= size:
+            return [(prefix, members)]
+        sub_ungrouped, sub_groups = group
+        units = self._loose_units(sub_ungrouped, prefix, size, pos, comp)
+        for sub_prefix, sub in sub_groups.items():
+            units.extend(self._group_units(f"{prefix}_{sub_prefix}", sub, size, pos, comp))
+        return units
+
+    def _loose_units(self, members, prefix, size, pos, comp):
+        """Локации без подгруппы - по компонентам сильной связности comp, большие - кусками по size"""
+        by_comp = defaultdict(list)
+        for loc in sorted(members, key=lambda loc: pos[loc.id]):
+            by_comp[comp[pos[loc.id]]].append(loc)
+        return [(prefix, chunk[start:start + size])
+                for chunk in by_comp.values() for start in range(0, len(chunk), size)]
+
+    def _flatten_group(self, group):
+        """Все локации группы (ungrouped, подгруппы) вместе с вложенными"""
+        sub_ungrouped, sub_groups = group
+        result = list(sub_ungrouped)
+        for sub in sub_groups.values():
+            result.extend(self._flatten_group(sub))
+        return result
+
+    def _format_overview(self, parts, between, name):
+        """Обзорная страница: части и число связей между ними"""
+        lines = ["@startuml\n", SKIN_PARAMS]
+        for n, (titles, members) in enumerate(parts, 1):
+            if any(loc.id == '0' for loc in members):
+                lines.append(START_LOC.format(f"part_{n}"))
+            shown = ', '.join(self._limit_text(t, LOC_LIMIT) for t in titles[:PART_NAMES])
+            if len(titles) > PART_NAMES:
+                shown += f" и ещё {len(titles) - PART_NAMES}"
+            lines.append(PART_FMT.format(n, n, n, shown, len(members), f"{name}_{n}.puml"))
+        for (src, dst), count in sorted(between.items()):
+            lines.append(PART_LINK_FMT.format(src, dst, count))
+        lines.append("@enduml\n")
+        return ''.join(lines)
+        
+    def _group_by_prefix(self, locs):
+        """
+        Группирует локации по префиксам (части имени до _ или пробела).
+        Имена разбиваются один раз и складываются в префиксное дерево,
+        затем дерево сворачивается в группы: (ungrouped, {префикс: (ungrouped, подгруппы)}).
+        Вложенность групп ограничена настройкой group_depth.
+        """
+        limit = getattr(self.options, 'group_depth', GROUP_DEPTH) - 1  # последний уровень, где ещё делим
+        root = _PrefixNode()
+        for loc in locs:
+            parts = loc.name.lower().replace(' ', '_').split('_')
+            node = root
+            node.add(loc, len(parts))
+            for part in parts[:limit + 1]:
+                node = node.child(part)
+                node.add(loc, len(parts))
+            if len(parts) <= limit + 1:
+                node.ends.append(loc)
+        return self._fold_prefixes(root, 0, limit)
+
+    def _fold_prefixes(self, node, depth, limit):
+        """
+        Сворачивает узел дерева префиксов в (ungrouped, groups).
+        Порядок готов для отрисовки: ungrouped - в порядке файла, группы - по алфавиту префиксов.
+        """
+        if depth > limit or len(node.locs) < 2:
+            return node.locs, {}
+        
+        single, groups = {id(loc) for loc in node.ends}, {}
+        for prefix, child in sorted(node.children.items()):
+            if len(child.locs) == 1:
+                single.add(id(child.locs[0]))
+            elif depth + 1 < child.max_parts:
+                sub_ungrouped, sub_groups = self._fold_prefixes(child, depth + 1, limit)
+                # Создаем подгруппу только если есть значимая структура
+                if len(sub_groups) > 1 or (sub_groups and sub_ungrouped):
+                    groups[prefix] = (sub_ungrouped, sub_groups)
+                else:
+                    groups[prefix] = (child.locs, {})
+            else:
+                groups[prefix] = (child.locs, {})
+        ungrouped = [loc for loc in node.locs if id(loc) in single]   # node.locs - в порядке файла
+        return ungrouped, groups
+
     def _render_location(self, loc, indent=""):
         """Рендерит одну локацию"""
         clean_name = self._limit_text(loc.name, LOC_LIMIT)
@@ -279,17 +627,37 @@ endlegend
             desc_line = f"{indent}{STATE_DESC_FMT.format(loc.id, clean_desc)}"
         else:
             state_line = f'{indent}{STATE_FMT.format(clean_name, loc.id)}'
+            if getattr(self, '_highlight_loops', False) and getattr(loc, 'cycle_group', None):
+                state_line += f' {LOOP_COLORS[(loc.cycle_group - 1) % len(LOOP_COLORS)]}'
+            elif getattr(self, '_depth_mode', "") == "color" and getattr(loc, 'depth', None) is not None:
+                state_line += f' {self._depth_color(loc.depth)}'
             desc_line = f"{indent}{STATE_DESC_FMT.format(loc.id, clean_desc)}"
+        
+        chain = getattr(loc, 'chain', None)
+        if chain:
+            names = [self._limit_text(n, LOC_LIMIT) for n in chain[:CHAIN_NAMES]]
+            if len(chain) > CHAIN_NAMES:
+                names.append("...")
+            desc_line = indent + CHAIN_DESC_FMT.format(loc.id, len(chain), CHAIN_SEP.join(names))
+        
+        if getattr(self, '_depth_mode', "") == "label" and getattr(loc, 'depth', None) is not None:
+            to_end = loc.dist_to_end if loc.dist_to_end is not None else "—"
+            desc_line += f"{indent}{DEPTH_DESC_FMT.format(loc.id, loc.depth, to_end)}"
             
         return [state_line + "\n", desc_line]
 
+    def _depth_color(self, depth):
+        """Цвет фона по глубине: линейно между DEPTH_NEAR_COLOR и DEPTH_FAR_COLOR"""
+        ratio = depth / self._max_depth if self._max_depth else 0.0
+        rgb = (round(n + (f - n) * ratio) for n, f in zip(DEPTH_NEAR_COLOR, DEPTH_FAR_COLOR))
+        return "#" + "".join(f"{c:02X}" for c in rgb)
+
     def _render_groups(self, groups, ungrouped, indent="", locs=None):
         """Рендерит группы рекурсивно"""
         parts = []
         
         # Валидные локации (включая дубликаты)
         valid_ungrouped = [loc for loc in ungrouped if self._is_valid_loc(loc)]
-        valid_ungrouped.sort(key=lambda x: int(x.id) if x.id.isdigit() else float('inf'))
         
         # Добавляем [*] если есть локация 0 в этой группе
         if locs and any(loc.id == '0' for loc in valid_ungrouped):
@@ -299,62 +667,132 @@ endlegend
             parts.extend(self._render_location(loc, indent))
         
         # Группы с уникальными ID
-        for prefix, (sub_ungrouped, sub_groups) in sorted(groups.items()):
+        for prefix, (sub_ungrouped, sub_groups) in groups.items():
             self._group_counter += 1
             group_id = f"grp_{self._group_counter}"  # уникальный числовой ID, без кириллицы
             parts.extend([
                 f'{indent}state "{prefix.capitalize()}" as {group_id} <<group>> {{\n',
                 *self._render_groups(sub_groups, sub_ungrouped, indent + "    ", locs),
+                *self._render_group_phantom(prefix, indent),
                 f"{indent}}}\n"
             ])
         
         return parts
 
+    def _render_group_phantom(self, prefix, indent):
+        """Фантомный узел внутри группы верхнего уровня (настройка split_phantoms)"""
+        node_id = getattr(self, '_group_phantoms', {}).get(prefix)
+        if not node_id or indent:
+            return []
+        inner = indent + "    "
+        return [PHANTOM_GROUP_FMT.format(inner, node_id, inner, node_id)]
+
     def _add_all_links(self, locs):
         """Добавляет все связи (группировка не влияет на связи)"""
         parts = []
+        show_guards = getattr(self, '_show_guards', False)
+        merge = getattr(self.options, 'merge_links', False)
         
         for loc in locs:
-            for link in loc.links:
-                target_id, target_name, link_type, label, is_phantom, is_menu, is_local = link
+            links = self._merge_parallel(loc.links, show_guards) if merge else ((link, 1) for link in loc.links)
+            for link, count in links:
+                target_id, target_name, link_type, label, is_phantom, is_menu, is_local, guard = link
+                if not show_guards:
+                    guard = None
+                
+                part_of = getattr(self, '_part_of', None)
+                if part_of and not is_phantom and part_of.get(target_id) != self._part and self._draws_target(link_type):
+                    target_id = self._stub(f"out_{target_id}", f"→ {target_name}", self._part_of.get(target_id))
                 
                 if is_phantom:
-                    parts.append(self._format_phantom_link(loc.id, target_name, link_type, label))
+                    node_id = getattr(self, '_phantom_of', {}).get(loc.id, PHANTOM_NODE_ID)
+                    parts.append(self._format_phantom_link(loc.id, target_name, link_type, label, count, node_id))
                     self._add_warning(f"Локация '{target_name}' для {link_type} из '{loc.name}' не найдена")
+                elif (loc.id, target_id) in getattr(self, '_bridges', ()) and link_type != "proc":
+                    parts.append(self._format_bridge_link(loc.id, target_id, link_type, label, count, is_menu, is_local))
                 else:
-                    parts.append(self._format_link(loc.id, target_id, link_type, label, is_menu, is_local))
+                    parts.append(self._format_link(loc.id, target_id, link_type, label, is_menu, is_local, guard, count))
         
         return ''.join(parts)
 
-    def _format_link(self, source_id, target_id, link_type, label, is_menu=False, is_local=False):
-        """Форматирует обычные связи, включая спец. цвета для меню и локальных кнопок"""
-        clean_label = self._limit_text(label, BTN_LIMIT)
-        if link_type == "auto":            
-            return AUTO_FMT.format(source_id, target_id)
-        elif link_type == "btn":
-            if is_menu:
-                return BTN_MENU.format(source_id, target_id, clean_label)
-            elif is_local:
-                return BTN_LOCAL.format(source_id, target_id, clean_label)
+    def _merge_parallel(self, links, show_guards=False):
+        """
+        Склеивает связи одной локации с одинаковыми целью и видом стрелки
+        (тип, меню/локальная, условие, если условия показываются) - настройка merge_links.
+        Возвращает [(связь с общей подписью, сколько связей склеено)] в порядке первого появления.
+        """
+        merged = {}
+        for link in links:
+            target = link[LINK_TARGET_NAME].lower() if link[LINK_IS_PHANTOM] else link[LINK_TARGET_ID]
+            key = (target, link[LINK_TYPE]) + link[LINK_IS_PHANTOM:LINK_GUARD] + (link[LINK_GUARD] if show_guards else None,)
+            if key in merged:
+                merged[key][1].append(link[LINK_LABEL])
             else:
-                return BTN_FMT.format(source_id, target_id, clean_label)
-        elif link_type == "goto":
-            return GOTO_FMT.format(source_id, target_id)
-        elif link_type == "proc":
-            if self.options.proc_links:
-                # две стрелки (туда и обратно)
-                return PROC_FMT.format(source_id, target_id, target_id, source_id)
-            else:
-                # Рисуем одну жирную пунктирную стрелку туда-обратно
-                # на саму локацию-источник, чтобы показать, что был вызов и возврат.
-                return PROC_FMT2.format(source_id, source_id, clean_label)
-        
-        return ""
+                merged[key] = (link, [link[LINK_LABEL]])
+        result = []
+        for link, labels in merged.values():
+            if len(labels) > 1:
+                shown = [text for text in dict.fromkeys(labels) if text]
+                link = link[:LINK_LABEL] + (MERGED_LABEL_SEP.join(shown),) + link[LINK_LABEL + 1:]
+            result.append((link, len(labels)))
+        return result
+
+    def _add_incoming_links(self, incoming):
+        """Связи из других частей: из заглушки "← метка" в локацию этой части"""
+        parts = []
+        for src, link in incoming:
+            target_id, _, link_type, label, _, is_menu, is_local, guard = link
+            if not self._draws_target(link_type):
+                continue
+            if not getattr(self, '_show_guards', False):
+                guard = None
+            stub = self._stub(f"in_{src.id}", f"← {src.name}", self._part_of[src.id])
+            parts.append(self._format_link(stub, target_id, link_type, label, is_menu, is_local, guard))
+        return ''.join(parts)
 
-    def _format_phantom_link(self, source_id, target_name, link_type, label):
-        """Форматирует phantom связь"""
+    def _draws_target(self, link_type):
+        """Упрощённый proc рисуется петлёй на источнике - заглушка ему не нужна"""
+        return link_type != "proc" or self.options.proc_links
+
+    def _stub(self, stub_id, title, part):
+        """Заглушка для локации из другой части, возвращает её id"""
+        if stub_id not in self._stubs:
+            self._stubs[stub_id] = (self._limit_text(title, LOC_LIMIT), stub_id, stub_id, f"часть {part}")
+        return stub_id
+
+    def _format_link(self, source_id, target_id, link_type, label, is_menu=False, is_local=False, guard=None, count=1):
+        """
+        Форматирует обычные связи, включая спец. цвета для меню и локальных кнопок.
+        count > 1 - стрелка за несколько одинаковых связей (merge_links), число в подписи.
+        """
+        fmt = self._link_formats.get((link_type, is_menu, is_local, self.options.proc_links,
+                                      bool(guard), count > 1))
+        if not fmt:
+            return ""
+        return fmt.format(source_id, target_id, self._limit_text(label, BTN_LIMIT),
+                          self._limit_text(guard, BTN_LIMIT), count)
+
+    def _format_bridge_link(self, source_id, target_id, link_type, label, count=1, is_menu=False, is_local=False):
+        """Форматирует связь-мост (её удаление отрезает часть графа), меню и локальные кнопки - со своими цветом и значком"""
+        if link_type == "btn":
+            text = self._limit_text(label, BTN_LIMIT)
+            text = f"({MERGED_LABEL_FMT.format(text, count) if count > 1 else text})"
+        else:
+            text = {"goto": "[goto]", "auto": "[авто]"}.get(link_type, f"[{link_type}]")
+            if count > 1:
+                text = MERGED_LABEL_FMT.format(text, count)
+        if link_type == "btn" and is_menu:
+            return BRIDGE_MENU_FMT.format(source_id, target_id, text)
+        if link_type == "btn" and is_local:
+            return BRIDGE_LOCAL_FMT.format(source_id, target_id, text)
+        return BRIDGE_FMT.format(source_id, target_id, text)
+
+    def _format_phantom_link(self, source_id, target_name, link_type, label, count=1, node_id=PHANTOM_NODE_ID):
+        """Форматирует phantom связь (node_id - фантомный узел группы при split_phantoms)"""
         label = self._limit_text(label if link_type == "btn" and label else target_name, BTN_LIMIT)
-        return PHANTOM_FMT.format(source_id, label)
+        if count > 1:
+            label = MERGED_LABEL_FMT.format(label, count)
+        return PHANTOM_FMT.format(source_id, node_id, label)
 
     def _limit_text(self, text, max_len):
         """Ограничивает длину текста для диаграммы"""
@@ -368,4 +806,25 @@ endlegend
 
     def get_warnings(self):
         """Возвращает предупреждения"""
-        return self.warnings
\ No newline at end of file
+        return self.warnings
+
+class _PrefixNode:
+    """Узел дерева префиксов: локации, чьё имя начинается с пути до узла"""
+    __slots__ = ('children', 'locs', 'ends', 'max_parts')
+
+    def __init__(self):
+        self.children = {}      # часть имени -> узел (в порядке появления)
+        self.locs = []          # все локации поддерева в порядке файла
+        self.ends = []          # локации, чьё имя на этом узле кончается
+        self.max_parts = 0      # максимум частей в имени среди locs
+
+    def child(self, part):
+        node = self.children.get(part)
+        if node is None:
+            node = self.children[part] = _PrefixNode()
+        return node
+
+    def add(self, loc, parts):
+        self.locs.append(loc)
+        if parts > self.max_parts:
+            self.max_parts = parts
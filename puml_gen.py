@@ -7,6 +7,7 @@ import base64
 import zlib
 import urllib.request
 import urllib.error
+from concurrent.futures import ThreadPoolExecutor
 
 try:
     from .puml_formatter import PumlFormatter
@@ -58,22 +59,43 @@ class PlantumlOnlineGen:
         """Генерирует SVG"""
         return self._req("svg", puml_text)
 
+ONLINE_WORKERS = 4  # одновременных запросов к серверу при генерации частей
+
 class PlantumlGen:
     """Генератор PlantUML файлов и диаграмм"""
     def __init__(self, options):
         self.options = options
         self.jar_path = options.puml_jar_path
         self.warnings = []
+        self.parts = []     # [(файл, текст)] частей большого графа (см. split_size)
         # self.formatter = PumlFormatter()
 
     def save_puml(self, locs, output_file, legend=True):
-        """Сохраняет PUML файл"""
+        """Сохраняет PUML файл (для большого графа - обзор, а части рядом)"""
         formatter = PumlFormatter(self.options)
         
         # Прокидываем параметр в форматтер
-        content = formatter.format_puml(locs, legend=legend)
+        name = os.path.splitext(os.path.basename(output_file))[0]
+        pages = formatter.format_pages(locs, legend=legend, name=name)
+        content = pages[0][1]
+        if len(pages) > 1:
+            self.write_parts(pages[1:], output_file)
         self.warnings.extend(formatter.get_warnings())
         
+        return self.write_puml(content, output_file)
+
+    def write_parts(self, pages, output_file):
+        """Записывает части графа рядом с output_file: имя_1.puml, имя_2.puml..."""
+        base = os.path.splitext(output_file)[0]
+        self.parts = []
+        for suffix, content in pages:
+            part_file = f"{base}{suffix}.puml"
+            self.write_puml(content, part_file)
+            self.parts.append((part_file, content))
+        return self.parts
+
+    def write_puml(self, content, output_file):
+        """Записывает готовый текст PUML (например, полученный от фонового процесса)"""
         try:
             with open(output_file, 'w', encoding='utf-8') as f:
                 f.write(content)
@@ -85,13 +107,21 @@ class PlantumlGen:
 
     def generate_local(self, puml_file, file_type):
         """Генерирует файл через локальный PlantUML"""
+        return self.generate_local_many([puml_file], file_type)
+
+    def generate_local_many(self, puml_files, file_type):
+        """
+        Генерирует файлы одним запуском PlantUML: java стартует один раз,
+        а при нескольких файлах они раскладываются параллельно (-nbthread).
+        """
         if not self.jar_path or not os.path.exists(self.jar_path):
             self._add_warning(f"PlantUML JAR не найден: {self.jar_path}")
             return False
         
-        if not os.path.exists(puml_file):
-            self._add_warning(f"PUML файл не найден: {puml_file}")
-            return False
+        for puml_file in puml_files:
+            if not os.path.exists(puml_file):
+                self._add_warning(f"PUML файл не найден: {puml_file}")
+                return False
         
         type_flags = {'png': '-tpng', 'svg': '-tsvg'}
         if file_type not in type_flags:
@@ -106,7 +136,8 @@ class PlantumlGen:
             '-jar', self.jar_path,
             type_flags[file_type],
             '-charset', 'UTF-8',
-            puml_file
+            *(['-nbthread', 'auto'] if len(puml_files) > 1 else []),
+            *puml_files
         ]
         
         try:
@@ -120,7 +151,7 @@ class PlantumlGen:
                 cmd,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
-                cwd=os.path.dirname(puml_file),
+                cwd=os.path.dirname(puml_files[0]),
                 universal_newlines=True,
                 startupinfo=startupinfo
             )
@@ -135,13 +166,15 @@ class PlantumlGen:
             return False
         
         if returncode == 0:
-            output_file = os.path.splitext(puml_file)[0] + '.' + file_type
-            if os.path.exists(output_file):
-                print(f"PlantUML Gen: {file_type.upper()} создан: {output_file}")
-                return True
-            else:
-                self._add_warning(f"{file_type.upper()} файл не создан")
-                return False
+            done = True
+            for puml_file in puml_files:
+                output_file = os.path.splitext(puml_file)[0] + '.' + file_type
+                if os.path.exists(output_file):
+                    print(f"PlantUML Gen: {file_type.upper()} создан: {output_file}")
+                else:
+                    self._add_warning(f"{file_type.upper()} файл не создан: {output_file}")
+                    done = False
+            return done
         else:
             error_msg = stderr.strip() if stderr else "Неизвестная ошибка"
             self._add_warning(f"PlantUML ошибка {file_type.upper()}: {error_msg}")
@@ -172,6 +205,15 @@ class PlantumlGen:
             sublime.error_message("Ошибка при попытке онлайн генерации. Проверьте консоль.")
             return False
 
+    def generate_parts(self, puml_content, puml_file, file_type, net=False):
+        """Генерирует обзор и все части (self.parts) сразу: локально - одним запуском, онлайн - параллельными запросами"""
+        if not net:
+            return self.generate_local_many([puml_file] + [f for f, _ in self.parts], file_type)
+        jobs = [(puml_content, puml_file)] + [(c, f) for f, c in self.parts]
+        with ThreadPoolExecutor(max_workers=ONLINE_WORKERS) as pool:
+            results = list(pool.map(lambda job: self.generate_online(job[0], job[1], file_type), jobs))
+        return all(results)
+
     def _add_warning(self, message):
         """Добавляет предупреждение"""
         self.warnings.append(f"PlantUML Gen Warning: {message}")
@@ -16,7 +16,7 @@ class FormatOptions:
     """Хранит все строковые форматы для PlantUML."""
     def __init__(self, config_dict=None):
         cfg = config_dict or {}
-        self.proc_full = cfg.get('proc_full', "{} --> {} : [proc]\\n{} -[dotted]-> {}\n")
+        self.proc_full = cfg.get('proc_full', "{} --> {} : [proc]\n{} -[dotted]-> {}\n")
         self.proc_simplified = cfg.get('proc_simplified', "{} -[bold,dotted]-> {} : [proc] ({})\n")
 
 class Settings:
@@ -34,4 +34,31 @@ class Settings:
         # Общие настройки, не вошедшие в группы
         self.puml_jar_path = cfg.get('puml_jar_path', "")
         self.proc_links = cfg.get('proc_links', True)
-        self.stats_analyze_paths = cfg.get('stats_analyze_paths', True)
\ No newline at end of file
+        self.stats_analyze_paths = cfg.get('stats_analyze_paths', True)
+        self.stats_time_budget = cfg.get('stats_time_budget', 0)   # лимит статистики в секундах (0 - без лимита)
+        self.highlight_bridges = cfg.get('highlight_bridges', False) # подсвечивать связи-мосты
+        self.highlight_loops = cfg.get('highlight_loops', False)  # раскрашивать циклы из нескольких локаций
+        self.show_guards = cfg.get('show_guards', False)  # подписывать условия if у кнопок и goto
+        self.group_depth = cfg.get('group_depth', 4)  # уровней вложенности групп по префиксам (0 - без групп)
+        self.collapse_chains = cfg.get('collapse_chains', False)  # склеивать цепочки локаций без развилок в одно состояние
+        self.merge_links = cfg.get('merge_links', False)  # одинаковые связи между двумя локациями - одной стрелкой с числом
+        self.split_phantoms = cfg.get('split_phantoms', False)  # свой фантомный узел в каждой группе верхнего уровня
+        self.split_size = cfg.get('split_size', 0)    # больше стольких локаций - граф по частям (0 - одним файлом)
+        self.preview_radius = cfg.get('preview_radius', 2)  # переходов вокруг локации для предпросмотра окрестности
+        self.depth_mode = cfg.get('depth_mode', "")  # глубина на графе: "" - нет, "label" - подписи, "color" - цвет
+        self.worker_python = cfg.get('worker_python', "")  # python для фонового процесса ("" - считать в Sublime)
+        self.stats_path_workers = cfg.get('stats_path_workers', 0)  # процессов для поиска путей (только с worker_python)
+        self.stats_balance = cfg.get('stats_balance', True)  # вероятности концовок для случайного игрока
+        self.stats_shortest_routes = cfg.get('stats_shortest_routes', 0)  # кратчайших маршрутов на концовку в статистике
+        self.stats_sample_routes = cfg.get('stats_sample_routes', 0)  # случайных маршрутов на концовку в статистике
+        self.sim_walkers = cfg.get('sim_walkers', 100000)    # сколько случайных прохождений прогонять
+        self.sim_max_steps = cfg.get('sim_max_steps', 1000)  # после скольких ходов игрок считается застрявшим
+        self.sim_seed = cfg.get('sim_seed', 0)               # зерно генератора для симуляции и примеров маршрутов
+        self.state_budget = cfg.get('state_budget', 200000)  # лимит конфигураций (локация, состояние) при анализе с переменными
+
+    def as_config(self):
+        """Плоский словарь настроек, из которого можно снова собрать Settings (для фонового процесса)"""
+        cfg = {k: v for k, v in vars(self).items() if k not in ('colors', 'formats')}
+        cfg['colors'] = dict(vars(self.colors))
+        cfg['formats'] = dict(vars(self.formats))
+        return cfg
\ No newline at end of file
@@ -0,0 +1,69 @@
+# simplify.py
+# Упрощение графа перед отрисовкой: меньше вершин и рёбер - быстрее раскладка PlantUML.
+import copy
+from collections import Counter
+from typing import List
+
+try:
+    from .urq_parser import Loc, LINK_TARGET_ID, LINK_TYPE, LINK_IS_PHANTOM, LINK_GUARD
+except ImportError:
+    from urq_parser import Loc, LINK_TARGET_ID, LINK_TYPE, LINK_IS_PHANTOM, LINK_GUARD
+
+CHAIN_TYPES = ('auto', 'goto')  # какие связи склеивают цепочку: игрок тут ничего не выбирает
+
+def _is_plain(loc: Loc) -> bool:
+    """Локация без особых пометок и ровно с одной связью - кандидат в цепочку"""
+    return (len(loc.links) == 1 and not loc.end and not loc.orphan and not loc.dup
+            and not loc.tech and not loc.cycle and not loc.is_proc_target
+            and not loc.links[0][LINK_IS_PHANTOM])
+
+def collapse_chains(locs: List[Loc]) -> List[Loc]:
+    """
+    Склеивает цепочки a -> b -> c, где каждое звено - единственная безусловная
+    авто-связь или goto, а у всех звеньев кроме первого ровно одна входящая связь.
+    Цепочка становится одной локацией: id и входящие связи от первой,
+    исходящие - от последней, имена звеньев - в поле chain.
+    Развилки, концовки, сиротки, дубликаты и локации с фантомами не трогаются.
+    Исходные объекты не меняются; без цепочек возвращается тот же список.
+    """
+    by_id = {loc.id: loc for loc in locs}
+    indeg = Counter(link[LINK_TARGET_ID] for loc in locs for link in loc.links
+                    if link[LINK_TARGET_ID] in by_id)
+
+    def next_in_chain(loc):
+        """Следующее звено цепочки или None"""
+        if not _is_plain(loc):
+            return None
+        link = loc.links[0]
+        nxt = by_id.get(link[LINK_TARGET_ID])
+        if (nxt is None or nxt is loc or link[LINK_TYPE] not in CHAIN_TYPES or link[LINK_GUARD]
+                or indeg[nxt.id] != 1 or not _is_plain(nxt)):
+            return None
+        return nxt
+
+    succ = {}
+    for loc in locs:
+        nxt = next_in_chain(loc)
+        if nxt is not None:
+            succ[loc.id] = nxt
+    if not succ:
+        return locs
+
+    inner = {nxt.id for nxt in succ.values()}
+    merged = {}         # id первого звена -> склеенная локация
+    absorbed = set()    # id остальных звеньев
+    for loc in locs:
+        if loc.id not in succ or loc.id in inner:
+            continue    # не начало цепочки (замкнутые кольца начала не имеют и остаются как есть)
+        members = [loc]
+        while members[-1].id in succ:
+            members.append(succ[members[-1].id])
+        head, last = members[0], members[-1]
+        node = copy.copy(head)
+        node.links = list(last.links)
+        node.dist_to_end = last.dist_to_end
+        node.chain = [m.name for m in members]
+        merged[head.id] = node
+        absorbed.update(m.id for m in members[1:])
+
+    return [merged.get(loc.id, loc) for loc in locs if loc.id not in absorbed]
@@ -0,0 +1,379 @@
+# state_explorer.py
+# Обход квеста с учётом состояния игры: переменных, предметов и условий if.
+#
+# Конфигурация - (локация, состояние). Код локации исполняется упрощённым
+# интерпретатором URQ: присваивания целых чисел, inv+/inv-, if/then/else,
+# btn, goto, proc, end. Всё, что он не понимает, делает значение неизвестным -
+# тогда условие с ним проверяется в обе стороны. Поэтому результат -
+# надёжная верхняя оценка: что не найдено при полном обходе, недостижимо.
+# common, use_ и inv_ локации, а также ввод игрока не моделируются.
+import re
+from collections import deque
+from typing import List, Dict, Any
+
+try:
+    from .urq_parser import LOC_PATTERN, INLINE_BTN_PATTERN, split_if
+except ImportError:
+    from urq_parser import LOC_PATTERN, INLINE_BTN_PATTERN, split_if
+
+MAX_STATES = 200000     # Лимит конфигураций (локация, состояние) по умолчанию
+VALUE_LIMIT = 100       # Значения больше по модулю считаются неизвестными (счётчики не раздувают обход)
+MAX_JUMPS = 200         # Лимит goto/proc/переходов на следующую метку за один ход
+MAX_FORKS = 64          # Лимит вариантов исполнения одной локации
+STOP_CHECK_MASK = 0xFF  # Проверяем отмену раз в 256 конфигураций
+
+SET_RE = re.compile(r'^(?:instr\s+)?([^\W\d][\w.]*)\s*=\s*(.+)$', re.I)
+INV_RE = re.compile(r'^inv([+-])\s*(?:(\d+)\s*,)?\s*(.+)$', re.I)
+BTN_RE = re.compile(r'^btn\s+([^,]+),(.*)$', re.I)
+CMD_RE = re.compile(r'^(goto|proc)\s+(.+)$', re.I)
+TEXT_RE = re.compile(r'^(?:pln|p)\b(.*)$', re.I)
+TOKEN_RE = re.compile(r'\s*(?:(\d+)|([^\W\d][\w.]*)|(<>|<=|>=|[-+*/()<>=]))', re.U)
+
+UNKNOWN = None
+
+# ----------------------------------------------------------------------
+# Разбор кода локаций
+
+def _split_statements(text: str) -> list:
+    """
+    Строки кода без переносов '_', разбитые по '&'. Строка if - дерево веток split_if
+    (тот же разбор, что у условий связей в парсере).
+    """
+    text = re.sub(r'\n\s*_', '', text)
+    result = []
+    for line in text.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        if re.match(r'^if\b', line, re.I):
+            result.extend(split_if(line))
+        else:
+            result.extend(p.strip() for p in line.split('&') if p.strip())
+    return result
+
+def _compile_branch(items) -> list:
+    """Команды и деревья if из _split_statements -> список инструкций"""
+    code = []
+    for item in items:
+        if isinstance(item, str):
+            op = _compile(item)
+        else:
+            cond, then_items, else_items = item
+            op = ('if', _parse_expr(cond), _compile_branch(then_items), _compile_branch(else_items or []))
+        if op:
+            code.append(op)
+    return code
+
+def _compile(stmt: str):
+    """Строка кода -> кортеж-инструкция или None, если она не влияет на обход"""
+    low = stmt.lower()
+    if low == 'end':
+        return ('end',)
+    if low in ('cls', 'clsb'):
+        return ('clear',)
+    if low.startswith('perkill') or low.startswith('invkill'):
+        return (low[:7], low.split(None, 1)[1].strip() if ' ' in low else None)
+    m = INV_RE.match(stmt)
+    if m:
+        sign, count, item = m.groups()
+        delta = int(count or 1) * (1 if sign == '+' else -1)
+        return ('add', item.strip().lower(), delta)
+    m = BTN_RE.match(stmt)
+    if m:
+        return ('btn', _target(m.group(1)), m.group(2).strip())
+    m = CMD_RE.match(stmt)
+    if m:
+        return (m.group(1).lower(), _target(m.group(2)))
+    m = TEXT_RE.match(stmt)
+    if m:
+        buttons = [('btn', _target(t if t is not None else d), d or "")
+                   for d, t in INLINE_BTN_PATTERN.findall(m.group(1))
+                   for t in [t or None]]
+        return ('text', buttons) if buttons else None
+    m = SET_RE.match(stmt)
+    if m:
+        return ('set', m.group(1).lower(), _parse_expr(m.group(2)))
+    return None
+
+def _target(name: str) -> str:
+    """Имя цели без префиксов меню/локальной кнопки"""
+    name = name.strip()
+    return name[1:].strip().lower() if name[:1] in '%!' else name.lower()
+
+def _parse_expr(text: str):
+    """
+    Выражение -> дерево из кортежей: ('num', n), ('var', имя), (оператор, a, b), ('not', a).
+    Непонятное выражение -> ('?',) - его значение всегда неизвестно.
+    """
+    tokens = []
+    pos = 0
+    text = text.strip()
+    while pos < len(text):
+        m = TOKEN_RE.match(text, pos)
+        if not m or m.end() == pos:
+            return ('?',)
+        num, name, op = m.groups()
+        if num is not None:
+            tokens.append(('num', int(num)))
+        elif name is not None:
+            low = name.lower()
+            tokens.append(('op', low) if low in ('and', 'or', 'not') else ('var', low))
+        else:
+            tokens.append(('op', op))
+        pos = m.end()
+    try:
+        tree, rest = _parse_or(tokens, 0)
+    except (IndexError, ValueError):
+        return ('?',)
+    return tree if rest == len(tokens) else ('?',)
+
+def _parse_or(tokens, i):
+    left, i = _parse_and(tokens, i)
+    while i < len(tokens) and tokens[i] == ('op', 'or'):
+        right, i = _parse_and(tokens, i + 1)
+        left = ('or', left, right)
+    return left, i
+
+def _parse_and(tokens, i):
+    left, i = _parse_not(tokens, i)
+    while i < len(tokens) and tokens[i] == ('op', 'and'):
+        right, i = _parse_not(tokens, i + 1)
+        left = ('and', left, right)
+    return left, i
+
+def _parse_not(tokens, i):
+    if tokens[i] == ('op', 'not'):
+        inner, i = _parse_not(tokens, i + 1)
+        return ('not', inner), i
+    return _parse_cmp(tokens, i)
+
+def _parse_cmp(tokens, i):
+    left, i = _parse_sum(tokens, i)
+    if i < len(tokens) and tokens[i][0] == 'op' and tokens[i][1] in ('=', '<>', '<', '>', '<=', '>='):
+        op = tokens[i][1]
+        right, i = _parse_sum(tokens, i + 1)
+        left = (op, left, right)
+    return left, i
+
+def _parse_sum(tokens, i):
+    left, i = _parse_term(tokens, i)
+    while i < len(tokens) and tokens[i] in (('op', '+'), ('op', '-')):
+        op = tokens[i][1]
+        right, i = _parse_term(tokens, i + 1)
+        left = (op, left, right)
+    return left, i
+
+def _parse_term(tokens, i):
+    left, i = _parse_atom(tokens, i)
+    while i < len(tokens) and tokens[i] in (('op', '*'), ('op', '/')):
+        op = tokens[i][1]
+        right, i = _parse_atom(tokens, i + 1)
+        left = (op, left, right)
+    return left, i
+
+def _parse_atom(tokens, i):
+    tok = tokens[i]
+    if tok == ('op', '('):
+        inner, i = _parse_or(tokens, i + 1)
+        if tokens[i] != ('op', ')'):
+            raise ValueError("нет закрывающей скобки")
+        return inner, i + 1
+    if tok == ('op', '-'):
+        inner, i = _parse_atom(tokens, i + 1)
+        return ('-', ('num', 0), inner), i
+    if tok[0] in ('num', 'var'):
+        return tok, i + 1
+    raise ValueError(f"неожиданный токен {tok}")
+
+# ----------------------------------------------------------------------
+# Вычисления в трёхзначной логике: число, True/False или UNKNOWN
+
+_ARITH = {'+': lambda a, b: a + b, '-': lambda a, b: a - b, '*': lambda a, b: a * b,
+          '/': lambda a, b: a // b if b else UNKNOWN}
+_CMP = {'=': lambda a, b: a == b, '<>': lambda a, b: a != b, '<': lambda a, b: a < b,
+        '>': lambda a, b: a > b, '<=': lambda a, b: a <= b, '>=': lambda a, b: a >= b}
+
+def _eval(tree, state: Dict[str, Any]):
+    """Значение выражения в состоянии; неизвестные переменные дают UNKNOWN"""
+    kind = tree[0]
+    if kind == 'num':
+        return tree[1]
+    if kind == 'var':
+        return state.get(tree[1], 0)    # в URQ необъявленная переменная равна 0
+    if kind == '?':
+        return UNKNOWN
+    if kind == 'not':
+        val = _eval(tree[1], state)
+        return UNKNOWN if val is UNKNOWN else not val
+    a = _eval(tree[1], state)
+    if kind in ('and', 'or'):
+        if (kind == 'and' and a is False) or (kind == 'or' and a is True):
+            return a
+        b = _eval(tree[2], state)
+        if a is UNKNOWN or b is UNKNOWN:
+            # Короткое замыкание по известному операнду справа
+            if kind == 'and' and (a is False or b is False or b == 0):
+                return False
+            if kind == 'or' and (b is True or (b is not UNKNOWN and b)):
+                return True
+            return UNKNOWN
+        return bool(a and b) if kind == 'and' else bool(a or b)
+    b = _eval(tree[2], state)
+    if a is UNKNOWN or b is UNKNOWN:
+        return UNKNOWN
+    if kind in _CMP:
+        return _CMP[kind](a, b)
+    return _clamp(_ARITH[kind](a, b))
+
+def _clamp(val):
+    """Большие значения не различаем - иначе счётчики порождают бесконечно много состояний"""
+    return UNKNOWN if val is UNKNOWN or abs(val) > VALUE_LIMIT else val
+
+# ----------------------------------------------------------------------
+# Обход
+
+def _walk(code):
+    """Все инструкции, включая вложенные в ветки if"""
+    for op in code:
+        yield op
+        if op[0] == 'if':
+            yield from _walk(op[2])
+            yield from _walk(op[3])
+
+class StateExplorer:
+    """
+    Обходит конфигурации (локация, состояние) в ширину от стартовой локации.
+    Состояние хранится сжато: отсортированный кортеж ненулевых (переменная, значение),
+    посещённые конфигурации - множество пар (индекс локации, номер состояния).
+    """
+    def __init__(self, content: str):
+        self.names = []     # имя метки (в нижнем регистре) по индексу
+        self.code = []      # скомпилированный код по индексу
+        matches = list(LOC_PATTERN.finditer(content))
+        for i, m in enumerate(matches):
+            end = matches[i + 1].start() if i + 1 < len(matches) else len(content)
+            self.names.append(m.group(1).strip().lower())
+            self.code.append(_compile_branch(_split_statements(content[m.end():end])))
+        self.index = {}
+        for i, name in enumerate(self.names):
+            self.index.setdefault(name, i)  # у дубликатов работает первая метка
+        # Предметы и переменные в URQ живут в одном пространстве имён,
+        # но perkill и invkill без аргумента чистят каждый своё
+        self.items = {op[1] for code in self.code for op in _walk(code) if op[0] == 'add'}
+
+    def explore(self, max_states: int = MAX_STATES, stop=None) -> Dict[str, Any]:
+        """
+        Возвращает словарь:
+        - 'visited': множество индексов локаций, чей код исполнялся;
+        - 'endings': индекс локации -> сколько разных состояний в ней закончили игру;
+        - 'phantoms': множество имён несуществующих целей, до которых дошло исполнение;
+        - 'configs', 'states': сколько конфигураций и разных состояний пройдено;
+        - 'complete': обход завершён (не упёрся в лимит и не прерван);
+        - 'overflow': локации, где исполнение зациклилось или ветвилось слишком сильно.
+        """
+        result = {'visited': set(), 'endings': {}, 'phantoms': set(), 'configs': 0,
+                  'states': 0, 'complete': True, 'overflow': set()}
+        if not self.code:
+            return result
+
+        states = {(): 0}                # сжатое состояние -> номер
+        seen = {(0, 0)}
+        queue = deque([(0, ())])
+
+        while queue:
+            if len(seen) > max_states or (stop and not result['configs'] & STOP_CHECK_MASK and stop()):
+                result['complete'] = False
+                break
+            loc, frozen = queue.popleft()
+            result['configs'] += 1
+            for state, buttons, last in self._run(loc, dict(frozen), result):
+                if not buttons:
+                    result['endings'][last] = result['endings'].get(last, 0) + 1
+                    continue
+                key = tuple(sorted((k, v) for k, v in state.items() if v != 0))
+                sid = states.setdefault(key, len(states))
+                for target in buttons:
+                    t = self.index.get(target)
+                    if t is None:
+                        result['phantoms'].add(target)
+                    elif (t, sid) not in seen:
+                        seen.add((t, sid))
+                        queue.append((t, key))
+
+        result['states'] = len(states)
+        return result
+
+    def _run(self, loc: int, state: dict, result) -> List[tuple]:
+        """
+        Исполняет ход игрока: код локации с переходами goto/proc и на следующую метку.
+        Возвращает варианты (состояние, цели кнопок, локация, где исполнение закончилось).
+        """
+        outcomes = []
+        # Рабочий список: (инструкции, позиция, состояние, кнопки, стек возврата из proc, переходов)
+        work = [(loc, self.code[loc], 0, state, (), (), 0)]
+        while work:
+            cur, code, pc, state, buttons, ret, jumps = work.pop()
+            result['visited'].add(cur)
+            if jumps > MAX_JUMPS or len(outcomes) + len(work) > MAX_FORKS:
+                result['overflow'].add(cur)
+                continue
+            while pc < len(code):
+                op = code[pc]
+                pc += 1
+                kind = op[0]
+                if kind == 'set':
+                    state = dict(state)
+                    state[op[1]] = _clamp(_eval(op[2], state))
+                elif kind == 'add':
+                    state = dict(state)
+                    old = state.get(op[1], 0)
+                    new = UNKNOWN if old is UNKNOWN else _clamp(old + op[2])
+                    state[op[1]] = UNKNOWN if new is UNKNOWN else max(0, new)
+                elif kind in ('perkill', 'invkill'):
+                    if op[1]:
+                        state = {k: v for k, v in state.items() if k != op[1]}
+                    else:
+                        items = kind == 'perkill'   # perkill оставляет предметы, invkill - переменные
+                        state = {k: v for k, v in state.items() if (k in self.items) == items}
+                elif kind == 'btn':
+                    buttons = buttons + (op[1],)
+                elif kind == 'text':
+                    buttons = buttons + tuple(b[1] for b in op[1])
+                elif kind == 'clear':
+                    buttons = ()
+                elif kind == 'if':
+                    val = _eval(op[1], state)
+                    rest = code[pc:]
+                    if val is UNKNOWN or val == 0 or val is False:
+                        work.append((cur, op[3] + rest, 0, state, buttons, ret, jumps))
+                    if val is UNKNOWN or (val is not False and val != 0):
+                        work.append((cur, op[2] + rest, 0, state, buttons, ret, jumps))
+                    break
+                elif kind in ('goto', 'proc'):
+                    t = self.index.get(op[1])
+                    if t is None:
+                        result['phantoms'].add(op[1])
+                        continue
+                    if kind == 'proc':
+                        ret = ret + ((cur, code[pc:]),)
+                    work.append((t, self.code[t], 0, state, buttons, ret, jumps + 1))
+                    break
+                elif kind == 'end':
+                    pc = len(code)
+                    if ret:
+                        # end в процедуре - возврат к вызвавшему коду
+                        (cur, code), ret = ret[-1], ret[:-1]
+                        work.append((cur, code, 0, state, buttons, ret, jumps))
+                        break
+                    outcomes.append((state, buttons, cur))
+                    break
+            else:
+                # Код кончился без end: исполнение идёт на следующую метку
+                if cur + 1 < len(self.code):
+                    work.append((cur + 1, self.code[cur + 1], 0, state, buttons, ret, jumps + 1))
+                elif ret:
+                    (cur, code), ret = ret[-1], ret[:-1]
+                    work.append((cur, code, 0, state, buttons, ret, jumps))
+                else:
+                    outcomes.append((state, buttons, cur))
+        return outcomes
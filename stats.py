@@ -1,12 +1,25 @@
 # stats.py
 from collections import Counter, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from typing import List, Dict, Any, Tuple
 import re
+import time
+import random
+import multiprocessing
+import warnings
 
 try:
-    from .urq_parser import Loc 
+    from .urq_parser import (Loc, LINK_TARGET_ID, LINK_TYPE, LINK_LABEL, LINK_IS_PHANTOM,
+                             build_proc_summaries, call_return_links)
+    from .balance import absorption_stats, simulate
+    from .urq_graph import RouteSampler, k_shortest_paths, bidirectional_path, reverse_adjacency
+    from .state_explorer import StateExplorer, MAX_STATES
 except ImportError:
-    from urq_parser import Loc 
+    from urq_parser import (Loc, LINK_TARGET_ID, LINK_TYPE, LINK_LABEL, LINK_IS_PHANTOM,
+                            build_proc_summaries, call_return_links)
+    from balance import absorption_stats, simulate
+    from urq_graph import RouteSampler, k_shortest_paths, bidirectional_path, reverse_adjacency
+    from state_explorer import StateExplorer, MAX_STATES
 except Exception: 
     class Loc: pass
 
@@ -17,12 +30,21 @@ TOP_N = 5
 BAR_WIDTH = 20
 MAX_DEPTH = 50
 MAX_CHARS = 60
+FRAGILE_LIMIT = 20  # сколько мостов и точек сочленения показывать в отчёте
+BALANCE_LIMIT = 10  # сколько тупиков показывать в разделе баланса
+DEPTH_BUCKETS = 12  # сколько строк максимум в гистограммах глубины
+LOOPS_LIMIT = 10    # сколько циклов показывать
 
 # Лимиты для поиска путей
 MAX_PATHS = 500          # Лимит путей на одну концовку (не суммарный!)
 MAX_PATHS_PER_END = 100  # Максимум путей для одной конкретной концовки
+PATH_TIME_BUDGET = 10.0  # Секунд на поиск путей до одной концовки
+ROUTES_TIME_BUDGET = 2.0  # Секунд на кратчайшие маршруты всех концовок (делятся поровну)
+TIME_CHECK_MASK = 0x3FF  # Проверяем часы раз в 1024 шага обхода
+POOL_POLL = 0.2          # Как часто (с) пул процессов проверяет отмену
 
-LINK_TUPLE_SIZE = 7
+LINK_TUPLE_SIZE = 8
+ROUTE_TYPES = ('btn', 'goto', 'auto')  # по каким связям ищем маршрут между локациями
 
 # Регекс для подсчета слов
 WORD_RE = re.compile(r'\S+')
@@ -31,22 +53,99 @@ def title(text: str, char: str = "=") -> str:
     """Создаёт заголовок с подчёркиванием"""
     return f"{text}\n{char * len(text)}"
 
-def get_stats(locs: List[Loc], analyze_paths: bool = True) -> str:
+class StatsBudget:
+    """
+    Кооперативная отмена и лимит времени для этапов статистики.
+    Этапы сами спрашивают expired() и пропускают дорогую работу.
+    """
+    def __init__(self, cancel=None, time_budget=None, progress=None):
+        self.cancel = cancel          # объект с is_set(), например threading.Event
+        self.deadline = time.monotonic() + time_budget if time_budget else None
+        self.progress = progress      # callback(процент, название_этапа)
+        self.stopped = None           # причина остановки: 'cancel' или 'budget'
+
+    def expired(self) -> bool:
+        """Пора ли остановиться (отмена пользователем или кончилось время)"""
+        if self.stopped:
+            return True
+        if self.cancel is not None and self.cancel.is_set():
+            self.stopped = 'cancel'
+        elif self.deadline is not None and time.monotonic() > self.deadline:
+            self.stopped = 'budget'
+        return bool(self.stopped)
+
+    def remaining(self, limit: float = None) -> float:
+        """Сколько секунд осталось, но не больше limit"""
+        if self.deadline is None:
+            return limit
+        left = max(0.0, self.deadline - time.monotonic())
+        return left if limit is None else min(left, limit)
+
+    def stage(self, percent: int, name: str):
+        """Сообщает о прогрессе этапа"""
+        if self.progress:
+            self.progress(percent, name)
+
+def get_stats(locs: List[Loc], analyze_paths: bool = True, cancel=None,
+              time_budget: float = None, progress=None, path_workers: int = 0,
+              balance: bool = True, sample_routes: int = 0, seed: int = 0,
+              shortest_routes: int = 0, xref=None) -> str:
     """
     Формирует текст статистики квеста.
     
     :param locs: Список локаций, полученных от UrqParser.
     :param analyze_paths: Если False, пропускает ресурсоёмкий поиск путей до концовок.
                           Полезно для больших квестов или когда нужна только базовая статистика.
+    :param cancel: Токен отмены (объект с is_set(), например threading.Event).
+    :param time_budget: Общий лимит времени в секундах (None — без лимита).
+    :param progress: callback(процент, этап) для отображения прогресса.
+    :param path_workers: Число процессов для поиска путей (0/1 — в текущем потоке).
+                         Пул процессов не работает внутри плагин-хоста Sublime,
+                         только в фоновом процессе или из командной строки.
+    :param balance: Считать вероятности концовок для случайного игрока.
+    :param sample_routes: Сколько случайных маршрутов показать для каждой концовки (0 — не показывать).
+                          Маршруты выбираются равновероятно из всех, без перебора путей.
+    :param seed: Зерно генератора для выборки маршрутов.
+    :param shortest_routes: Сколько кратчайших разных маршрутов показать для каждой концовки (0 — не показывать).
+    :param xref: XrefIndex парсера (UrqParser.xref) — раздел о переменных и предметах.
+    
+    При отмене или исчерпании лимита дешёвые секции всё равно попадают в отчёт,
+    а дорогие пропускаются с пометкой.
     """
     if not locs:
         return f"\n{title('Статистика Квеста')}\n\nПусто. Грустно.\n"
     
+    budget = StatsBudget(cancel, time_budget, progress)
+    
+    budget.stage(0, "Сбор статистики")
     s = _collect_stats(locs)
     s['orphans'] = _get_orphans(locs)
-    s['graph_stats'] = _analyze_graph(locs, analyze_paths=analyze_paths)
+    
+    budget.stage(20, "Мосты и точки сочленения")
+    s['fragile'] = find_bridges(locs) if not budget.expired() else {}
+    
+    budget.stage(30, "Баланс концовок")
+    s['balance'] = absorption_stats(locs, stop=budget.expired) if balance and not budget.expired() else None
+    
+    s['route_samples'] = {}
+    if sample_routes > 0 and not budget.expired():
+        budget.stage(35, "Примеры маршрутов")
+        s['route_samples'] = _sample_routes(locs, sample_routes, seed)
+    
+    s['shortest_routes'] = {}
+    if shortest_routes > 0 and not budget.expired():
+        budget.stage(38, "Кратчайшие маршруты")
+        s['shortest_routes'], s['shortest_cut'] = _shortest_routes(locs, shortest_routes, stop=budget.expired)
+    
+    budget.stage(40, "Анализ путей")
+    s['graph_stats'] = _analyze_graph(locs, analyze_paths=analyze_paths, budget=budget,
+                                      path_workers=path_workers)
+    budget.stage(100, "Готово")
     
     lines = [title("Общая Статистика Квеста")]
+    if budget.stopped:
+        reason = "прервана пользователем" if budget.stopped == 'cancel' else f"остановлена по лимиту времени ({time_budget:g} с)"
+        lines.append(f"⚠ Статистика {reason}, часть разделов пропущена.\n")
     lines.append(f"Локации: {s['total']} шт.")
     if s['endings']: 
         lines.append(f"Концовки: {s['endings']} шт.")
@@ -54,12 +153,140 @@ def get_stats(locs: List[Loc], analyze_paths: bool = True) -> str:
         lines.append(f"Символов в pln/p: {s['desc_chars']}")
     
     _add_loc_section(lines, s)
+    _add_depth_section(lines, locs)
+    _add_loops_section(lines, locs)
+    _add_xref_section(lines, xref)
     _add_link_section(lines, s, analyze_paths=analyze_paths)
+    _add_shortest_routes_section(lines, s)
+    _add_route_samples_section(lines, s)
+    _add_balance_section(lines, s)
     _add_link_labels_section(lines, s)
     _add_problems_section(lines, s)
     
     return "\n".join(lines)
 
+def get_simulation_stats(locs: List[Loc], walkers: int = 100000, max_steps: int = 1000,
+                         seed: int = 0, cancel=None) -> str:
+    """
+    Отчёт по случайным прохождениям (Монте-Карло, см. balance.simulate).
+    Дополняет точный раздел "Случайный игрок": показывает разброс и
+    "тепловую карту" посещений.
+    """
+    if not locs:
+        return f"\n{title('Симуляция прохождений')}\n\nПусто. Грустно.\n"
+    
+    started = time.monotonic()
+    stop = cancel.is_set if cancel is not None else None
+    sim = simulate(locs, walkers=walkers, max_steps=max_steps, seed=seed, stop=stop)
+    elapsed = max(time.monotonic() - started, 1e-9)
+    total = sim['walkers'] or 1
+    
+    lines = [title("Симуляция прохождений")]
+    if sim['stopped']:
+        lines.append("⚠ Симуляция прервана пользователем, результаты неполные.\n")
+    lines.append(f"Игроков: {sim['walkers']} (seed {seed}, не больше {max_steps} ходов)")
+    lines.append(f"Ходов: {sim['steps']} ({sim['steps'] / elapsed / 1e6:.1f} млн/с, {sim['backend']})")
+    lines.append(f"Средняя длина прохождения: {sim['avg_length']:.1f} ходов\n")
+    
+    formatter = lambda item: f'- "{item[0].name}"'
+    if sim['endings']:
+        lines.append(f"{title('Концовки', '-')}\n")
+        lines.extend(_format_probs([(loc, cnt / total) for loc, cnt in sim['endings']], formatter))
+        lines.append("")
+    
+    if sim['dead_ends']:
+        dead = sim['dead_ends']
+        lines.append(f"{title('Тупики', '-')}\n")
+        lines.extend(_format_probs([(loc, cnt / total) for loc, cnt in dead[:BALANCE_LIMIT]], formatter))
+        if len(dead) > BALANCE_LIMIT:
+            lines.append(f"- ... и ещё {len(dead) - BALANCE_LIMIT} шт.")
+        lines.append("")
+    
+    if sim['phantom']:
+        lines.append(f"Ушли по фантомным ссылкам: {sim['phantom']} ({sim['phantom'] / total * 100:.1f}%)")
+    if sim['stuck']:
+        lines.append(f"Не закончили за {max_steps} ходов: {sim['stuck']} ({sim['stuck'] / total * 100:.1f}%)")
+    if sim['phantom'] or sim['stuck']:
+        lines.append("")
+    
+    heat = sorted(((loc, cnt) for loc, cnt in zip(locs, sim['heat']) if cnt), key=lambda x: -x[1])
+    if heat:
+        top = heat[:TOP_N]
+        lines.append(f"{title(f'Самые посещаемые локации (топ {len(top)})', '-')}\n")
+        lines.extend(_format_top_items(top, 1, lambda item: f'- "{item[0].name}": {item[1]}'))
+        lines.append("")
+    
+    cold = [loc.name for loc, cnt in zip(locs, sim['heat']) if not cnt and loc.name]
+    if cold:
+        names = ', '.join(f'"{n}"' for n in cold[:FRAGILE_LIMIT])
+        more = f", ... и ещё {len(cold) - FRAGILE_LIMIT}" if len(cold) > FRAGILE_LIMIT else ""
+        lines.append(f"Ни разу не посещены: {len(cold)} шт. ({names}{more})\n")
+    
+    return "\n".join(lines)
+
+def get_state_stats(locs: List[Loc], content: str, max_states: int = MAX_STATES, cancel=None) -> str:
+    """
+    Отчёт по обходу с учётом переменных и предметов (см. state_explorer).
+    Сравнивает его с графом ссылок: какие локации и концовки есть на схеме,
+    но не открываются ни при каком состоянии игры.
+    
+    :param content: Текст квеста без комментариев, с инклюдами (UrqParser.read_source).
+    :param max_states: Лимит конфигураций (локация, состояние).
+    """
+    if not locs or not content:
+        return f"\n{title('Анализ с учётом состояния')}\n\nПусто. Грустно.\n"
+    
+    started = time.monotonic()
+    stop = cancel.is_set if cancel is not None else None
+    explorer = StateExplorer(content)
+    res = explorer.explore(max_states=max_states, stop=stop)
+    elapsed = time.monotonic() - started
+    
+    # Метки обходчика и парсера сопоставляем по имени: у дубликатов работает первая
+    by_name = {}
+    for loc in locs:
+        by_name.setdefault(loc.name.strip().lower(), loc)
+    visited = {explorer.names[i] for i in res['visited']}
+    quote = lambda names: ', '.join(f'"{n}"' for n in names[:FRAGILE_LIMIT]) + (
+        f", ... и ещё {len(names) - FRAGILE_LIMIT}" if len(names) > FRAGILE_LIMIT else "")
+    
+    lines = [title("Анализ с учётом состояния")]
+    if not res['complete']:
+        reason = "прерван пользователем" if stop and stop() else f"упёрся в лимит {max_states} конфигураций"
+        lines.append(f"⚠ Обход {reason}: недостижимость ниже не доказана.\n")
+    lines.append(f"Конфигураций (локация, состояние): {res['configs']}")
+    lines.append(f"Разных состояний переменных и предметов: {res['states']}")
+    lines.append(f"Локаций исполнено: {len(visited)} из {len(explorer.names)} ({elapsed:.1f} с)\n")
+    
+    if res['endings']:
+        lines.append(f"{title('Достижимые концовки', '-')}\n")
+        for idx, cnt in sorted(res['endings'].items(), key=lambda x: -x[1]):
+            loc = by_name.get(explorer.names[idx])
+            lines.append(f'- "{loc.name if loc else explorer.names[idx]}" (состояний: {cnt})')
+        lines.append("")
+    
+    # Что граф ссылок считает достижимым, а обход с состоянием - нет.
+    # Технические локации (common, use_, inv_) обходчик не моделирует
+    blocked = [loc for loc in locs if not loc.orphan and not loc.tech
+               and loc.name.strip().lower() not in visited]
+    lost_ends = [loc.name for loc in blocked if loc.end]
+    what = "не открываются" if res['complete'] else "не найдены за лимит"
+    if lost_ends:
+        lines.append(f"Концовки есть на схеме, но {what}: {quote(lost_ends)}")
+    if blocked:
+        lines.append(f"Локации достижимы по ссылкам, но {what} ни при каком состоянии: "
+                     f"{len(blocked)} шт. ({quote([loc.name for loc in blocked])})")
+    if lost_ends or blocked:
+        lines.append("")
+    
+    if res['phantoms']:
+        lines.append(f"Исполнение доходит до несуществующих меток: {quote(sorted(res['phantoms']))}")
+    if res['overflow']:
+        names = sorted(explorer.names[i] for i in res['overflow'])
+        lines.append(f"Слишком много переходов или ветвлений за ход (обход неполный): {quote(names)}")
+    
+    return "\n".join(lines)
+
 def _get_orphans(locs: List[Loc]) -> List[str]:
     """Получает список сироток из готовых флагов"""
     return [loc.name for loc in locs if loc.name and hasattr(loc, 'orphan') and loc.orphan]
@@ -74,7 +301,7 @@ def _collect_stats(locs: List[Loc]) -> Dict[str, Any]:
         'targets': defaultdict(int), 'link_counts': [], 'labels': [],
         'auto_links': [], 'max_desc': (0, ""), 'max_links': (0, ""),
         'desc_lens': [], 'label_lens': [], 'tech': 0, 'tech_names': [],
-        'orphan': 0, 'orphan_names': []
+        'orphan': 0, 'orphan_names': [], 'guarded': 0
     }
     
     for loc in locs:
@@ -118,12 +345,13 @@ def _collect_stats(locs: List[Loc]) -> Dict[str, Any]:
         loc_phantoms = {}
         
         for link_tuple in links:
-            if not link_tuple or len(link_tuple) < LINK_TUPLE_SIZE:
+            if not _full_link(link_tuple):
                 continue
             
-            link_id, target, link_type, label, phantom, menu, local = link_tuple
+            link_id, target, link_type, label, phantom, menu, local, guard = link_tuple
             
             s['links_total'] += 1
+            if guard: s['guarded'] += 1
             
             if link_type == 'btn':
                 s['btn'] += 1
@@ -161,19 +389,56 @@ def _collect_stats(locs: List[Loc]) -> Dict[str, Any]:
     
     return s
 
-def _analyze_graph(locs: List[Loc], analyze_paths: bool = True) -> Dict[str, Any]:
+def _link_label(link_type: str, label: str) -> str:
+    """Надпись перехода для путей: текст кнопки или тип связи"""
+    if link_type == "btn" and label and label.strip():
+        return label.strip()
+    return {"goto": "goto", "auto": "авто", "proc": "proc"}.get(link_type, link_type)
+
+def find_route(locs: List[Loc], source: int, target: int, types=ROUTE_TYPES) -> str:
     """
-    Анализ графа.
-    Если analyze_paths=False, пропускает поиск путей до концовок —
-    возвращает только базовую статистику достижимости.
+    Кратчайший маршрут между локациями (индексы в locs) встречным BFS.
+    Учитываются только связи типов types, proc - через кнопки, которые
+    добавляет процедура. Возвращает текст маршрута
+    в формате путей статистики или пустую строку, если пути нет.
     """
-    if not locs:
-        return {}
+    pos = {loc.id: i for i, loc in enumerate(locs)}
+    summaries = build_proc_summaries(locs)
+    adj, labels = [], []
+    for loc in locs:
+        edges = [(pos[link[LINK_TARGET_ID]], _link_label(link[LINK_TYPE], link[LINK_LABEL]))
+                 for link in call_return_links(loc, pos, summaries)
+                 if link[LINK_TYPE] in types and not link[LINK_IS_PHANTOM] and link[LINK_TARGET_ID] in pos]
+        adj.append([w for w, _ in edges])
+        labels.append([lbl for _, lbl in edges])
     
+    route = bidirectional_path(adj, reverse_adjacency(adj), source, target)
+    if route is None:
+        return ""
+    names = [loc.name for loc in locs]
+    return f"{len(route) - 1} шагов:\n{_format_path_with_labels(_labeled_path(route, names, labels))}"
+
+def _full_link(link_tuple) -> bool:
+    """Связь в формате парсера; короткие кортежи (старый формат) пропускаются с предупреждением"""
+    if not link_tuple:
+        return False
+    if len(link_tuple) < LINK_TUPLE_SIZE:
+        warnings.warn(f"URQ Stats: связь из {len(link_tuple)} полей вместо {LINK_TUPLE_SIZE} пропущена: {link_tuple!r}",
+                      RuntimeWarning, stacklevel=2)
+        return False
+    return True
+
+def _build_graph(locs: List[Loc]) -> Tuple[Dict[str, List[Tuple[str, str]]], set, List[str]]:
+    """Граф по именам локаций: graph[имя] -> [(цель, надпись перехода)], плюс все имена и концовки"""
     graph = {}
     all_locs = set()
     endings = []
     
+    # proc возвращается к вызывающей локации: вместо перехода в процедуру
+    # берём кнопки, которые она добавляет (сводка считается раз на процедуру)
+    pos = {loc.id: i for i, loc in enumerate(locs)}
+    summaries = build_proc_summaries(locs)
+    
     for loc in locs:
         name = loc.name
         if not name:
@@ -184,21 +449,46 @@ def _analyze_graph(locs: List[Loc], analyze_paths: bool = True) -> Dict[str, Any
         if loc.end:
             endings.append(name)
             
-        for link_tuple in getattr(loc, 'links', []):
-            if not link_tuple or len(link_tuple) < LINK_TUPLE_SIZE:
+        for link_tuple in call_return_links(loc, pos, summaries):
+            if not _full_link(link_tuple):
                 continue
                 
-            link_id, target, link_type, label, phantom, menu, local = link_tuple
+            link_id, target, link_type, label, phantom, menu, local, guard = link_tuple
             if not target or phantom:
                 continue
             
-            if link_type == "btn" and label and label.strip():
-                link_label = label.strip()
-            else:
-                link_label = {"goto": "goto", "auto": "авто", "proc": "proc"}.get(link_type, link_type)
-            
-            graph[name].append((target, link_label))
+            graph[name].append((target, _link_label(link_type, label)))
     
+    return graph, all_locs, endings
+
+def _called_bodies(locs: List[Loc], names: set) -> set:
+    """Имена локаций, код которых выполняется в proc-вызовах из локаций names"""
+    pos = {loc.id: i for i, loc in enumerate(locs)}
+    summaries = build_proc_summaries(locs)
+    called = set()
+    for loc in locs:
+        if loc.name not in names:
+            continue
+        for link in loc.links:
+            summary = summaries.get(pos.get(link[LINK_TARGET_ID])) if link[LINK_TYPE] == 'proc' else None
+            if summary:
+                called.update(locs[i].name for i in summary['body'])
+    return called
+
+def _analyze_graph(locs: List[Loc], analyze_paths: bool = True, budget: StatsBudget = None,
+                   path_workers: int = 0) -> Dict[str, Any]:
+    """
+    Анализ графа.
+    Если analyze_paths=False, пропускает поиск путей до концовок —
+    возвращает только базовую статистику достижимости.
+    budget позволяет прервать поиск путей между концовками и внутри обхода.
+    path_workers > 1 — искать пути до разных концовок параллельно в пуле процессов.
+    """
+    budget = budget or StatsBudget()
+    if not locs:
+        return {}
+    
+    graph, all_locs, endings = _build_graph(locs)
     if not graph:
         return {}
     
@@ -214,22 +504,33 @@ def _analyze_graph(locs: List[Loc], analyze_paths: bool = True) -> Dict[str, Any
         'total_paths': 0,
         'paths_skipped': not analyze_paths,   # флаг: поиск путей был пропущен
         'paths_truncated': False,              # флаг: лимит путей был достигнут
+        'paths_exhausted': False,              # флаг: кончилось время на поиск
+        'paths_stopped': None,                 # причина остановки поиска: 'cancel' / 'budget'
     }
     
     # Достижимость от старта считаем всегда — это дёшево
     reachable = _bfs_reachable(graph, start)
+    reachable |= _called_bodies(locs, reachable)
     s['reachable_count'] = len(reachable)
     
     if not analyze_paths:
         return s
     
-    # Анализ путей до концовок
-    for end in endings:
-        # Отдельный лимит на каждую концовку, не суммарный
-        paths, truncated = _find_paths_limited(graph, start, end, MAX_DEPTH, MAX_PATHS_PER_END)
-        
+    # Анализ путей до концовок: поиски для разных концовок независимы
+    if path_workers > 1 and len(endings) > 1:
+        found = _iter_paths_parallel(graph, start, endings, budget, path_workers)
+    else:
+        found = _iter_paths(graph, start, endings, budget)
+    
+    for end, (paths, truncated, exhausted) in found:
         if truncated:
             s['paths_truncated'] = True
+        if exhausted:
+            # Остановка общим бюджетом/отменой — не то же самое, что лимит на концовку
+            if budget.expired():
+                s['paths_stopped'] = budget.stopped
+            else:
+                s['paths_exhausted'] = True
 
         if paths:
             # path[0] = (start, "") — стартовый узел без перехода,
@@ -242,6 +543,7 @@ def _analyze_graph(locs: List[Loc], analyze_paths: bool = True) -> Dict[str, Any
             s['paths_to_endings'][end] = {
                 'count': len(paths),
                 'truncated': truncated,
+                'exhausted': exhausted,
                 'shortest_len': path_steps[shortest_idx],
                 'longest_len': path_steps[longest_idx], 
                 'shortest_path': paths[shortest_idx],
@@ -251,59 +553,245 @@ def _analyze_graph(locs: List[Loc], analyze_paths: bool = True) -> Dict[str, Any
             s['total_paths'] += len(paths)
             s['max_depth'] = max(s['max_depth'], max(path_steps))
     
+    if budget.stopped:
+        s['paths_stopped'] = budget.stopped
+    
     return s
 
+def _index_graph(graph: Dict[str, List[Tuple[str, str]]]):
+    """Переводит граф по именам в индексный для urq_graph: (names, index, adj, labels)"""
+    names = list(graph)
+    index = {name: i for i, name in enumerate(names)}
+    adj, labels = [], []
+    for name in names:
+        edges = [(index[t], lbl) for t, lbl in graph[name] if t in index]
+        adj.append([w for w, _ in edges])
+        labels.append([lbl for _, lbl in edges])
+    return names, index, adj, labels
+
+def _labeled_path(route: List[Tuple[int, int]], names: List[str], labels) -> List[Tuple[str, str]]:
+    """Индексный путь [(вершина, номер ребра)] -> [(локация, надпись перехода)]"""
+    path = []
+    prev = -1
+    for v, edge in route:
+        path.append((names[v], labels[prev][edge] if edge >= 0 else ""))
+        prev = v
+    return path
+
+def _shortest_routes(locs: List[Loc], k: int, stop=None,
+                     time_limit: float = ROUTES_TIME_BUDGET) -> Tuple[Dict[str, List[List[Tuple[str, str]]]], int]:
+    """
+    Для каждой концовки: k кратчайших маршрутов без повторов локаций.
+    Первый маршрут (BFS) находится всегда, на остальные у концовки своя доля time_limit.
+    Возвращает (маршруты, сколько концовок недосчитано из-за лимита).
+    """
+    graph, _, endings = _build_graph(locs)
+    start = locs[0].name if locs[0].name else "start"
+    if start not in graph or not endings:
+        return {}, 0
+    
+    names, index, adj, labels = _index_graph(graph)
+    share = time_limit / len(endings)
+    result = {}
+    cut = 0
+    for end in endings:
+        if stop and stop():
+            break
+        deadline = time.monotonic() + share
+        end_stop = lambda: (stop is not None and stop()) or time.monotonic() > deadline
+        routes = k_shortest_paths(adj, index[start], index[end], k, stop=end_stop)
+        if routes:
+            result[end] = [_labeled_path(route, names, labels) for route in routes]
+            if len(routes) < k and end_stop():
+                cut += 1
+    return result, cut
+
+def _sample_routes(locs: List[Loc], k: int, seed: int = 0) -> Dict[str, Dict[str, Any]]:
+    """
+    Для каждой концовки: число маршрутов от старта и k случайных маршрутов.
+    Маршруты в формате _find_paths_limited: [(локация, надпись перехода)].
+    """
+    graph, _, endings = _build_graph(locs)
+    start = locs[0].name if locs[0].name else "start"
+    if start not in graph:
+        return {}
+    
+    names, index, adj, labels = _index_graph(graph)
+    sampler = RouteSampler(adj)
+    rng = random.Random(seed)
+    result = {}
+    for end in endings:
+        count = sampler.count(index[start], index[end])
+        if not count:
+            continue
+        routes = []
+        for route in sampler.sample(index[start], index[end], min(k, count), rng):
+            path = _labeled_path(route, names, labels)
+            if path not in routes:  # при малом числе маршрутов выборка повторяется
+                routes.append(path)
+        result[end] = {'count': count, 'routes': routes}
+    return result
+
+def _iter_paths(graph, start, endings, budget):
+    """Ищет пути до концовок по очереди, выдаёт (концовка, результат _find_paths_limited)"""
+    for i, end in enumerate(endings):
+        if budget.expired():
+            return
+        budget.stage(40 + 60 * i // len(endings), f"Пути до концовки {i + 1}/{len(endings)}")
+        
+        # Отдельный лимит на каждую концовку, не суммарный
+        yield end, _find_paths_limited(
+            graph, start, end, MAX_DEPTH, MAX_PATHS_PER_END,
+            budget.remaining(PATH_TIME_BUDGET), budget.cancel)
+
+# Граф для процессов пула: передаётся один раз при старте процесса, а не с каждой задачей
+_pool_graph = None
+_pool_start = None
+_pool_stop = None
+
+def _init_path_pool(graph, start, stop):
+    """Инициализатор процесса пула"""
+    global _pool_graph, _pool_start, _pool_stop
+    _pool_graph, _pool_start, _pool_stop = graph, start, stop
+
+def _pool_find_paths(end, time_budget):
+    """Задача пула: пути до одной концовки по графу процесса"""
+    return _find_paths_limited(_pool_graph, _pool_start, end, MAX_DEPTH, MAX_PATHS_PER_END,
+                               time_budget, _pool_stop)
+
+def _iter_paths_parallel(graph, start, endings, budget, workers):
+    """
+    Ищет пути до концовок в пуле процессов, выдаёт результаты в порядке endings.
+    Отмена снимает ещё не начатые задачи и останавливает начатые через общий Event.
+    Если задача упала (процесс пула убит, данные не передались), её концовка
+    досчитывается в этом процессе, как при последовательном поиске.
+    Пул нужно запускать вне плагин-хоста Sublime (например, в analysis_worker).
+    """
+    results = {}
+    failed = []
+    ctx = multiprocessing.get_context()
+    stop = ctx.Event()
+    pool = ProcessPoolExecutor(max_workers=min(workers, len(endings)), mp_context=ctx,
+                               initializer=_init_path_pool, initargs=(graph, start, stop))
+    try:
+        pending = {}
+        for end in endings:
+            try:
+                pending[pool.submit(_pool_find_paths, end, budget.remaining(PATH_TIME_BUDGET))] = end
+            except Exception as e:
+                warnings.warn(f"URQ Stats: пул поиска путей недоступен ({e!r}), считаем без него",
+                              RuntimeWarning)
+                failed.extend(end for end in endings if end not in pending.values())
+                break
+        while pending:
+            if budget.expired():
+                stop.set()
+                for fut in pending:
+                    fut.cancel()
+                break
+            done, _ = wait(pending, timeout=POOL_POLL, return_when=FIRST_COMPLETED)
+            for fut in done:
+                end = pending.pop(fut)
+                try:
+                    results[end] = fut.result()
+                except Exception as e:
+                    warnings.warn(f"URQ Stats: поиск путей до '{end}' в пуле упал ({e!r}), "
+                                  f"считаем без пула", RuntimeWarning)
+                    failed.append(end)
+            if done:
+                budget.stage(40 + 60 * len(results) // len(endings),
+                             f"Пути до концовок: {len(results)}/{len(endings)}")
+    finally:
+        pool.shutdown(wait=True)
+    
+    for end in failed:
+        if budget.expired():
+            break
+        results[end] = _find_paths_limited(graph, start, end, MAX_DEPTH, MAX_PATHS_PER_END,
+                                           budget.remaining(PATH_TIME_BUDGET), budget.cancel)
+    for end in endings:
+        if end in results:
+            yield end, results[end]
+
 def _find_paths_limited(
     graph: Dict[str, List[Tuple[str, str]]],
     start: str,
     end: str,
     max_depth: int,
-    max_paths: int
-) -> Tuple[List[List[Tuple[str, str]]], bool]:
+    max_paths: int,
+    time_budget: float = None,
+    cancel=None
+) -> Tuple[List[List[Tuple[str, str]]], bool, bool]:
     """
-    Находит пути из start в end с ограничением глубины и количества.
+    Находит пути из start в end с ограничением глубины, количества и времени.
 
-    Возвращает (список_путей, был_ли_достигнут_лимит).
+    Возвращает (список_путей, был_ли_достигнут_лимит, исчерпан_ли_бюджет_времени).
     Каждый путь — список кортежей (имя_локации, метка_перехода).
     Первый элемент пути: (start, ""), остальные — цели с метками переходов.
 
+    Обход итеративный (явный стек итераторов), поэтому длинные цепочки
+    не упираются в лимит рекурсии. Текущий путь хранится в одном буфере,
+    в результат попадают только его копии.
+
+    :param time_budget: Лимит в секундах (None — без лимита). При исчерпании
+                        возвращаются уже найденные пути.
+    :param cancel: Токен отмены (объект с is_set()), проверяется вместе с часами.
+
     Самоссылки (start == end) намеренно не возвращаются — это цикл,
     а не достижение концовки.
     """
     if start not in graph:
-        return [], False
+        return [], False, False
     
     # Самоссылка: старт и конец совпадают, это цикл — не путь до концовки
     if start == end:
-        return [], False
+        return [], False, False
 
     paths: List[List[Tuple[str, str]]] = []
     truncated = False
+    exhausted = False
+    deadline = time.monotonic() + time_budget if time_budget is not None else None
+    steps = 0
 
-    def dfs(node: str, path: List[Tuple[str, str]], visited: set):
-        nonlocal truncated
+    path: List[Tuple[str, str]] = [(start, "")]   # переиспользуемый буфер пути
+    visited = {start}
+    stack = [iter(graph.get(start, []))]
 
-        if len(paths) >= max_paths:
-            truncated = True
-            return
+    while stack:
+        steps += 1
+        if not steps & TIME_CHECK_MASK and (
+                (deadline is not None and time.monotonic() > deadline)
+                or (cancel is not None and cancel.is_set())):
+            exhausted = True
+            break
 
-        if len(path) - 1 > max_depth:
-            return
-
-        if node == end:
-            paths.append(path[:])
-            return
-
-        for target, label in graph.get(node, []):
-            if target not in visited:
+        for target, label in stack[-1]:
+            if target in visited:
+                continue
+            if len(paths) >= max_paths:
+                truncated = True
+                break
+            if len(path) > max_depth:  # переход сделал бы путь длиннее max_depth
+                continue
+            if target == end:
                 path.append((target, label))
-                visited.add(target)
-                dfs(target, path, visited)
+                paths.append(path[:])
                 path.pop()
-                visited.remove(target)
+                continue
+            path.append((target, label))
+            visited.add(target)
+            stack.append(iter(graph.get(target, [])))
+            break
+        else:
+            # Соседи исчерпаны — возвращаемся на шаг назад
+            stack.pop()
+            visited.discard(path.pop()[0])
+            continue
+
+        if truncated:
+            break
 
-    dfs(start, [(start, "")], {start})
-    return paths, truncated
+    return paths, truncated, exhausted
 
 def _bfs_reachable(graph: Dict[str, List[Tuple[str, str]]], start: str) -> set:
     """BFS поиск достижимых вершин. Использует deque для O(n) сложности."""
@@ -322,6 +810,102 @@ def _bfs_reachable(graph: Dict[str, List[Tuple[str, str]]], start: str) -> set:
     
     return reachable
 
+def _undirected_adjacency(locs: List[Loc]) -> Tuple[List[List[Tuple[int, int]]], List[Tuple[int, int]]]:
+    """
+    Неориентированная проекция графа связей.
+    Возвращает (смежность: индекс -> [(сосед, номер_ребра)], рёбра: [(откуда, куда)]).
+    Параллельные связи остаются отдельными рёбрами — такие пары мостами не считаются.
+    """
+    pos = {loc.id: i for i, loc in enumerate(locs)}
+    adj: List[List[Tuple[int, int]]] = [[] for _ in locs]
+    edges: List[Tuple[int, int]] = []
+
+    for i, loc in enumerate(locs):
+        for link_tuple in getattr(loc, 'links', []):
+            if not _full_link(link_tuple) or link_tuple[4]:
+                continue
+            j = pos.get(link_tuple[0])
+            if j is None or j == i:  # фантомы и самоссылки не связывают локации
+                continue
+            e = len(edges)
+            edges.append((i, j))
+            adj[i].append((j, e))
+            adj[j].append((i, e))
+
+    return adj, edges
+
+def find_bridges(locs: List[Loc]) -> Dict[str, Any]:
+    """
+    Мосты и точки сочленения неориентированной проекции графа (итеративный Тарьян, O(V+E)).
+
+    Возвращает:
+    - 'bridges': [(откуда, куда, концовок_отрезано)] — связи-мосты (объекты Loc),
+      концовок_отрезано > 0 только если мост отделяет концовки от стартовой локации;
+    - 'articulation': [Loc] — локации, удаление которых разбивает граф.
+    """
+    if not locs:
+        return {'bridges': [], 'articulation': []}
+
+    adj, edges = _undirected_adjacency(locs)
+    n = len(adj)
+    disc = [0] * n          # время входа (0 — не посещена)
+    low = [0] * n
+    ends_below = [0] * n    # концовок в поддереве DFS
+    next_idx = [0] * n      # следующий сосед для явного стека
+    parent_edge = [-1] * n
+    bridges: List[Tuple[Loc, Loc, int]] = []
+    cut = set()
+    timer = 1
+
+    # Первой обходим компоненту старта — только для неё считаем отрезанные концовки
+    for root in range(n):
+        if disc[root]:
+            continue
+        disc[root] = low[root] = timer
+        timer += 1
+        ends_below[root] = 1 if getattr(locs[root], 'end', False) else 0
+        root_children = 0
+        stack = [root]
+
+        while stack:
+            v = stack[-1]
+            nbrs = adj[v]
+            if next_idx[v] < len(nbrs):
+                w, e = nbrs[next_idx[v]]
+                next_idx[v] += 1
+                if e == parent_edge[v]:
+                    continue
+                if disc[w]:
+                    if disc[w] < low[v]:
+                        low[v] = disc[w]
+                else:
+                    disc[w] = low[w] = timer
+                    timer += 1
+                    ends_below[w] = 1 if getattr(locs[w], 'end', False) else 0
+                    parent_edge[w] = e
+                    if v == root:
+                        root_children += 1
+                    stack.append(w)
+                continue
+
+            stack.pop()
+            if not stack:
+                break
+            u = stack[-1]
+            if low[v] < low[u]:
+                low[u] = low[v]
+            ends_below[u] += ends_below[v]
+            if low[v] > disc[u]:
+                src, dst = edges[parent_edge[v]]
+                bridges.append((locs[src], locs[dst], ends_below[v] if root == 0 else 0))
+            if u != root and low[v] >= disc[u]:
+                cut.add(u)
+
+        if root_children > 1:
+            cut.add(root)
+
+    return {'bridges': bridges, 'articulation': [locs[i] for i in sorted(cut)]}
+
 def _format_path_with_labels(path: List[Tuple[str, str]]) -> str:
     """Форматирует путь с надписями"""
     if not path:
@@ -406,6 +990,96 @@ def _add_loc_section(lines: List[str], s: Dict[str, Any]):
         lines.extend(_format_top_items(top_targets, 1, formatter))
         lines.append("")
               
+def _depth_histogram(values: List[int]) -> List[str]:
+    """Гистограмма расстояний: по одной строке на значение или на диапазон"""
+    counts = Counter(values)
+    top = max(counts)
+    step = -(-(top + 1) // DEPTH_BUCKETS)  # округление вверх
+    rows = []
+    for lo in range(0, top + 1, step):
+        hi = min(lo + step - 1, top)
+        label = f"{lo}" if lo == hi else f"{lo}-{hi}"
+        rows.append((label, sum(counts.get(d, 0) for d in range(lo, hi + 1))))
+    max_val = max(cnt for _, cnt in rows)
+    width = max(len(label) for label, _ in rows)
+    return [f"- {label.rjust(width)}: {cnt:>5} {_bar(cnt, max_val)}" for label, cnt in rows]
+
+def _add_depth_section(lines: List[str], locs: List[Loc]):
+    """Секция глубины: расстояния от старта и до ближайшей концовки"""
+    depths = [loc.depth for loc in locs if getattr(loc, 'depth', None) is not None]
+    if len(depths) < 2:
+        return
+    
+    lines.append(f"\n{title('Глубина', '=')}\n")
+    lines.append(f"Максимальная глубина от старта: {max(depths)} переходов")
+    unreachable = len(locs) - len(depths)
+    if unreachable:
+        lines.append(f"Недостижимы от старта: {unreachable} шт.")
+    lines.append("")
+    
+    lines.append(f"{title('Переходов от старта', '-')}\n")
+    lines.extend(_depth_histogram(depths))
+    lines.append("")
+    
+    to_end = [loc.dist_to_end for loc in locs
+              if loc.depth is not None and getattr(loc, 'dist_to_end', None) is not None]
+    if to_end and max(to_end):
+        lines.append(f"{title('Переходов до ближайшей концовки', '-')}\n")
+        lines.extend(_depth_histogram(to_end))
+        lines.append("")
+    
+    stuck = [loc.name for loc in locs if loc.depth is not None and loc.dist_to_end is None and loc.name]
+    if stuck and len(to_end):
+        names = ', '.join(f'"{n}"' for n in stuck[:FRAGILE_LIMIT])
+        more = f", ... и ещё {len(stuck) - FRAGILE_LIMIT}" if len(stuck) > FRAGILE_LIMIT else ""
+        lines.append(f"Из этих локаций ни одна концовка недостижима: {len(stuck)} шт. ({names}{more})\n")
+
+def _add_loops_section(lines: List[str], locs: List[Loc]):
+    """Секция циклов: группы локаций, по которым можно ходить по кругу"""
+    loops = defaultdict(list)
+    for loc in locs:
+        group = getattr(loc, 'cycle_group', None)
+        if group:
+            loops[group].append(loc.name)
+    if not loops:
+        return
+    
+    ordered = sorted(loops.items(), key=lambda x: (-len(x[1]), x[0]))
+    lines.append(f"\n{title(f'Циклы ({len(loops)} шт.)', '=')}\n")
+    for group, names in ordered[:LOOPS_LIMIT]:
+        shown = ', '.join(f'"{n}"' for n in names[:TOP_N])
+        more = f", ... и ещё {len(names) - TOP_N}" if len(names) > TOP_N else ""
+        lines.append(f"- Цикл {group}: {len(names)} лок. ({shown}{more})")
+    if len(ordered) > LOOPS_LIMIT:
+        lines.append(f"- ... и ещё {len(ordered) - LOOPS_LIMIT} шт.")
+    lines.append("")
+
+def _add_xref_section(lines: List[str], xref):
+    """Секция переменных и предметов: что задаётся впустую и что не задаётся вовсе"""
+    if xref is None or not xref.names():
+        return
+    
+    def quote(names):
+        shown = []
+        for n in names[:FRAGILE_LIMIT]:
+            sites = xref.writes.get(n) or xref.reads.get(n)
+            kind = " [предмет]" if n in xref.items else ""
+            shown.append(f'"{n}"{kind} (строка {sites[0][1]})')
+        more = f", ... и ещё {len(names) - FRAGILE_LIMIT}" if len(names) > FRAGILE_LIMIT else ""
+        return ', '.join(shown) + more
+    
+    names = xref.names()
+    lines.append(f"\n{title('Переменные и предметы', '=')}\n")
+    lines.append(f"Имён: {len(names)} шт. (предметов: {len(xref.items)})")
+    unused, never_set, single = xref.unused(), xref.never_set(), xref.single_use()
+    if unused:
+        lines.append(f"Задаются, но нигде не проверяются: {len(unused)} шт. ({quote(unused)})")
+    if never_set:
+        lines.append(f"Проверяются, но нигде не задаются: {len(never_set)} шт. ({quote(never_set)})")
+    if single:
+        lines.append(f"Упоминаются один раз: {len(single)} шт. ({quote(single)})")
+    lines.append("")
+
 def _add_link_section(lines: List[str], s: Dict[str, Any], analyze_paths: bool = True):
     """Секция связей"""
     lines.append(f"\n{title('Статистика по переходам', '=')}\n")
@@ -417,6 +1091,8 @@ def _add_link_section(lines: List[str], s: Dict[str, Any], analyze_paths: bool =
     
     if s['links_total']:
         lines.append(f"Переходов всего: {s['links_total']} шт.")
+        if s['guarded']:
+            lines.append(f"Из них под условием if: {s['guarded']} шт.")
         
         type_data = []
         if s['btn']:
@@ -452,6 +1128,10 @@ def _add_link_section(lines: List[str], s: Dict[str, Any], analyze_paths: bool =
         lines.append("(Поиск путей до концовок отключён)\n")
         return
 
+    if gs.get('paths_stopped'):
+        reason = "отменён" if gs['paths_stopped'] == 'cancel' else "остановлен по лимиту времени"
+        lines.append(f"⚠ Поиск путей {reason}: показаны не все концовки.")
+
     if gs['total_paths']:
         lines.append(f"Всего возможных путей до концовок: {gs['total_paths']} шт.")
 
@@ -460,12 +1140,19 @@ def _add_link_section(lines: List[str], s: Dict[str, Any], analyze_paths: bool =
                 f"⚠ Внимание: лимит поиска ({MAX_PATHS_PER_END} путей на концовку) был достигнут. "
                 f"Реальных путей может быть больше."
             )
+        if gs.get('paths_exhausted'):
+            lines.append(
+                f"⚠ Внимание: время поиска ({PATH_TIME_BUDGET:g} с на концовку) истекло. "
+                f"Показаны пути, найденные до остановки."
+            )
 
         lines.append(f"Максимальная глубина прохождения: {gs['max_depth']} шагов\n")
         
         for end, info in gs['paths_to_endings'].items():
             count_word = "путь" if info["count"] == 1 else ("пути" if info["count"] < 5 else "путей")
             trunc_note = f" (показаны первые {info['count']} из лимита)" if info.get('truncated') else ""
+            if info.get('exhausted'):
+                trunc_note += " (поиск остановлен по времени)"
             lines.append(f'До концовки "{end}": {info["count"]} {count_word}{trunc_note}')
             
             short_path = _format_path_with_labels(info['shortest_path'])
@@ -480,14 +1167,103 @@ def _add_link_section(lines: List[str], s: Dict[str, Any], analyze_paths: bool =
             if info['count'] > 1:
                 lines.append(f"Средняя длина: {info['avg_length']:.1f} шагов")
             lines.append("")
+    elif gs.get('paths_exhausted'):
+        lines.append(f"Путей до концовок не найдено за {PATH_TIME_BUDGET:g} с на концовку.\n")
     else:
         lines.append("Путей до концовок не найдено.\n")
 
+def _format_count(n: int) -> str:
+    """Огромные числа маршрутов показываем порядком"""
+    digits = str(n)
+    return digits if len(digits) <= 12 else f"~{digits[0]}.{digits[1]}·10^{len(digits) - 1}"
+
+def _add_shortest_routes_section(lines: List[str], s: Dict[str, Any]):
+    """Секция кратчайших маршрутов до концовок"""
+    shortest = s.get('shortest_routes')
+    if not shortest:
+        return
+    
+    lines.append(f"\n{title('Кратчайшие маршруты', '=')}\n")
+    if s.get('shortest_cut'):
+        lines.append(f"(Для {s['shortest_cut']} концовок поиск остановлен по лимиту времени, показаны найденные маршруты.)\n")
+    for end, routes in shortest.items():
+        lines.append(f'До концовки "{end}": {len(routes)} шт.')
+        for i, route in enumerate(routes, 1):
+            lines.append(f"{i}) {len(route) - 1} шагов:")
+            lines.append(f"~~~\n{_format_path_with_labels(route)}\n~~~")
+        lines.append("")
+
+def _add_route_samples_section(lines: List[str], s: Dict[str, Any]):
+    """Секция случайных маршрутов до концовок"""
+    samples = s.get('route_samples')
+    if not samples:
+        return
+    
+    lines.append(f"\n{title('Примеры прохождений', '=')}\n")
+    lines.append("Маршруты выбраны случайно и равновероятно; петли проходятся кратчайшим путём.\n")
+    for end, info in sorted(samples.items(), key=lambda x: -x[1]['count']):
+        lines.append(f'До концовки "{end}": маршрутов {_format_count(info["count"])}')
+        for route in info['routes']:
+            lines.append(f"{len(route) - 1} шагов:")
+            lines.append(f"~~~\n{_format_path_with_labels(route)}\n~~~")
+        lines.append("")
+
+def _add_balance_section(lines: List[str], s: Dict[str, Any]):
+    """Секция баланса: куда приходит игрок, равновероятно жмущий кнопки"""
+    b = s.get('balance')
+    if not b or not b['expected_steps']:
+        return  # со старта некуда идти - считать нечего
+    
+    lines.append(f"\n{title('Случайный игрок', '=')}\n")
+    approx = " (приближённо)" if b['approx'] else ""
+    lines.append(f"Среднее число ходов до финала: {b['expected_steps']:.1f}{approx}\n")
+    if b['approx']:
+        lines.append("Расчёт остановлен до сходимости (лимит итераций или времени): все вероятности ниже приближённые.\n")
+    
+    if b['endings']:
+        lines.append(f"{title('Вероятности концовок', '-')}\n")
+        formatter = lambda item: f'- "{item[0].name}"'
+        lines.extend(_format_probs(b['endings'], formatter))
+        lines.append("")
+    
+    if b['dead_ends']:
+        dead = b['dead_ends']
+        total = sum(p for _, p in dead)
+        lines.append(f"{title(f'Тупики ({total * 100:.1f}% игроков)', '-')}\n")
+        formatter = lambda item: f'- "{item[0].name}"'
+        lines.extend(_format_probs(dead[:BALANCE_LIMIT], formatter))
+        if len(dead) > BALANCE_LIMIT:
+            lines.append(f"- ... и ещё {len(dead) - BALANCE_LIMIT} шт.")
+        lines.append("")
+    
+    if b['phantom']:
+        lines.append(f"Уходят по фантомным ссылкам: {b['phantom'] * 100:.1f}%")
+    if b['loop']:
+        lines.append(f"Застревают в циклах без выхода: {b['loop'] * 100:.1f}%")
+    if b['phantom'] or b['loop']:
+        lines.append("")
+
+def _format_probs(items: List[tuple], item_formatter) -> List[str]:
+    """Список (объект, вероятность) с полосками от 0 до 100%"""
+    parts = []
+    for item in items:
+        line = item_formatter(item)
+        padding = MAX_CHARS - len(line)
+        if padding > 0:
+            line += " " * padding
+        parts.append(f"{line} {_bar(item[1], 1.0)}")
+    return parts
+
 def _add_problems_section(lines: List[str], s: Dict[str, Any]):
     """Секция проблем"""
     lines.append(f"\n{title('Потенциальные Проблемы', '=')}\n")
     
-    if not any([s['cycles'], s['dups'], s['auto_links'], s['orphans'], s['phantoms'], s['empty_btns']]):
+    fragile = s.get('fragile', {})
+    cutting = [b for b in fragile.get('bridges', []) if b[2]]
+    
+    cut_locs = [loc for loc in fragile.get('articulation', []) if loc.name]
+    
+    if not any([s['cycles'], s['dups'], s['auto_links'], s['orphans'], s['phantoms'], s['empty_btns'], cutting, cut_locs]):
         lines.append("Проблем не найдено. Отлично!\n")
         return
     
@@ -509,6 +1285,19 @@ def _add_problems_section(lines: List[str], s: Dict[str, Any]):
         names = ', '.join(f'"{n}"' for n in s['orphans'])
         lines.append(f"Локации-сиротки: {len(s['orphans'])} шт. ({names})\n")
     
+    if cutting:
+        lines.append(f"{title('Хрупкие связи (мосты до концовок)', '-')}\n")
+        for src, dst, ends in sorted(cutting, key=lambda b: -b[2])[:FRAGILE_LIMIT]:
+            lines.append(f'- "{src.name}" -> "{dst.name}": без неё недоступно концовок: {ends}')
+        if len(cutting) > FRAGILE_LIMIT:
+            lines.append(f"- ... и ещё {len(cutting) - FRAGILE_LIMIT} шт.")
+        lines.append("")
+    
+    if cut_locs:
+        names = ', '.join(f'"{loc.name}"' for loc in cut_locs[:FRAGILE_LIMIT])
+        more = f", ... и ещё {len(cut_locs) - FRAGILE_LIMIT}" if len(cut_locs) > FRAGILE_LIMIT else ""
+        lines.append(f"Точки сочленения: {len(cut_locs)} шт. ({names}{more})\n")
+    
     if s['phantoms']:
         lines.append(f"{title('Фантомные ссылки', '-')}\n")
         for loc, types in sorted(s['phantoms'].items()):
@@ -577,16 +1366,16 @@ if __name__ == '__main__':
 
     test_locs = [
         MockLoc("start", id="0", tech=True, desc="Стартовая локация с описанием.", links=[
-            ("1", "loc_a", "btn", "Кнопка А", False, False, False),
-            ("2", "target", "btn", "К цели", False, False, False)
+            ("1", "loc_a", "btn", "Кнопка А", False, False, False, None),
+            ("2", "target", "btn", "К цели", False, False, False, None)
         ]),
         MockLoc("loc_a", id="1", desc="Локация А", links=[
-            (None, "phantom", "btn", "", True, False, False),
-            ("2", "target", "goto", "", False, False, False)
+            (None, "phantom", "btn", "", True, False, False, None),
+            ("2", "target", "goto", "", False, False, False, None)
         ]),
         MockLoc("target", id="2", desc="Популярная цель", end=True),
         MockLoc("cycle_loc", id="3", cycle=True, links=[
-            ("3", "cycle_loc", "btn", "Сам в себя", False, False, False)
+            ("3", "cycle_loc", "btn", "Сам в себя", False, False, False, None)
         ]),
         MockLoc("start_dup", id="4", desc="Дубликат", dup=True),
         MockLoc("orphan_loc", id="5", desc="Сиротка без связей", orphan=True),
@@ -19,7 +19,9 @@ base = __package__
 if base:
     modules_to_reload =[
         f'{base}.urq_parser', f'{base}.puml_gen', 
-        f'{base}.stats', f'{base}.urq_fixer', f'{base}.encoding'
+        f'{base}.stats', f'{base}.urq_fixer', f'{base}.encoding',
+        f'{base}.analysis_worker', f'{base}.urq_graph', f'{base}.balance',
+        f'{base}.state_explorer', f'{base}.xref', f'{base}.simplify'
     ]
 
 for module_name in modules_to_reload:
@@ -28,19 +30,92 @@ for module_name in modules_to_reload:
 
 # Относительные импорты для Sublime Text
 try:
-    from .urq_parser import UrqParser
+    from .urq_parser import UrqParser, build_reach_index
     from .puml_gen import PlantumlGen
-    from .stats import get_stats
+    from .puml_formatter import PumlFormatter
+    from .urq_graph import neighbourhood, path_slice
+    from .stats import get_stats, get_simulation_stats, get_state_stats, find_route
     from .urq_fixer import UrqFixer
     from .settings import Settings
     from .encoding import detect_encoding
+    from .analysis_worker import AnalysisWorker
 except ImportError:
-    from urq_parser import UrqParser
+    from urq_parser import UrqParser, build_reach_index
     from puml_gen import PlantumlGen
-    from stats import get_stats
+    from puml_formatter import PumlFormatter
+    from urq_graph import neighbourhood, path_slice
+    from stats import get_stats, get_simulation_stats, get_state_stats, find_route
     from urq_fixer import UrqFixer
     from settings import Settings
     from encoding import detect_encoding 
+    from analysis_worker import AnalysisWorker
+
+# Токен отмены текущего расчёта статистики (один на весь плагин)
+_stats_cancel = None
+# Последний разбор для команд по курсору: (ключ версии текста, парсер, локации)
+_parse_cache = None
+# Фоновый процесс анализа (запускается лениво, если задан worker_python)
+_worker = None
+
+def _get_worker(options):
+    """Возвращает фоновый процесс анализа или None, если режим выключен в настройках"""
+    global _worker
+    if not options.worker_python:
+        return None
+    if _worker is None or _worker.python != options.worker_python:
+        if _worker:
+            _worker.close()
+        _worker = AnalysisWorker(options.worker_python)
+    return _worker
+
+def _parse_view(view):
+    """
+    Парсит файл вида, возвращает (парсер, локации) или (None, []) если это не URQ.
+    Последний разбор кэшируется, пока текст не изменился: команды
+    по курсору (окрестность, срезы, маршруты) не парсят большой квест заново.
+    Несохранённые правки разбираются из буфера - иначе строки локаций
+    не совпадут с позицией курсора.
+    """
+    global _parse_cache
+    current_file = view.file_name()
+    if not current_file or not current_file.lower().endswith('.qst'):
+        sublime.error_message("Файл должен быть URQ (.qst)")
+        return None, []
+    dirty = view.is_dirty()
+    if dirty:
+        key = (current_file, view.buffer_id(), view.change_count())
+    else:
+        stat = os.stat(current_file)
+        key = (current_file, stat.st_mtime, stat.st_size)
+    if _parse_cache and _parse_cache[0] == key:
+        return _parse_cache[1], _parse_cache[2]
+    text = view.substr(sublime.Region(0, view.size())) if dirty else None
+    parser = UrqParser()
+    locs = parser.parse_source(parser.read_source(current_file, text), current_file)
+    for warning in parser.get_warnings():
+        print(f"URQ Warning: {warning}")
+    _parse_cache = (key, parser, locs)
+    return parser, locs
+
+def _loc_at_cursor(view, locs):
+    """Локация, внутри которой стоит курсор (последняя метка выше курсора)"""
+    if not locs or not view.sel():
+        return None
+    row = view.rowcol(view.sel()[0].begin())[0] + 1  # line у Loc - с единицы
+    above = [loc for loc in locs if loc.line <= row]
+    return max(above, key=lambda loc: loc.line) if above else None
+
+def _goto_line(view, line):
+    """Переводит курсор на строку (с единицы) и прокручивает к ней"""
+    pt = view.text_point(line - 1, 0)
+    view.sel().clear()
+    view.sel().add(sublime.Region(pt, pt))
+    view.show_at_center(pt)
+
+def plugin_unloaded():
+    """Останавливает фоновый процесс при выгрузке плагина"""
+    if _worker:
+        _worker.close()
     
 class UrqFixCommand(sublime_plugin.TextCommand):
     """Команда для исправления проблем URQ"""
@@ -108,7 +183,7 @@ class UrqFixCommand(sublime_plugin.TextCommand):
             print("=" * 65 + "\n")
 class UrqToPlantumlCommand(sublime_plugin.TextCommand):
     """Основная команда плагина"""
-    def run(self, edit, png=False, svg=False, net=False, stats=False):
+    def run(self, edit, png=False, svg=False, net=False, stats=False, sim=False, samples=None, explore=False):
         current_file = self.view.file_name()
 
         if not current_file:
@@ -126,6 +201,8 @@ class UrqToPlantumlCommand(sublime_plugin.TextCommand):
         sublime_settings = sublime.load_settings('urq2puml.sublime-settings')
         options = Settings(sublime_settings) 
         options.puml_jar_path = self.get_jar_path(options.puml_jar_path)            
+        if samples is not None:
+            options.stats_sample_routes = samples  # команда с примерами маршрутов
 
         # Автопереключение на сетевой режим если jar потерялся
         # if not net and not self.jar_exists():
@@ -150,21 +227,34 @@ class UrqToPlantumlCommand(sublime_plugin.TextCommand):
                 # gen = PlantumlGen(PUML_JAR_PATH if not net else None)
                 self.warnings.extend(gen.get_warnings())
             else:
-                # Парсим URQ файл
-                parser = UrqParser()
-                result = parser.parse_file(current_file)
-                if not result:
+                worker = _get_worker(options)
+                xref = source = None
+                if worker:
+                    result = None  # парсит фоновый процесс
+                else:
+                    # Парсим URQ файл
+                    parser = UrqParser()
+                    source = parser.read_source(current_file)   # текст нужен ещё обходчику состояний
+                    result = parser.parse_source(source, current_file)
+                    if not result:
+                        self.warnings.extend(parser.get_warnings())
+                        return
+                                    
                     self.warnings.extend(parser.get_warnings())
+                    xref = parser.xref
+
+                # --- Симуляция прохождений и анализ с переменными: только отчёт, без графа ---
+                if sim or explore:
+                    kind = 'simulate' if sim else 'explore'
+                    sim_thread = self._start_stats(result, current_file, options, worker, kind=kind, source=source)
+                    self._show_progress_stats(sim_thread)
                     return
-                                
-                self.warnings.extend(parser.get_warnings())
 
                 # --- Статистика в отдельном потоке ---
-                if stats:
-                    analyze_paths = options.stats_analyze_paths
-                    stats_thread = threading.Thread(target=self._gen_stats, args=(result, current_file, analyze_paths))
-                    stats_thread.daemon = True
-                    stats_thread.start()
+                # Фоновый процесс выполняет задания по очереди, поэтому с картинками
+                # статистику запускаем после форматирования, чтобы не ждать её
+                if stats and not (worker and (png or svg)):
+                    stats_thread = self._start_stats(result, current_file, options, worker, xref=xref)
                     
                     # Если ТОЛЬКО статистика, ждем и выходим
                     if not png and not svg:
@@ -177,36 +267,76 @@ class UrqToPlantumlCommand(sublime_plugin.TextCommand):
                 gen = PlantumlGen(options)
                 
                 # Передаем параметр легенды: в сетевом режиме отключаем
-                puml_content = gen.save_puml(result, puml_file, legend=not net)
-                self.warnings.extend(gen.get_warnings())
-                
-            if os.path.exists(puml_file):
-                # Не открывать лишний раз puml файл
-                if not png and not svg and not is_puml:
-                    self.view.window().open_file(puml_file)
-                
-                status_msg = f"{'PUML обработка' if is_puml else 'Конвертация URQ в PlantUML'}: {'готов' if is_puml else '.puml файл сгенерирован'}"
-                
-                # Генерируем PNG/SVG в фоне если нужно
-                if png or svg:
-                    thread = threading.Thread(target=self._gen_imgs, args=(gen, puml_content, puml_file, png, svg, net))
+                if worker:
+                    # Процесс может быть занят предыдущим заданием - ждём его не в UI-потоке
+                    thread = threading.Thread(target=self._format_in_worker,
+                                              args=(worker, current_file, options, gen, puml_file, png, svg, net, stats))
                     thread.daemon = True
                     thread.start()
-                    
-                    # Показываем прогресс
-                    self._show_progress(thread)
-                else:
-                    self.view.window().status_message(status_msg + ".")
-
+                    self.view.window().status_message("Форматирование в фоновом процессе...")
+                    return
+                puml_content = gen.save_puml(result, puml_file, legend=not net)
                 self.warnings.extend(gen.get_warnings())
-            else:
-                self._add_warning("Critical Error: Файл .puml не был создан.")
+                
+            self._finish_puml(gen, puml_content, puml_file, is_puml, png, svg, net)
 
         except Exception as e:
             self._add_warning(f"Critical Error: Произошла ошибка при конвертации: {e}")
         finally:
             self._print_warnings()
 
+    def _format_in_worker(self, worker, current_file, options, gen, puml_file, png, svg, net, stats):
+        """Получает PUML от фонового процесса (в отдельном потоке), дальше - в главном потоке"""
+        warnings, error, puml_content = [], None, None
+        try:
+            reply = worker.request('format', file=current_file, options=options.as_config(), legend=not net)
+            warnings.extend(reply['warnings'])
+            if reply['content']:
+                if reply.get('parts'):
+                    gen.write_parts(reply['parts'], puml_file)
+                puml_content = gen.write_puml(reply['content'], puml_file)
+        except Exception as e:
+            error = f"Critical Error: Произошла ошибка при конвертации: {e}"
+
+        def finish():
+            self.warnings = warnings
+            try:
+                if error:
+                    self._add_warning(error)
+                elif puml_content is not None:
+                    self._finish_puml(gen, puml_content, puml_file, False, png, svg, net)
+                    if stats:
+                        self._start_stats(None, current_file, options, worker)
+            finally:
+                self._print_warnings()
+        sublime.set_timeout(finish, 0)
+
+    def _finish_puml(self, gen, puml_content, puml_file, is_puml, png, svg, net):
+        """Открывает готовый .puml или запускает генерацию картинок (в главном потоке)"""
+        if not os.path.exists(puml_file):
+            self._add_warning("Critical Error: Файл .puml не был создан.")
+            return
+        # Не открывать лишний раз puml файл
+        if not png and not svg and not is_puml:
+            self.view.window().open_file(puml_file)
+        
+        status_msg = f"{'PUML обработка' if is_puml else 'Конвертация URQ в PlantUML'}: {'готов' if is_puml else '.puml файл сгенерирован'}"
+        if gen.parts:
+            status_msg += f" (обзор и частей: {len(gen.parts)})"
+        
+        # Генерируем PNG/SVG в фоне если нужно
+        if png or svg:
+            thread = threading.Thread(target=self._gen_imgs, args=(gen, puml_content, puml_file, png, svg, net))
+            thread.daemon = True
+            thread.start()
+            
+            # Показываем прогресс
+            self._show_progress(thread)
+        else:
+            self.view.window().status_message(status_msg + ".")
+
+        self.warnings.extend(gen.get_warnings())
+
     def get_jar_path(self, path_from_settings):
         """Определяет итоговый путь к JAR-файлу. Приоритет: настройки > папка плагина."""
         
@@ -223,37 +353,78 @@ class UrqToPlantumlCommand(sublime_plugin.TextCommand):
         # Если ни в настройках, ни в папке плагина ничего нет, возвращаем пустую строку.
         return ""
 
-    def _gen_stats(self, result, current_file, analyze_paths=True):
-        """Генерит статистику в отдельном потоке"""
+    def _start_stats(self, result, current_file, options, worker=None, kind='stats', xref=None, source=None):
+        """
+        Запускает расчёт статистики в отдельном потоке (предыдущий расчёт отменяется).
+        kind: 'stats' - статистика, 'simulate' - симуляция прохождений,
+        'explore' - обход с учётом переменных и предметов (source - уже прочитанный текст квеста).
+        """
+        global _stats_cancel
+        if _stats_cancel is not None:
+            _stats_cancel.set()  # предыдущий расчёт больше не нужен
+            if worker:
+                worker.cancel()
+        _stats_cancel = threading.Event()
+        self._stats_progress = (0, "Подготовка")
+        stats_thread = threading.Thread(target=self._gen_stats, args=(result, current_file, options, _stats_cancel, worker, kind, xref, source))
+        stats_thread.daemon = True
+        stats_thread.start()
+        return stats_thread
+
+    def _gen_stats(self, result, current_file, options, cancel, worker=None, kind='stats', xref=None, source=None):
+        """Генерит статистику в отдельном потоке (или в фоновом процессе, если он задан)"""
+        def on_progress(percent, stage):
+            self._stats_progress = (percent, stage)
+
         try:
-            stats_text = get_stats(result, analyze_paths=analyze_paths)
+            if worker:
+                reply = worker.request(kind, progress=on_progress, file=current_file, options=options.as_config())
+                for warning in reply['warnings']:
+                    print(warning)
+                stats_text = reply['text']
+            elif kind == 'simulate':
+                self._stats_progress = (0, "Симуляция прохождений")
+                stats_text = get_simulation_stats(result, walkers=options.sim_walkers, max_steps=options.sim_max_steps,
+                                                  seed=options.sim_seed, cancel=cancel)
+            elif kind == 'explore':
+                self._stats_progress = (0, "Обход состояний")
+                if source is None:
+                    source = UrqParser().read_source(current_file)
+                stats_text = get_state_stats(result, source,
+                                             max_states=options.state_budget, cancel=cancel)
+            else:
+                stats_text = get_stats(result, analyze_paths=options.stats_analyze_paths, cancel=cancel,
+                                       time_budget=options.stats_time_budget or None, progress=on_progress,
+                                       balance=options.stats_balance, sample_routes=options.stats_sample_routes,
+                                       seed=options.sim_seed, shortest_routes=options.stats_shortest_routes,
+                                       xref=xref)
             if stats_text:
                 # Обновляем UI в главном потоке
-                sublime.set_timeout(lambda: self._show_stats(stats_text, current_file), 0)
+                name = {'simulate': "Симуляция", 'explore': "Состояния"}.get(kind, "Статистика")
+                sublime.set_timeout(lambda: self._show_stats(stats_text, current_file, name), 0)
             else:
                 sublime.set_timeout(lambda: self._add_warning("Не удалось сгенерировать текст статистики (пустая строка)."), 0)
         except Exception as e:
             sublime.set_timeout(lambda: self._add_warning(f"Ошибка генерации статистики: {e}"), 0)
 
-    def _show_stats(self, stats_text, current_file):
+    def _show_stats(self, stats_text, current_file, name="Статистика"):
         """Показывает статистику в главном потоке"""
         stats_view = self.view.window().new_file()
-        stats_view.set_name(f"{os.path.basename(current_file)} - Статистика.md")
+        stats_view.set_name(f"{os.path.basename(current_file)} - {name}.md")
         stats_view.set_scratch(True)
 
         stats_text_for_view = stats_text.replace('\r\n', '\n').replace('\r', '\n')
         stats_view.run_command('insert_text', {'text': stats_text_for_view})
 
         stats_view.set_syntax_file("Packages/Markdown/Markdown.sublime-syntax")
-        self.view.window().status_message(f"Статистика для {os.path.basename(current_file)} отображена.")
+        self.view.window().status_message(f"{name} для {os.path.basename(current_file)} отображена.")
 
     def _show_progress_stats(self, thread):
         """Показывает прогресс генерации статистики"""
         def update_status():
-            dots = 0
             while thread.is_alive():
-                dots = (dots + 1) % 4
-                msg = f"Генерация статистики{'.' * dots}{' ' * (3 - dots)}"
+                percent, stage = getattr(self, '_stats_progress', (0, ""))
+                msg = f"Генерация статистики: {stage} ({percent}%)"
                 sublime.set_timeout(lambda m=msg: self.view.window().status_message(m), 0)
                 time.sleep(0.5)
             
@@ -268,11 +439,17 @@ class UrqToPlantumlCommand(sublime_plugin.TextCommand):
         results = []
         
         if png:
-            success = gen.generate_online(puml_content, puml_file, 'png') if net else gen.generate_local(puml_file, 'png')
+            if gen.parts:
+                success = gen.generate_parts(puml_content, puml_file, 'png', net)
+            else:
+                success = gen.generate_online(puml_content, puml_file, 'png') if net else gen.generate_local(puml_file, 'png')
             results.append(('png', success))
             
         if svg:
-            success = gen.generate_online(puml_content, puml_file, 'svg') if net else gen.generate_local(puml_file, 'svg')
+            if gen.parts:
+                success = gen.generate_parts(puml_content, puml_file, 'svg', net)
+            else:
+                success = gen.generate_online(puml_content, puml_file, 'svg') if net else gen.generate_local(puml_file, 'svg')
             results.append(('svg', success))
             
         # Обновляем UI в главном потоке
@@ -319,6 +496,36 @@ class UrqToPlantumlCommand(sublime_plugin.TextCommand):
     #             return True
     #     return False
 
+    def _render_slice(self, locs, members, suffix, svg=False):
+        """
+        Рисует часть графа: только локации members (позиции в locs) и связи между ними.
+        Пишет имя{suffix}.puml рядом с квестом и генерирует картинку в фоне.
+        """
+        self._render_with(lambda formatter: formatter.format_slice(locs, members, legend=False), suffix, svg)
+
+    def _render_with(self, make_content, suffix, svg=False):
+        """Общая часть частичных отрисовок: make_content(formatter) -> текст PUML"""
+        options = Settings(sublime.load_settings('urq2puml.sublime-settings'))
+        options.puml_jar_path = self.get_jar_path(options.puml_jar_path)
+        net = not options.puml_jar_path
+        self.warnings = []
+
+        formatter = PumlFormatter(options)
+        content = make_content(formatter)
+        self.warnings.extend(formatter.get_warnings())
+        puml_file = os.path.splitext(self.view.file_name())[0] + suffix + '.puml'
+        gen = PlantumlGen(options)
+        try:
+            gen.write_puml(content, puml_file)
+        except Exception as e:
+            self._add_warning(str(e))
+            return
+
+        thread = threading.Thread(target=self._gen_imgs, args=(gen, content, puml_file, not svg, svg, net))
+        thread.daemon = True
+        thread.start()
+        self._show_progress(thread)
+
     def _open_file_in_default_program(self, file_path):
         """Открывает файл в программе по умолчанию"""
         try:
@@ -347,6 +554,184 @@ class UrqToPlantumlCommand(sublime_plugin.TextCommand):
                 print(warning)
             print("=" * 61 + "\n")
 
+class UrqCancelStatsCommand(sublime_plugin.WindowCommand):
+    """Прерывает расчёт статистики: готовые разделы всё равно будут показаны"""
+    def run(self):
+        if _stats_cancel is not None and not _stats_cancel.is_set():
+            _stats_cancel.set()
+            if _worker:
+                _worker.cancel()
+            self.window.status_message("Статистика: прерывание...")
+        else:
+            self.window.status_message("Статистика сейчас не считается.")
+
+class UrqReachCommand(sublime_plugin.TextCommand):
+    """Показывает, какие локации достижимы из локации под курсором"""
+    def run(self, edit):
+        parser, locs = _parse_view(self.view)
+        src = _loc_at_cursor(self.view, locs)
+        if not src:
+            self.view.window().status_message("Курсор не внутри локации.")
+            return
+
+        pos = {loc.id: i for i, loc in enumerate(locs)}
+        reach = parser.reach or build_reach_index(locs)   # индекс строится при первом запросе
+        found = set(reach.reachable([pos[src.id]]))
+        found.discard(pos[src.id])
+
+        # Сначала достижимые, потом нет - выбор переводит к локации
+        order = sorted(range(len(locs)), key=lambda i: (i not in found, locs[i].line))
+        order.remove(pos[src.id])
+        self.targets = [locs[i] for i in order]
+        items = [[f"{'→' if i in found else '✗'} {locs[i].name}", f"строка {locs[i].line}"] for i in order]
+
+        self.view.window().status_message(
+            f'Из "{src.name}" достижимо {len(found)} из {len(locs) - 1} локаций.')
+        if items:
+            self.view.window().show_quick_panel(items, self._on_select)
+
+    def _on_select(self, index):
+        if index >= 0:
+            _goto_line(self.view, self.targets[index].line)
+
+class UrqRouteCommand(sublime_plugin.TextCommand):
+    """Кратчайший маршрут (кнопки, goto, авто) от локации под курсором до выбранной метки"""
+    def run(self, edit):
+        _, self.locs = _parse_view(self.view)
+        self.src = _loc_at_cursor(self.view, self.locs)
+        if not self.src:
+            self.view.window().status_message("Курсор не внутри локации.")
+            return
+        self.targets = [loc for loc in self.locs if loc is not self.src and not loc.dup]
+        items = [[loc.name, f"строка {loc.line}"] for loc in self.targets]
+        if items:
+            self.view.window().show_quick_panel(items, self._on_select)
+
+    def _on_select(self, index):
+        if index < 0:
+            return
+        dst = self.targets[index]
+        pos = {loc.id: i for i, loc in enumerate(self.locs)}
+        route = find_route(self.locs, pos[self.src.id], pos[dst.id])
+        window = self.view.window()
+        if not route:
+            window.status_message(f'Из "{self.src.name}" в "{dst.name}" не попасть.')
+            return
+        panel = window.create_output_panel("urq_route")
+        panel.run_command('append', {'characters': f'"{self.src.name}" → "{dst.name}", {route}\n'})
+        window.run_command('show_panel', {'panel': 'output.urq_route'})
+
+class UrqUsagesCommand(sublime_plugin.TextCommand):
+    """Где задаётся и где проверяется переменная или предмет под курсором"""
+    def run(self, edit):
+        if not self.view.sel():
+            return
+        region = self.view.sel()[0]
+        if region.empty():
+            region = self.view.word(region)
+        name = self.view.substr(region).strip().lstrip('#%').rstrip('$')
+        parser, _ = _parse_view(self.view)
+        if not parser or not name:
+            return
+
+        found = parser.xref.usages(name)
+        self.sites = [(True, site) for site in found['writes']] + [(False, site) for site in found['reads']]
+        if not self.sites:
+            self.view.window().status_message(f'"{name}" нигде не используется.')
+            return
+        self.view.window().status_message(
+            f'"{name}": задаётся {len(found["writes"])}, проверяется {len(found["reads"])} раз.')
+        items = [[f"{'✎' if write else '?'} {loc_name}", f"строка {line}"]
+                 for write, (loc_name, line) in self.sites]
+        self.view.window().show_quick_panel(items, self._on_select)
+
+    def _on_select(self, index):
+        if index >= 0:
+            _goto_line(self.view, self.sites[index][1][1])
+
+class UrqPreviewCommand(UrqToPlantumlCommand):
+    """Рисует только окрестность локации под курсором: radius переходов туда и обратно"""
+    def run(self, edit, radius=None, svg=False):
+        if radius is None:
+            options = Settings(sublime.load_settings('urq2puml.sublime-settings'))
+            self.view.window().show_input_panel(
+                "Радиус окрестности (переходов):", str(options.preview_radius),
+                lambda text: self._on_radius(text, svg), None, None)
+            return
+        self._preview(int(radius), svg)
+
+    def _on_radius(self, text, svg):
+        try:
+            radius = int(text.strip())
+        except ValueError:
+            self.view.window().status_message("Радиус должен быть числом.")
+            return
+        self._preview(max(radius, 0), svg)
+
+    def _preview(self, radius, svg):
+        parser, locs = _parse_view(self.view)
+        src = _loc_at_cursor(self.view, locs)
+        if not src:
+            self.view.window().status_message("Курсор не внутри локации.")
+            return
+        pos = {loc.id: i for i, loc in enumerate(locs)}
+        members = neighbourhood(parser.adj, parser.radj, pos[src.id], radius)
+        self.view.window().status_message(
+            f'Окрестность "{src.name}" ({radius} перех.): {len(members)} из {len(locs)} локаций.')
+        self._render_slice(locs, members, "_near", svg)
+
+class UrqEndingSliceCommand(UrqToPlantumlCommand):
+    """Рисует только локации, через которые можно дойти от старта до выбранной концовки"""
+    def run(self, edit, svg=False):
+        self.parser, self.locs = _parse_view(self.view)
+        self.svg = svg
+        self.endings = [i for i, loc in enumerate(self.locs) if loc.end]
+        if not self.endings:
+            self.view.window().status_message("Концовок не найдено.")
+            return
+        items = [[self.locs[i].name, f"строка {self.locs[i].line}"] for i in self.endings]
+        self.view.window().show_quick_panel(items, self._on_select)
+
+    def _on_select(self, index):
+        if index < 0:
+            return
+        end = self.endings[index]
+        members = path_slice(self.parser.adj, self.parser.radj, 0, end)
+        name = self.locs[end].name
+        if not members:
+            self.view.window().status_message(f'Концовка "{name}" недостижима от старта.')
+            return
+        self.view.window().status_message(
+            f'Путь к "{name}": {len(members)} из {len(self.locs)} локаций.')
+        self._render_slice(self.locs, members, "_ending", self.svg)
+
+class UrqGroupsCommand(UrqToPlantumlCommand):
+    """
+    Обзор по группам для больших квестов: одна вершина на группу префиксов.
+    Из списка можно выбрать и одну группу - она рисуется целиком, по локациям.
+    """
+    def run(self, edit, svg=False):
+        self.parser, self.locs = _parse_view(self.view)
+        if not self.locs:
+            return
+        self.svg = svg
+        options = Settings(sublime.load_settings('urq2puml.sublime-settings'))
+        self.groups = PumlFormatter(options).top_groups(self.locs)
+        items = [["Все группы (обзор)", f"{len(self.groups)} групп, {len(self.locs)} лок."]]
+        items += [[title, f"{len(members)} лок."] for title, members in self.groups]
+        self.view.window().show_quick_panel(items, self._on_select)
+
+    def _on_select(self, index):
+        if index < 0:
+            return
+        if index == 0:
+            self.view.window().status_message(f"Обзор: {len(self.groups)} групп.")
+            self._render_with(lambda formatter: formatter.format_groups(self.locs), "_groups", self.svg)
+            return
+        title, members = self.groups[index - 1]
+        self.view.window().status_message(f'Группа "{title}": {len(members)} из {len(self.locs)} локаций.')
+        self._render_slice(self.locs, members, "_group", self.svg)
+
 class InsertTextCommand(sublime_plugin.TextCommand):
     def run(self, edit, text=""):
         self.view.insert(edit, 0, text)
\ No newline at end of file
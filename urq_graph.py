@@ -0,0 +1,369 @@
+# urq_graph.py
+# Алгоритмы на графе локаций: вершины - индексы в списке locs, рёбра - списки соседей.
+# Все обходы итеративные, чтобы длинные цепочки не упирались в лимит рекурсии.
+from collections import deque
+import heapq
+from typing import List, Tuple, Dict
+
+def strong_components(adj: List[List[int]]) -> Tuple[List[int], List[List[int]]]:
+    """
+    Компоненты сильной связности (итеративный Тарьян, O(V+E)).
+
+    :param adj: adj[v] - список вершин, в которые ведут рёбра из v.
+    Возвращает (comp, comps): comp[v] - номер компоненты вершины,
+    comps - списки вершин компонент в обратном топологическом порядке
+    (компонента идёт раньше всех, из которых в неё можно попасть).
+    """
+    n = len(adj)
+    index = [0] * n         # порядковый номер входа (0 - не посещена)
+    low = [0] * n
+    on_stack = [False] * n
+    next_idx = [0] * n
+    comp = [-1] * n
+    comps: List[List[int]] = []
+    stack: List[int] = []
+    counter = 1
+
+    for root in range(n):
+        if index[root]:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        call = [root]
+
+        while call:
+            v = call[-1]
+            edges = adj[v]
+            i = next_idx[v]
+            if i < len(edges):
+                next_idx[v] = i + 1
+                w = edges[i]
+                if not index[w]:
+                    index[w] = low[w] = counter
+                    counter += 1
+                    stack.append(w)
+                    on_stack[w] = True
+                    call.append(w)
+                elif on_stack[w] and index[w] < low[v]:
+                    low[v] = index[w]
+                continue
+
+            call.pop()
+            if call and low[v] < low[call[-1]]:
+                low[call[-1]] = low[v]
+            if low[v] == index[v]:
+                c = len(comps)
+                members = []
+                while True:
+                    w = stack.pop()
+                    on_stack[w] = False
+                    comp[w] = c
+                    members.append(w)
+                    if w == v:
+                        break
+                comps.append(members)
+
+    return comp, comps
+
+def bfs_tree(adj: List[List[int]], source: int, allowed=None) -> Dict[int, Tuple[int, int]]:
+    """
+    Дерево кратчайших путей от source (BFS).
+    Возвращает parent: вершина -> (предыдущая вершина, номер ребра в adj[предыдущей]);
+    у source родитель (-1, -1). allowed - необязательное множество разрешённых вершин.
+    """
+    parent = {source: (-1, -1)}
+    queue = deque([source])
+    while queue:
+        v = queue.popleft()
+        for i, w in enumerate(adj[v]):
+            if w not in parent and (allowed is None or w in allowed):
+                parent[w] = (v, i)
+                queue.append(w)
+    return parent
+
+def tree_path(parent: Dict[int, Tuple[int, int]], target: int) -> List[Tuple[int, int]]:
+    """Путь от корня bfs_tree до target: [(вершина, номер ребра, по которому пришли)]"""
+    path = []
+    v = target
+    while v != -1:
+        prev, edge = parent[v]
+        path.append((v, edge))
+        v = prev
+    path.reverse()
+    return path
+
+class RouteSampler:
+    """
+    Подсчёт и равномерная выборка маршрутов от source до target.
+
+    Граф сжимается по компонентам сильной связности; маршрут - это цепочка
+    рёбер между компонентами (в сжатом графе циклов нет, поэтому маршрутов
+    конечное число и их можно посчитать динамикой). Внутри цикла маршрут
+    проходит кратчайшим путём от входа до нужного выхода.
+    Выборка одного маршрута - O(длина маршрута), подсчёт - O(V + E) на цель.
+    """
+    def __init__(self, adj: List[List[int]]):
+        self.adj = adj
+        self.comp, self.comps = strong_components(adj)
+        # Рёбра, выходящие из компоненты: (откуда, номер ребра, куда)
+        self.exits = [[] for _ in self.comps]
+        for v, edges in enumerate(adj):
+            for i, w in enumerate(edges):
+                if self.comp[w] != self.comp[v]:
+                    self.exits[self.comp[v]].append((v, i, w))
+        self._counts = {}       # target -> число маршрутов из каждой компоненты
+        self._trees = {}        # вершина входа -> bfs_tree внутри её компоненты
+        self._members = {}      # компонента -> множество вершин
+
+    def _count_for(self, target: int) -> List[int]:
+        """Динамика по компонентам в обратном топологическом порядке"""
+        counts = self._counts.get(target)
+        if counts is None:
+            counts = [0] * len(self.comps)
+            goal = self.comp[target]
+            for c in range(len(self.comps)):    # strong_components отдаёт стоки первыми
+                if c == goal:
+                    counts[c] = 1
+                else:
+                    counts[c] = sum(counts[self.comp[w]] for _, _, w in self.exits[c])
+            self._counts[target] = counts
+        return counts
+
+    def count(self, source: int, target: int) -> int:
+        """Число маршрутов от source до target (точное, может быть очень большим)"""
+        return self._count_for(target)[self.comp[source]]
+
+    def _inner_path(self, entry: int, node: int) -> List[Tuple[int, int]]:
+        """Кратчайший путь внутри компоненты от entry до node"""
+        tree = self._trees.get(entry)
+        if tree is None:
+            c = self.comp[entry]
+            members = self._members.get(c)
+            if members is None:
+                members = self._members[c] = set(self.comps[c])
+            tree = self._trees[entry] = bfs_tree(self.adj, entry, members)
+        return tree_path(tree, node)
+
+    def sample(self, source: int, target: int, k: int, rng) -> List[List[Tuple[int, int]]]:
+        """
+        k случайных маршрутов, каждый выбран равновероятно среди всех count() маршрутов.
+        Маршрут - [(вершина, номер ребра в adj[предыдущей вершины])], у source ребро -1.
+        rng - объект с randrange (например random.Random).
+        """
+        counts = self._count_for(target)
+        if not counts[self.comp[source]]:
+            return []
+        goal = self.comp[target]
+        routes = []
+        for _ in range(k):
+            route = []
+            entry = source
+            c = self.comp[entry]
+            edge = -1
+            while c != goal:
+                pick = rng.randrange(counts[c])
+                for v, i, w in self.exits[c]:
+                    pick -= counts[self.comp[w]]
+                    if pick < 0:
+                        break
+                inner = self._inner_path(entry, v)
+                inner[0] = (entry, edge)
+                route.extend(inner)
+                entry, edge, c = w, i, self.comp[w]
+            inner = self._inner_path(entry, target)
+            inner[0] = (entry, edge)
+            route.extend(inner)
+            routes.append(route)
+        return routes
+
+def _bfs_path(adj, source, target, banned_nodes, banned_edges):
+    """Кратчайший путь в обход запрещённых вершин и рёбер (v, номер ребра) или None"""
+    if source == target:
+        return [(source, -1)]
+    parent = {source: (-1, -1)}
+    queue = deque([source])
+    while queue:
+        v = queue.popleft()
+        for i, w in enumerate(adj[v]):
+            if w in parent or w in banned_nodes or (v, i) in banned_edges:
+                continue
+            parent[w] = (v, i)
+            if w == target:
+                return tree_path(parent, target)
+            queue.append(w)
+    return None
+
+def k_shortest_paths(adj: List[List[int]], source: int, target: int, k: int,
+                     stop=None) -> List[List[Tuple[int, int]]]:
+    """
+    k кратчайших простых путей (алгоритм Йена, длина - число переходов).
+    Параллельные рёбра дают разные пути. Путь - [(вершина, номер ребра)],
+    как у tree_path. stop - необязательный callable для досрочной остановки.
+    """
+    first = _bfs_path(adj, source, target, set(), set())
+    if first is None or k <= 0:
+        return []
+    found = [first]
+    seen = {tuple(first)}
+    candidates = []     # куча (длина, порядковый номер, путь)
+    counter = 0
+
+    while len(found) < k:
+        prev = found[-1]
+        for i in range(len(prev) - 1):
+            if stop and stop():
+                return found
+            root = prev[:i + 1]
+            spur = root[-1][0]
+            banned_edges = {(p[i][0], p[i + 1][1]) for p in found
+                            if len(p) > i + 1 and p[:i + 1] == root}
+            banned_nodes = {v for v, _ in root[:-1]}
+            tail = _bfs_path(adj, spur, target, banned_nodes, banned_edges)
+            if tail is None:
+                continue
+            path = root + tail[1:]
+            key = tuple(path)
+            if key not in seen:
+                seen.add(key)
+                counter += 1
+                heapq.heappush(candidates, (len(path), counter, path))
+        if not candidates:
+            break
+        found.append(heapq.heappop(candidates)[2])
+
+    return found
+
+class ReachIndex:
+    """
+    Индекс достижимости: компоненты сильной связности + битовые маски.
+    bits[c] - int, где бит d установлен, если из компоненты c можно попасть в d.
+    Маски считаются одним проходом от стоков к истокам, запрос - O(1).
+    """
+    def __init__(self, adj: List[List[int]]):
+        self.comp, self.comps = strong_components(adj)
+        self.bits = [0] * len(self.comps)
+        for c, members in enumerate(self.comps):    # стоки идут первыми
+            mask = 1 << c
+            for v in members:
+                for w in adj[v]:
+                    d = self.comp[w]
+                    if d != c:
+                        mask |= self.bits[d]
+            self.bits[c] = mask
+
+    def reaches(self, source: int, target: int) -> bool:
+        """Можно ли попасть из source в target (source достижима из самой себя)"""
+        return bool(self.bits[self.comp[source]] >> self.comp[target] & 1)
+
+    def mask_from(self, sources) -> int:
+        """Маска компонент, достижимых хотя бы из одной вершины sources"""
+        mask = 0
+        for v in sources:
+            mask |= self.bits[self.comp[v]]
+        return mask
+
+    def reachable(self, sources) -> List[int]:
+        """Все вершины, достижимые из sources, по возрастанию"""
+        mask = self.mask_from(sources)
+        return [v for v, c in enumerate(self.comp) if mask >> c & 1]
+
+def neighbourhood(adj: List[List[int]], radj, source: int, k: int) -> set:
+    """
+    Вершины не дальше k переходов от source - по рёбрам (куда можно уйти)
+    и против них (откуда можно прийти). radj - результат reverse_adjacency.
+    Обходит только найденные вершины, остальной граф не трогает.
+    """
+    found = {source}
+    for forward in (True, False):
+        seen = {source}
+        front = [source]
+        for _ in range(k):
+            nxt = []
+            for v in front:
+                for w in (adj[v] if forward else (u for u, _ in radj[v])):
+                    if w not in seen:
+                        seen.add(w)
+                        nxt.append(w)
+            if not nxt:
+                break
+            front = nxt
+        found |= seen
+    return found
+
+def path_slice(adj: List[List[int]], radj, source: int, target: int) -> set:
+    """
+    Вершины, лежащие хотя бы на одном пути из source в target:
+    достижимые из source (BFS вперёд) и ведущие в target (BFS назад).
+    """
+    ahead = {source}
+    queue = deque([source])
+    while queue:
+        for w in adj[queue.popleft()]:
+            if w not in ahead:
+                ahead.add(w)
+                queue.append(w)
+    if target not in ahead:
+        return set()
+    behind = {target}
+    queue = deque([target])
+    while queue:
+        for u, _ in radj[queue.popleft()]:
+            if u not in behind and u in ahead:     # вне ahead путь из source всё равно не пройдёт
+                behind.add(u)
+                queue.append(u)
+    return behind
+
+def reverse_adjacency(adj: List[List[int]]) -> List[List[Tuple[int, int]]]:
+    """radj[w] - список (v, номер ребра в adj[v]) для всех рёбер v -> w"""
+    radj = [[] for _ in adj]
+    for v, edges in enumerate(adj):
+        for i, w in enumerate(edges):
+            radj[w].append((v, i))
+    return radj
+
+def bidirectional_path(adj: List[List[int]], radj, source: int, target: int):
+    """
+    Кратчайший путь встречным BFS: фронты растут от source и к target,
+    каждый раз расширяется меньший из них целым уровнем.
+    Путь - [(вершина, номер ребра)], как у tree_path; None - пути нет.
+    """
+    if source == target:
+        return [(source, -1)]
+    fwd = {source: (-1, -1)}        # вершина -> (предыдущая, номер ребра)
+    bwd = {target: (-1, -1)}        # вершина -> (следующая, номер ребра к ней)
+    f_front, b_front = [source], [target]
+
+    while f_front and b_front:
+        meet = None
+        if len(f_front) <= len(b_front):
+            nxt = []
+            for v in f_front:
+                for i, w in enumerate(adj[v]):
+                    if w not in fwd:
+                        fwd[w] = (v, i)
+                        nxt.append(w)
+                        if meet is None and w in bwd:
+                            meet = w
+            f_front = nxt
+        else:
+            nxt = []
+            for w in b_front:
+                for v, i in radj[w]:
+                    if v not in bwd:
+                        bwd[v] = (w, i)
+                        nxt.append(v)
+                        if meet is None and v in fwd:
+                            meet = v
+            b_front = nxt
+        if meet is not None:
+            # Уровень расширен целиком, поэтому первая встреча даёт кратчайший путь
+            path = tree_path(fwd, meet)
+            v = meet
+            while v != target:
+                nxt_v, edge = bwd[v]
+                path.append((nxt_v, edge))
+                v = nxt_v
+            return path
+    return None
@@ -3,8 +3,17 @@
 # URQ Parser - извлекает структуру из URQ файлов
 import re
 import os
+import sys
 from collections import deque
-from .encoding import detect_encoding
+
+try:
+    from .encoding import detect_encoding
+    from .urq_graph import strong_components, ReachIndex, reverse_adjacency
+    from .xref import XrefIndex
+except ImportError:
+    from encoding import detect_encoding
+    from urq_graph import strong_components, ReachIndex, reverse_adjacency
+    from xref import XrefIndex
 
 # Регулярки для парсинга URQ
 LOC_PATTERN = re.compile(r'^\s*:([^\n]+)', re.M)
@@ -27,6 +36,11 @@ COLON_PATTERN = re.compile(r'^\s*:([^\n]*)')
 
 VAR_PATTERN = re.compile(r'^\s*([^=\n]+?)\s*=', re.M)
 INV_PATTERN = re.compile(r'^\s*inv\+\s*(.+)', re.M | re.I)
+IF_SPLIT_PATTERN = re.compile(r'\b(then|else)\b', re.I)
+
+# Команды из веток if помечаются в конце строки: GUARD_MARK + номер условия в UrqParser.guards
+GUARD_MARK = '\x01'
+GUARD_PATTERN = re.compile(r'\x01(\d+)\s*$')
 
 # Константы
 ENCODING_BUFFER_SIZE = 1024
@@ -39,6 +53,7 @@ LINK_LABEL = 3
 LINK_IS_PHANTOM = 4
 LINK_IS_MENU = 5
 LINK_IS_LOCAL = 6
+LINK_GUARD = 7      # условие if, под которым связь появляется (None - без условия)
 
 def remove_urq_comments(text):
     """
@@ -93,6 +108,104 @@ def remove_urq_comments(text):
 
     return "".join(result)
 
+def build_adjacency(locs):
+    """Списки смежности по всем разрешённым связям: вершины - позиции в locs"""
+    pos = {loc.id: i for i, loc in enumerate(locs)}
+    return [[pos[link[LINK_TARGET_ID]] for link in loc.links if link[LINK_TARGET_ID] in pos]
+            for loc in locs]
+
+def build_reach_index(locs):
+    """
+    Индекс достижимости по всем разрешённым связям локаций.
+    Вершины - позиции в locs: build_reach_index(locs).reaches(i, j).
+    """
+    return ReachIndex(build_adjacency(locs))
+
+def build_proc_summaries(locs):
+    """
+    Сводки процедур: для каждой локации-цели proc (индекс в locs) - словарь
+    - 'body': индексы локаций, код которых выполняется во время вызова
+      (сама цель и всё, куда она уходит по goto, авто и вложенным proc);
+    - 'escapes': btn-связи из тела - после возврата они становятся кнопками вызывающей локации.
+    Считается один раз на цель и переиспользуется во всех местах вызова.
+    """
+    pos = {loc.id: i for i, loc in enumerate(locs)}
+    summaries = {}
+    for p, proc_loc in enumerate(locs):
+        if not getattr(proc_loc, 'is_proc_target', False):
+            continue
+        body = {p}
+        queue = deque([p])
+        while queue:
+            v = queue.popleft()
+            for link in locs[v].links:
+                w = pos.get(link[LINK_TARGET_ID])
+                if w is not None and link[LINK_TYPE] != 'btn' and w not in body:
+                    body.add(w)
+                    queue.append(w)
+        escapes = [link for v in sorted(body) for link in locs[v].links if link[LINK_TYPE] == 'btn']
+        summaries[p] = {'body': body, 'escapes': escapes}
+    return summaries
+
+def call_return_links(loc, pos, summaries):
+    """
+    Связи локации с учётом вызова и возврата: proc заменяется кнопками,
+    которые процедура добавляет вызывающей локации.
+    pos - id -> индекс в locs, summaries - результат build_proc_summaries.
+    """
+    links = []
+    for link in loc.links:
+        if link[LINK_TYPE] != 'proc':
+            links.append(link)
+            continue
+        summary = summaries.get(pos.get(link[LINK_TARGET_ID]))
+        if summary:
+            links.extend(summary['escapes'])
+    return links
+
+def split_if(line_text):
+    """
+    Разбирает строку if в дерево веток. Возвращает список команд верхнего уровня:
+    строка - обычная команда, список [условие, then, else] - if со своими ветками
+    (ветки - такие же списки, else - None, если его нет).
+    Вложенный if забирает остаток строки; else закрывает ближайший if без else,
+    следующий else - уже объемлющий: if a then if b then x else y else z.
+    """
+    root = []
+    stack = []      # открытые if, в ветках которых мы находимся
+    pending = None  # условие последнего if, ждущее своего then
+    for part in IF_SPLIT_PATTERN.split(line_text):
+        word = part.strip().lower()
+        if word == 'then':
+            if pending is not None:
+                node = [pending, [], None]
+                _if_branch(root, stack).append(node)
+                stack.append(node)
+                pending = None
+            continue
+        if word == 'else':
+            while stack and stack[-1][2] is not None:
+                stack.pop()     # у этого if else уже был - закрываем его
+            if stack:
+                stack[-1][2] = []
+            continue
+        for piece in part.split('&'):
+            piece = piece.strip()
+            if not piece:
+                continue
+            if re.match(r'^if\b', piece, re.I):
+                pending = piece[2:].strip()
+            else:
+                _if_branch(root, stack).append(piece)
+    return root
+
+def _if_branch(root, stack):
+    """Ветка, в которую сейчас попадают команды"""
+    if not stack:
+        return root
+    node = stack[-1]
+    return node[1] if node[2] is None else node[2]
+
 class Loc: 
     def __init__(self, id, name, desc, line):
         self.id = id            # номер локации (для puml)
@@ -105,10 +218,13 @@ class Loc:
         self.non_end = False    # не может быть концовкой если на нее ссылается proc, local или menu
         self.tech = False       # техническая локация
         self.orphan = False     # локация-сиротка (недостижима от старта, не может быть технической)
-        self.links = []         #[(target_id, target_name, type, label, is_phantom, is_menu, is_local)]
+        self.links = []         #[(target_id, target_name, type, label, is_phantom, is_menu, is_local, guard)]
         self.vars = set()       # переменные
         self.invs = set()       # предметы инвентаря
         self.is_proc_target = False       # локация, в которую приходит прок ссылка
+        self.depth = None       # переходов от старта (None - недостижима)
+        self.dist_to_end = None # переходов до ближайшей концовки (None - концовка недостижима)
+        self.cycle_group = None # номер цикла из нескольких локаций (компонента сильной связности)
 
     def __repr__(self):
         return f"Loc(id={self.id}, name='{self.name}', line={self.line}, links={len(self.links)}, flags={self._get_flags()})"    
@@ -120,23 +236,66 @@ class Loc:
         if self.end: flags.append('end')
         if self.tech: flags.append('tech')
         if self.orphan: flags.append('orphan')
+        if self.cycle_group: flags.append(f'loop{self.cycle_group}')
         return ','.join(flags) if flags else 'none'
 
 class UrqParser:
     def __init__(self):
         self.warnings =[]
+        self._reach = None  # ReachIndex последнего разбора, строится по первому запросу (см. reach)
+        self.adj = []       # смежность последнего разбора (build_adjacency) и обратная к ней
+        self.radj = []
+        self.guards = []    # тексты условий if (интернированы), индекс - номер в GUARD_MARK
+        self.xref = XrefIndex()  # где пишутся и читаются переменные и предметы
+        self._guard_ids = {}
     
-    def parse_file(self, file_path):
-        """Парсит URQ файл и возвращает структуру"""        
-        orig_content = self._read_file(file_path)
+    def _reset(self):
+        """Сбрасывает состояние прошлого разбора: парсер может разбирать файлы повторно"""
+        self._reach = None
+        self.adj = []
+        self.radj = []
+        self.guards = []
+        self._guard_ids = {}
+        self.xref = XrefIndex()
+
+    @property
+    def reach(self):
+        """
+        Индекс достижимости последнего разбора (см. build_reach_index).
+        Битовые маски занимают O(C²) памяти, поэтому строится только по первому запросу.
+        """
+        if self._reach is None and self.adj:
+            self._reach = ReachIndex(self.adj)
+        return self._reach
+
+    def read_source(self, file_path, text=None):
+        """
+        Текст квеста без комментариев и со всеми инклюдами (пустая строка, если не прочитан).
+        text - содержимое файла, если оно уже есть (несохранённый буфер редактора).
+        """
+        orig_content = self._read_file(file_path) if text is None else text
         if not orig_content:
-            return[]
+            return ""
         
         # Честно чистим главный файл от комментариев с учетом вложенности!
         orig_content = remove_urq_comments(orig_content)
         
         # Собираем все инклюды (теперь закомментированные %include будут проигнорированы)
-        orig_content = self._proc_includes(orig_content, os.path.dirname(os.path.abspath(file_path)))
+        return self._proc_includes(orig_content, os.path.dirname(os.path.abspath(file_path)))
+
+    def parse_file(self, file_path):
+        """Парсит URQ файл и возвращает структуру"""        
+        return self.parse_source(self.read_source(file_path), file_path)
+
+    def parse_source(self, orig_content, file_path):
+        """
+        Парсит уже прочитанный текст квеста (результат read_source) - когда текст
+        нужен и сам по себе, файл не читается и не декодируется второй раз.
+        """
+        self._reset()
+        if not orig_content:
+            return[]
+        
         clean_content = self._prep_content(orig_content)
         
         # Получаем локации с правильными номерами строк
@@ -202,6 +361,7 @@ class UrqParser:
 
     def parse_string(self, qst_content_string, encoding='utf-8'):
         """Парсит URQ строку и возвращает структуру"""
+        self._reset()
         if not qst_content_string:
             self._add_warning("Входная строка QST пуста.")
             return[]
@@ -233,17 +393,27 @@ class UrqParser:
         # Этап 2: Собираем потенциальные :метки из оригинала (для точных номеров строк)
         orig_pots =[]  # raw=имя_после_двоеточия, line=номер_строки
         orig_lines = orig_content.split('\n')
+        self.xref = XrefIndex()
+        cur_name = None     # метка, к которой относится строка (для перекрёстных ссылок)
         
         for line_num, line in enumerate(orig_lines, 1):
             # Ищем все :метка в каждой строке (не используем LOC_PATTERN - он для начала строки)
+            is_label = False
             for m in COLON_PATTERN.finditer(line):
                 # Нам больше не нужны хитрые очистки от комментариев, они уже вырезаны!
                 raw_name = m.group(1).strip()
+                is_label = True
                 if raw_name:
                     orig_pots.append({
                         "raw": raw_name,        # имя метки
                         "line": line_num        # реальный номер строки
                     })
+                    cur_name = raw_name
+                    self.xref.add_label(raw_name, line_num)
+            # Заодно собираем переменные и предметы - отдельного прохода не нужно
+            if not is_label and cur_name is not None:
+                self.xref.scan_line(cur_name, line_num, line)
+        self.xref.finish()
         
         # Этап 3: Сопоставляем clean_matches с orig_pots последовательно
         locs =[]
@@ -318,6 +488,12 @@ class UrqParser:
             has_outgoing = any(not link[LINK_IS_MENU] and not link[LINK_IS_LOCAL] for link in loc.links)
             if not has_outgoing and not loc.non_end and not loc.tech:
                 loc.end = True
+        
+        # Расстояния от старта и до концовок
+        self._mark_distances(locs)
+        
+        # Циклы из нескольких локаций
+        self._mark_cycle_groups(locs)
 
     def _is_tech_loc(self, name):
         """Проверяет является ли локация технической"""
@@ -384,7 +560,7 @@ class UrqParser:
 
         # Парсим инвентарь
         for m in INV_PATTERN.finditer(l_cont):
-            inv_name = m.group(1).strip()
+            inv_name = self._take_guard(m.group(1))[0].strip()
             if inv_name:
                 loc.invs.add(inv_name.lower())
 
@@ -442,7 +618,7 @@ class UrqParser:
                
                # Обновляем is_phantom
                new_phantom = new_id is None
-               res_links.append((new_id, t_name, l_type, label, new_phantom, is_menu, is_local))
+               res_links.append((new_id, t_name, l_type, label, new_phantom, is_menu, is_local, link[LINK_GUARD]))
                
                # Устанавливаем non_end флаг
                if new_id and (l_type == 'proc' or is_local or is_menu):
@@ -461,40 +637,25 @@ class UrqParser:
         if not locs:
             return
         
-        # Строим граф связей по ID (более надежно)
-        graph = {}  # id -> [target_ids]
-        
-        for loc in locs:
-            graph[loc.id] =[]
-            for link in loc.links:
-                t_id = link[LINK_TARGET_ID]  # target_id
-                if t_id:
-                    graph[loc.id].append(t_id)
+        # Смежность сохраняем для запросов об окрестностях, срезах графа и достижимости
+        self.adj = build_adjacency(locs)
+        self.radj = reverse_adjacency(self.adj)
+        self._reach = None
         
         # Стартовые точки: все техлокации
-        start_ids = {l.id for l in locs if l.tech}
-        
-        if not start_ids and locs:
-            start_ids.add(locs[0].id)  # Первая локация как запасной старт
+        starts = [i for i, l in enumerate(locs) if l.tech]
         
-        if not start_ids:
-            # Если совсем нет стартовых точек, все - сиротки
-            for loc in locs:
-                if not loc.tech:
-                    loc.orphan = True
-                    self._add_warning(f"Сиротка '{loc.name}' на строке {loc.line}")
-            return
-        
-        # BFS от всех стартовых точек с оптимизированной очередью
-        reachable = set(start_ids)
-        queue = deque(start_ids)
+        if not starts and locs:
+            starts.append(0)  # Первая локация как запасной старт
         
+        seen = set(starts)
+        queue = deque(starts)
         while queue:
-            current = queue.popleft()
-            for target_id in graph.get(current,[]):
-                if target_id not in reachable:
-                    reachable.add(target_id)
-                    queue.append(target_id)
+            for w in self.adj[queue.popleft()]:
+                if w not in seen:
+                    seen.add(w)
+                    queue.append(w)
+        reachable = {locs[i].id for i in seen}
         
         # Помечаем недостижимые нетехнические локации как сиротки
         for loc in locs:
@@ -502,6 +663,91 @@ class UrqParser:
                 loc.orphan = True
                 self._add_warning(f"Сиротка '{loc.name}' на строке {loc.line}")
 
+    def _mark_distances(self, locs):
+        """
+        Проставляет depth (BFS от старта) и dist_to_end (обратный BFS от всех концовок).
+        dist_to_end учитывает возврат из proc: тело процедуры (build_proc_summaries)
+        продолжается связями вызывающих локаций, поэтому тупиком не считается.
+        """
+        if not locs:
+            return
+        
+        # Та же смежность, что у сироток и срезов (build_adjacency / reverse_adjacency)
+        if len(self.adj) != len(locs):
+            self.adj = build_adjacency(locs)
+            self.radj = reverse_adjacency(self.adj)
+        backward = [[v for v, _ in edges] for edges in self.radj]
+        self._add_returns(locs, backward)
+        
+        depth = self._bfs_levels(self.adj, [0])
+        to_end = self._bfs_levels(backward, [i for i, l in enumerate(locs) if l.end], len(locs))
+        for i, loc in enumerate(locs):
+            loc.depth = depth.get(i)
+            loc.dist_to_end = to_end.get(i)
+
+    def _add_returns(self, locs, backward):
+        """
+        Дописывает в обратную смежность возвраты из процедур. На каждую процедуру -
+        одна вспомогательная вершина (индекс от len(locs)): тело -> вершина бесплатно,
+        вершина -> вызывающая локация за один переход. Так рёбер O(тело + вызовы),
+        а не их произведение.
+        """
+        summaries = build_proc_summaries(locs)
+        if not summaries:
+            return
+        pos = {loc.id: i for i, loc in enumerate(locs)}
+        callers = {}
+        for i, loc in enumerate(locs):
+            for link in loc.links:
+                if link[LINK_TYPE] == 'proc' and pos.get(link[LINK_TARGET_ID]) in summaries:
+                    callers.setdefault(pos[link[LINK_TARGET_ID]], set()).add(i)
+        for p, summary in summaries.items():
+            if p not in callers:
+                continue
+            ret = len(backward)
+            backward.append(sorted(summary['body']))
+            for c in sorted(callers[p]):
+                backward[c].append(ret)
+
+    def _mark_cycle_groups(self, locs):
+        """
+        Находит циклы из нескольких локаций (Тарьян, линейное время) и нумерует их
+        в порядке появления в файле. proc не считаем: из прока возвращаются обратно.
+        """
+        pos = {loc.id: i for i, loc in enumerate(locs)}
+        adj = [[pos[link[LINK_TARGET_ID]] for link in loc.links
+                if link[LINK_TYPE] != 'proc' and link[LINK_TARGET_ID] in pos]
+               for loc in locs]
+        _, comps = strong_components(adj)
+        
+        loops = sorted((sorted(c) for c in comps if len(c) > 1), key=lambda c: c[0])
+        for group, members in enumerate(loops, 1):
+            for i in members:
+                locs[i].cycle_group = group
+
+    def _bfs_levels(self, graph, start_ids, free_from=None):
+        """
+        BFS от нескольких стартов по спискам смежности graph, возвращает вершина -> расстояние.
+        Шаг из вершин с номером от free_from бесплатный (вспомогательные вершины, 0-1 BFS);
+        вспомогательные вершины в ответ не попадают.
+        """
+        dist = {s_id: 0 for s_id in start_ids}
+        queue = deque(start_ids)
+        while queue:
+            current = queue.popleft()
+            free = free_from is not None and current >= free_from
+            d = dist[current] + (0 if free else 1)
+            for t_id in graph[current]:
+                if t_id not in dist or d < dist[t_id]:
+                    dist[t_id] = d
+                    if free:
+                        queue.appendleft(t_id)
+                    else:
+                        queue.append(t_id)
+        if free_from is not None:
+            dist = {v: d for v, d in dist.items() if v < free_from}
+        return dist
+
     def _prep_content(self, content):
         """Предобработка контента"""
         # Удалена регулярка COMMENTS_REMOVAL.sub, так как очистка уже сделана
@@ -513,13 +759,52 @@ class UrqParser:
         lines =[]
         for line_text in content.split('\n'):
             if re.match(r'^\s*if\b', line_text, re.I):
-                parts = re.split(r'\b(then|else)\b', line_text, flags=re.I)
-                lines.extend(p.lstrip() for p in parts if p.lstrip() and p.lstrip().lower() not in ('then', 'else'))
+                lines.extend(self._split_if(line_text))
             else:
                 lines.append(line_text)
         # Разбиваем по & и очищаем
         return '\n'.join(p.strip() for p in '\n'.join(lines).split('&') if p.strip())
 
+    def _split_if(self, line_text):
+        """
+        Разбивает строку if на условие и команды веток (каждую - на свою строку).
+        Команды веток получают метку GUARD_MARK с номером условия, при котором выполняются;
+        вложенные if складываются через and, else - через not.
+        """
+        result = []
+        self._flatten_if(split_if(line_text), [], result)
+        return result
+
+    def _flatten_if(self, items, conds, result):
+        """Раскладывает дерево split_if в строки: conds - условия объемлющих веток"""
+        for item in items:
+            if isinstance(item, str):
+                result.append(f"{item}{GUARD_MARK}{self._guard_id(conds)}" if conds else item)
+                continue
+            cond, then_items, else_items = item
+            result.append(f"if {cond}")
+            self._flatten_if(then_items, conds + [cond], result)
+            if else_items:
+                self._flatten_if(else_items, conds + [f"not ({cond})"], result)
+
+    def _guard_id(self, conds):
+        """Номер условия для цепочки вложенных if (одинаковые тексты хранятся один раз)"""
+        guard = conds[0] if len(conds) == 1 else ' and '.join(f"({c})" for c in conds)
+        gid = self._guard_ids.get(guard)
+        if gid is None:
+            gid = self._guard_ids[guard] = len(self.guards)
+            self.guards.append(sys.intern(guard))
+        return gid
+
+    def _take_guard(self, text):
+        """Отрезает метку условия от текста команды: (текст, условие или None)"""
+        if GUARD_MARK not in text:
+            return text, None
+        m = GUARD_PATTERN.search(text)
+        if not m:
+            return text.replace(GUARD_MARK, ''), None
+        return text[:m.start()].rstrip(), self.guards[int(m.group(1))]
+
     def _read_file(self, f_path):
         """Читает файл"""
         enc = detect_encoding(f_path, self._add_warning)
@@ -535,7 +820,7 @@ class UrqParser:
 
     def _extract_description(self, l_cont):
         """Извлекает описание из контента"""
-        parts =[self._process_text_with_buttons(m.group(2).strip()).strip() 
+        parts =[self._process_text_with_buttons(self._take_guard(m.group(2))[0].strip()).strip() 
                  for m in TEXT_EXTRACTION.finditer(l_cont)]
         return self._clean_final_text(' '.join(parts)) if parts else "Нет описания"       
     
@@ -549,14 +834,17 @@ class UrqParser:
             
     def _extract_inline_buttons(self, text, loc):
         """Извлекает инлайн кнопки из текста"""
+        text, guard = self._take_guard(text)
         for m in INLINE_BTN_PATTERN.finditer(text):
             desc_text = m.group(1) if m.group(1) is not None else ""
             target_text = m.group(2) if m.group(2) is not None else desc_text
-            self._add_link_with_prefixes(loc, target_text.strip(), "btn", desc_text.strip())
+            self._add_link_with_prefixes(loc, target_text.strip(), "btn", desc_text.strip(), guard)
             
-    def _add_link_with_prefixes(self, loc, target, l_type, label):
+    def _add_link_with_prefixes(self, loc, target, l_type, label, guard=None):
         """Добавляет связь с обработкой префиксов % и !"""
-        target = target.strip()
+        target, t_guard = self._take_guard(target.strip())
+        label, l_guard = self._take_guard(label)
+        guard = guard or t_guard or l_guard
         is_menu = is_local = False
         
         if target and target[0] in '%!':
@@ -567,11 +855,11 @@ class UrqParser:
         cl_label = self._clean_button_text(label.strip()) if l_type == "btn" and label.strip() else label
         
         # Все ссылки пока добавляем с target_id=None, резолвим позже
-        self._add_link(loc, None, target, l_type, cl_label, True, is_menu, is_local)
+        self._add_link(loc, None, target, l_type, cl_label, True, is_menu, is_local, guard)
                  
-    def _add_link(self, loc, t_id, t_name, l_type, label, is_ph, is_menu, is_local):
+    def _add_link(self, loc, t_id, t_name, l_type, label, is_ph, is_menu, is_local, guard=None):
         """Единый метод добавления связи в правильном формате"""
-        loc.links.append((t_id, t_name, l_type, label, is_ph, is_menu, is_local))
+        loc.links.append((t_id, t_name, l_type, label, is_ph, is_menu, is_local, guard))
         
     def _clean_button_text(self, text):
         """Очищает текст кнопки"""
@@ -585,4 +873,36 @@ class UrqParser:
 
     def get_warnings(self):
         """Возвращает список предупреждений"""
-        return self.warnings
\ No newline at end of file
+        return self.warnings
+
+# Тест
+if __name__ == '__main__':
+    def guards_of(text):
+        """Цель -> условие связей первой локации"""
+        parser = UrqParser()
+        locs = parser.parse_string(text)
+        return {link[LINK_TARGET_NAME]: link[LINK_GUARD] for link in locs[0].links
+                if link[LINK_TYPE] != 'auto'}
+
+    tail = ":x\nend\n:y\nend\n:z\nend\n"
+    flat = guards_of(":start\nif a=1 then btn x,X & btn y,Y else goto z\n" + tail)
+    print("if/else:", flat)
+    assert flat == {'x': 'a=1', 'y': 'a=1', 'z': 'not (a=1)'}
+
+    nested = guards_of(":start\nif a=1 then if b=1 then goto x else goto y else goto z\n" + tail)
+    print("Вложенный if/else:", nested)
+    assert nested == {'x': '(a=1) and (b=1)', 'y': '(a=1) and (not (b=1))', 'z': 'not (a=1)'}
+
+    inner = guards_of(":start\nif a=1 then if b=1 then goto x else goto y\n" + tail)
+    assert inner == {'x': '(a=1) and (b=1)', 'y': '(a=1) and (not (b=1))'}
+
+    parser = UrqParser()
+    parser.parse_string(":start\nif a=1 then goto x\n" + tail)
+    parser.parse_string(":start\nif c=1 then goto y\n" + tail)
+    assert parser.guards == ['c=1']     # состояние прошлого разбора сброшено
+
+    # Из тела процедуры управление возвращается к вызывающей локации - это не тупик
+    locs = parser.parse_string(":start\nproc helper\nbtn fin,Finish\n:fin\nend\n:helper\npln hi\n")
+    print("До концовки:", {loc.name: loc.dist_to_end for loc in locs})
+    assert locs[2].dist_to_end == 2
+    print("OK")
@@ -0,0 +1,179 @@
+# xref.py
+# Перекрёстные ссылки на переменные и предметы: имя -> где пишется и где читается.
+#
+# Индекс заполняется построчно во время разбора (UrqParser._get_locations
+# уже проходит по всем строкам ради номеров меток), отдельного прохода нет.
+# Запись: присваивание, instr, inv+, inv-, invkill с именем.
+# Чтение: условия if, правые части присваиваний, подстановки #имя$ и #%имя$,
+# а для предметов - ещё и их действия (локации use_предмет и inv_предмет).
+import re
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+IF_SPLIT_PATTERN = re.compile(r'\b(then|else)\b', re.I)
+IF_PATTERN = re.compile(r'^if\b(.*)$', re.I | re.S)
+INV_CMD_PATTERN = re.compile(r'^inv([+-])\s*(?:\d+\s*,)?\s*(.+)$', re.I)
+INVKILL_PATTERN = re.compile(r'^invkill\b\s*(.*)$', re.I)
+SET_PATTERN = re.compile(r'^(?:instr\s+)?([^\W\d][^=<>]*?)\s*=(.*)$', re.I | re.S)
+SUBST_PATTERN = re.compile(r'#%?([^#$\n]+)\$')
+NAME_PATTERN = re.compile(r'[^\W\d][\w.]*')
+STRING_PATTERN = re.compile(r'"[^"]*"|\'[^\']*\'')
+KEYWORDS = frozenset(('and', 'or', 'not', 'then', 'else', 'if'))
+# Команды, которые выглядят как "слово = ..." только случайно
+COMMANDS = ('pln', 'p', 'btn', 'goto', 'proc', 'end', 'cls', 'clsb', 'perkill', 'print',
+            'println', 'music', 'play', 'image', 'save', 'quit', 'input', 'anykey', 'pause')
+
+Site = Tuple[str, int]  # (имя локации, номер строки)
+
+class XrefIndex:
+    """
+    Индекс имя -> места записи и чтения. Имена в нижнем регистре,
+    запрос по имени - O(1). items - имена, встречавшиеся в inv+/inv-/invkill.
+    """
+    def __init__(self):
+        self.writes: Dict[str, List[Site]] = defaultdict(list)
+        self.reads: Dict[str, List[Site]] = defaultdict(list)
+        self.items = set()
+        self._conds: List[Tuple[str, str, int]] = []   # условия if - для предметов из нескольких слов
+        self._actions: List[Site] = []                  # метки use_/inv_ - действия предметов
+        self._finished = False
+
+    def scan_line(self, loc_name: str, line_num: int, text: str):
+        """Разбирает одну строку кода локации loc_name"""
+        text = text.strip()
+        if text.startswith('_'):
+            text = text[1:].strip()     # продолжение предыдущей строки
+        if not text:
+            return
+        site = (loc_name, line_num)
+        for name in SUBST_PATTERN.findall(text):
+            self.reads[name.strip().lower()].append(site)
+        if IF_PATTERN.match(text):
+            for part in IF_SPLIT_PATTERN.split(text):
+                if part.strip().lower() not in ('then', 'else'):
+                    self._scan_commands(part, site)
+        else:
+            self._scan_commands(text, site)
+
+    def add_label(self, loc_name: str, line_num: int):
+        """Метка локации: use_ и inv_ - это действия предмета"""
+        low = loc_name.lower()
+        if low.startswith('use_') or low.startswith('inv_'):
+            self._actions.append((loc_name, line_num))
+
+    def _scan_commands(self, text: str, site: Site):
+        for stmt in text.split('&'):
+            stmt = stmt.strip()
+            if not stmt:
+                continue
+            m = IF_PATTERN.match(stmt)
+            if m:
+                self._conds.append((m.group(1), site[0], site[1]))
+                self._add_reads(m.group(1), site)
+                continue
+            m = INV_CMD_PATTERN.match(stmt)
+            if m:
+                item = m.group(2).strip().lower()
+                self.items.add(item)
+                self.writes[item].append(site)
+                continue
+            m = INVKILL_PATTERN.match(stmt)
+            if m:
+                item = m.group(1).strip().lower()
+                if item:
+                    self.items.add(item)
+                    self.writes[item].append(site)
+                continue
+            m = SET_PATTERN.match(stmt)
+            if m and m.group(1).split(None, 1)[0].lower() not in COMMANDS:
+                self.writes[m.group(1).strip().lower()].append(site)
+                self._add_reads(m.group(2), site)
+
+    def _add_reads(self, expr: str, site: Site):
+        """Имена в выражении (без строковых констант и ключевых слов)"""
+        for name in NAME_PATTERN.findall(STRING_PATTERN.sub(' ', expr)):
+            low = name.lower()
+            if low not in KEYWORDS:
+                self.reads[low].append(site)
+
+    def finish(self):
+        """Досчитывает то, что требует полного списка предметов"""
+        if self._finished:
+            return
+        self._finished = True
+        # Предметы из нескольких слов в условиях: "if ржавый ключ then".
+        # _add_reads уже записал каждое слово как отдельное имя - эти чтения убираем
+        multi = [item for item in self.items if ' ' in item]
+        for cond, loc_name, line_num in self._conds:
+            low = cond.lower()
+            site = (loc_name, line_num)
+            for item in multi:
+                count = low.count(item)
+                if not count:
+                    continue
+                self.reads[item].extend([site] * count)
+                for word in item.split():
+                    self._drop_reads(word, site, count)
+        # Действия предметов: use_ключ, use_ключ_открыть, inv_ключ
+        for loc_name, line_num in self._actions:
+            rest = loc_name[4:].lower()
+            for item in self.items:
+                if rest == item or rest.startswith(item + '_'):
+                    self.reads[item].append((loc_name, line_num))
+        self._conds = []
+        self._actions = []
+
+    def _drop_reads(self, name: str, site: Site, count: int):
+        """Убирает до count чтений имени name в месте site"""
+        sites = self.reads.get(name)
+        if not sites:
+            return
+        for _ in range(count):
+            if site not in sites:
+                break
+            sites.remove(site)
+        if not sites:
+            del self.reads[name]
+
+    def usages(self, name: str) -> Dict[str, List[Site]]:
+        """Места записи и чтения имени"""
+        low = name.strip().lower()
+        return {'writes': self.writes.get(low, []), 'reads': self.reads.get(low, [])}
+
+    def names(self) -> List[str]:
+        """Все известные имена по алфавиту"""
+        return sorted(set(self.writes) | set(self.reads))
+
+    def unused(self) -> List[str]:
+        """Пишутся, но нигде не читаются"""
+        return sorted(n for n in self.writes if not self.reads.get(n))
+
+    def never_set(self) -> List[str]:
+        """Читаются, но нигде не пишутся (в URQ такая переменная всегда 0)"""
+        return sorted(n for n in self.reads if not self.writes.get(n))
+
+    def single_use(self) -> List[str]:
+        """Упоминаются ровно один раз"""
+        return sorted(n for n in self.names()
+                      if len(self.writes.get(n, ())) + len(self.reads.get(n, ())) == 1)
+
+
+# Тест
+if __name__ == '__main__':
+    index = XrefIndex()
+    index.scan_line("start", 2, "inv+ ржавый ключ")
+    index.scan_line("start", 3, "key = 1")
+    index.scan_line("door", 6, "if ржавый ключ and key then goto open")
+    index.scan_line("door", 7, "if ключ then pln нет")     # одно слово - это другое имя
+    index.add_label("use_ржавый ключ", 9)
+    index.finish()
+
+    print("Имена:", index.names())
+    print("Не задаются:", index.never_set())
+    print("Один раз:", index.single_use())
+    assert index.usages("ржавый ключ")['reads'] == [("door", 6), ("use_ржавый ключ", 9)]
+    assert "ржавый" not in index.names()
+    assert index.usages("ключ")['reads'] == [("door", 7)]
+    assert index.never_set() == ["ключ"]
+    assert index.unused() == []
+    print("OK")